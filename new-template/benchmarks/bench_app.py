@@ -0,0 +1,270 @@
+"""Drive a mixed page workload through the app and report latency and SQL per request.
+
+    python benchmarks/bench_app.py --users 200 --transactions 200000 --requests 2000
+    python benchmarks/bench_app.py --json results.json
+    python benchmarks/bench_app.py --baseline results.json --tolerance 0.25
+
+Builds the app with create_app() on a scratch SQLite file in the repository's
+instance/ folder and seeds users, stocks, positions and transaction history.
+Then it replays a weighted mix of login, /portfolio, /trade (GET and POST),
+/order_history and /admin from several threads using the Flask test client.
+Each scenario reports p50/p95/p99 latency, throughput and SQL statements per
+request. With --baseline the run is compared to an earlier --json file and
+exits non-zero if latency or query counts regressed.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import time as dtime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from models import db, User, Stock, Portfolio, Transaction, MarketHours, MarketSchedule
+
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "instance")
+PASSWORD = "bench-password"
+
+SCENARIOS = {
+    "login": 5,
+    "portfolio": 25,
+    "trade_get": 20,
+    "trade_post": 10,
+    "order_history": 25,
+    "admin": 5,
+}
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+# -------------------------
+# SEEDING
+# -------------------------
+def seed(users, stocks, transactions, holdings, rng):
+    db.drop_all()
+    db.create_all()
+    # One hash for everybody; hashing per user would dominate the seed time.
+    password = generate_password_hash(PASSWORD)
+    db.session.execute(insert(User), [
+        dict(full_name=f"Bench {i}", username=f"bench{i}", email=f"bench{i}@example.com",
+             password=password, cash_balance=1_000_000.0, role="admin" if i == 0 else "user")
+        for i in range(users)
+    ])
+    db.session.execute(insert(Stock), [
+        dict(company_name=f"Company {i}", ticker=f"B{i}", initial_price=rng.uniform(5, 500), volume=10_000_000)
+        for i in range(stocks)
+    ])
+    db.session.execute(insert(Portfolio), [
+        dict(user_id=u, stock_id=s, quantity=rng.randint(1, 500), average_price=rng.uniform(5, 500))
+        for u in range(1, users + 1)
+        for s in rng.sample(range(1, stocks + 1), min(holdings, stocks))
+    ])
+    batch = 50_000
+    for start in range(0, transactions, batch):
+        db.session.execute(insert(Transaction), [
+            dict(user_id=rng.randint(1, users), stock_id=rng.randint(1, stocks),
+                 order_type=rng.choice(("buy", "sell")), quantity=rng.randint(1, 100),
+                 price=rng.uniform(5, 500))
+            for _ in range(start, min(transactions, start + batch))
+        ])
+    # Keep the market open around the clock so trade POSTs go through.
+    db.session.add(MarketHours(open_time=dtime(0, 0), close_time=dtime(23, 59, 59), is_open=True))
+    schedule = MarketSchedule(**{day: True for day in DAYS})
+    for day in DAYS:
+        setattr(schedule, f"{day}_open", dtime(0, 0))
+        setattr(schedule, f"{day}_close", dtime(23, 59, 59))
+    db.session.add(schedule)
+    db.session.commit()
+
+
+# -------------------------
+# WORKLOAD
+# -------------------------
+class QueryCounter:
+    """Counts SQL statements issued by the current thread."""
+
+    def __init__(self, engine):
+        self._local = threading.local()
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self._local.count = getattr(self._local, "count", 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, "count", 0)
+
+
+def login(client, username):
+    return client.post("/login", data={"username": username, "password": PASSWORD})
+
+
+def run_scenario(name, client, username, rng, stocks):
+    if name == "login":
+        client.get("/logout")
+        return login(client, username)
+    if name == "portfolio":
+        return client.get("/portfolio")
+    if name == "trade_get":
+        return client.get("/trade")
+    if name == "trade_post":
+        return client.post("/trade", data={
+            "action": rng.choice(("buy", "sell")),
+            "stock_id": rng.randint(1, stocks),
+            "quantity": rng.randint(1, 5),
+        })
+    if name == "order_history":
+        return client.get("/order_history")
+    if name == "admin":
+        return client.get("/admin")
+    raise ValueError(name)
+
+
+def worker(app, counter, plan, users, stocks, seed_value, samples):
+    rng = random.Random(seed_value)
+    client = app.test_client()
+    admin = app.test_client()
+    username = f"bench{rng.randint(1, users - 1)}"
+    login(client, username)
+    login(admin, "bench0")
+    for name in plan:
+        target = admin if name == "admin" else client
+        counter.reset()
+        started = time.perf_counter()
+        response = run_scenario(name, target, "bench0" if name == "admin" else username, rng, stocks)
+        elapsed = time.perf_counter() - started
+        samples[name].append((elapsed, counter.count, response.status_code))
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(samples, wall):
+    results = {}
+    for name, rows in sorted(samples.items()):
+        latencies = [r[0] * 1000 for r in rows]
+        results[name] = {
+            "requests": len(rows),
+            "errors": sum(1 for r in rows if r[2] >= 500),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "mean_ms": round(sum(latencies) / len(latencies), 3),
+            "queries_per_request": round(sum(r[1] for r in rows) / len(rows), 2),
+            "max_queries": max(r[1] for r in rows),
+        }
+    total = sum(len(rows) for rows in samples.values())
+    return {"total_requests": total, "wall_s": round(wall, 3), "throughput_rps": round(total / wall, 1), "scenarios": results}
+
+
+def compare(current, baseline, tolerance):
+    problems = []
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if now[metric] > before[metric] * (1 + tolerance):
+                problems.append(f"{name}: {metric} {before[metric]} -> {now[metric]}")
+        if now["queries_per_request"] > before["queries_per_request"] + 0.5:
+            problems.append(f"{name}: queries/request {before['queries_per_request']} -> {now['queries_per_request']}")
+        if now["errors"] > before["errors"]:
+            problems.append(f"{name}: errors {before['errors']} -> {now['errors']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--stocks", type=int, default=50)
+    parser.add_argument("--transactions", type=int, default=100_000, help="historical transactions to seed")
+    parser.add_argument("--holdings", type=int, default=10, help="positions per user")
+    parser.add_argument("--requests", type=int, default=1000, help="requests in total")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--db", default=os.path.join(INSTANCE_DIR, "bench_app.db"))
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against an earlier --json file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed latency regression (0.25 = 25%%)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.db), exist_ok=True)
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{args.db}",
+        "MARK_TO_MARKET_INTERVAL": 3600.0,
+    })
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    with app.app_context():
+        seed(args.users, args.stocks, args.transactions, args.holdings, rng)
+        counter = QueryCounter(db.engine)
+    print(f"Seeded {args.users} users, {args.stocks} stocks, {args.transactions} transactions "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    # Warm up: the first request starts the price feed and restores the book.
+    warm = app.test_client()
+    login(warm, "bench1")
+    warm.get("/portfolio")
+
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[n] for n in names]
+    plans = [[] for _ in range(args.threads)]
+    for i, name in enumerate(rng.choices(names, weights, k=args.requests)):
+        plans[i % args.threads].append(name)
+
+    samples = defaultdict(list)
+    threads = [
+        threading.Thread(target=worker, args=(app, counter, plan, args.users, args.stocks, args.seed + i, samples))
+        for i, plan in enumerate(plans)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results = summarize(samples, time.perf_counter() - started)
+    results["config"] = {k: getattr(args, k) for k in ("users", "stocks", "transactions", "holdings", "requests", "threads", "seed")}
+
+    print(f"{'scenario':<15}{'reqs':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql/req':>9}")
+    for name, r in results["scenarios"].items():
+        print(f"{name:<15}{r['requests']:>6}{r['errors']:>5}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+              f"{r['p99_ms']:>10.2f}{r['queries_per_request']:>9.1f}")
+    print(f"{results['total_requests']} requests in {results['wall_s']:.2f}s -> {results['throughput_rps']} req/s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    with app.app_context():
+        db.engine.dispose()
+    if not args.keep:
+        os.remove(args.db)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        if problems:
+            print("REGRESSED")
+            for problem in problems:
+                print("  " + problem)
+            sys.exit(1)
+        print("OK: no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Measure login throughput at different password hash settings.
+
+    python benchmarks/bench_login.py --threads 16 --logins 200
+    python benchmarks/bench_login.py --methods pbkdf2:sha256:600000 scrypt:32768:8:1 --workers 2
+
+For each method, builds the app with create_app() on a scratch SQLite file,
+stores one user hashed with that method, and POSTs /login from --threads
+test clients. It reports logins/s, p50/p95 latency and how many requests
+got a 503 because the hashing pool was saturated. It also checks that a
+hash made with a different method is upgraded on the first login.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from models import db, User
+
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "instance")
+PASSWORD = "bench-password"
+METHODS = ["pbkdf2:sha256:100000", "pbkdf2:sha256:600000", "scrypt:16384:8:1", "scrypt:32768:8:1"]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def run(method, args):
+    path = os.path.join(INSTANCE_DIR, "bench_login.db")
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+        "PASSWORD_HASH_METHOD": method,
+        "PASSWORD_HASH_WORKERS": args.workers,
+        "PASSWORD_HASH_QUEUE": args.queue,
+        "PASSWORD_HASH_TIMEOUT": args.timeout,
+        "METRICS_ENABLED": False,
+    })
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        # Start from a different method so the first login has to rehash.
+        other = "pbkdf2:sha256:1000" if method.startswith("scrypt") else "scrypt:16384:8:1"
+        db.session.add(User(full_name="Bench", username="bench", email="bench@example.com",
+                            password=generate_password_hash(PASSWORD, other), cash_balance=0))
+        db.session.commit()
+
+    client = app.test_client()
+    client.post("/login", data={"username": "bench", "password": PASSWORD})
+    with app.app_context():
+        upgraded = not app.extensions["passwords"].needs_rehash(User.query.filter_by(username="bench").one().password)
+
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def worker():
+        c = app.test_client()
+        for _ in range(args.logins):
+            started = time.perf_counter()
+            response = c.post("/login", data={"username": "bench", "password": PASSWORD})
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    app.extensions["passwords"].shutdown()
+    with app.app_context():
+        db.engine.dispose()
+    os.remove(path)
+    ok = sum(1 for s in statuses if s == 302)
+    busy = sum(1 for s in statuses if s == 503)
+    return ok / wall, percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000, busy, upgraded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--methods", nargs="+", default=METHODS)
+    parser.add_argument("--threads", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--logins", type=int, default=25, help="logins per client")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="hashing pool size")
+    parser.add_argument("--queue", type=int, default=64, help="hashes allowed to wait for the pool")
+    parser.add_argument("--timeout", type=float, default=5.0, help="seconds to wait for a slot before 503")
+    args = parser.parse_args()
+    os.makedirs(INSTANCE_DIR, exist_ok=True)
+
+    print(f"{'method':<24}{'logins/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'503s':>6}  rehashed")
+    for method in args.methods:
+        rate, p50, p95, busy, upgraded = run(method, args)
+        print(f"{method:<24}{rate:>10.1f}{p50:>10.1f}{p95:>10.1f}{busy:>6}  {'yes' if upgraded else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Measure order events per second through the in-memory matching engine.
+
+    python benchmarks/bench_matching.py --events 200000 --stocks 50
+
+Generates a random mix of limit orders around a drifting mid price, market
+orders and cancels, and pushes them straight through MatchingEngine (no
+database), then reports events/s and fills.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matching import BUY, SELL, MatchingEngine, Order
+
+
+def generate(events, stocks, seed):
+    rng = random.Random(seed)
+    mids = [rng.randint(1000, 50000) for _ in range(stocks)]
+    for i in range(events):
+        stock = rng.randrange(stocks)
+        mids[stock] = max(100, mids[stock] + rng.randint(-5, 5))
+        roll = rng.random()
+        side = BUY if rng.random() < 0.5 else SELL
+        if roll < 0.15:
+            yield "cancel", None
+        elif roll < 0.30:
+            yield "market", (stock, side, mids[stock], mids[stock], rng.randint(1, 50))
+        else:
+            offset = rng.randint(0, 50)
+            price = mids[stock] - offset if side == BUY else mids[stock] + offset
+            yield "limit", (stock, side, price, mids[stock], rng.randint(1, 100))
+
+
+def run(events, stocks, liquidity, seed):
+    engine = MatchingEngine()
+    for stock in range(stocks):
+        engine.book(stock, liquidity)
+    workload = list(generate(events, stocks, seed))
+    resting = []
+    rng = random.Random(seed + 1)
+    fills = 0
+    next_id = 1
+
+    started = time.perf_counter()
+    for kind, args in workload:
+        if kind == "cancel":
+            if resting:
+                index = rng.randrange(len(resting))
+                resting[index], resting[-1] = resting[-1], resting[index]
+                engine.cancel(resting.pop())
+            continue
+        stock, side, price, mid, qty = args
+        order = Order(next_id, 1, stock, side, price, qty, ioc=kind == "market")
+        next_id += 1
+        fills += len(engine.submit(order, reference=mid / 100.0))
+        if order.remaining and not order.ioc:
+            resting.append(order.id)
+    elapsed = time.perf_counter() - started
+    return elapsed, fills, len(engine.orders)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--stocks", type=int, default=50)
+    parser.add_argument("--liquidity", type=int, default=1000, help="house shares per stock")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    elapsed, fills, resting = run(args.events, args.stocks, args.liquidity, args.seed)
+    print(f"{args.events} events in {elapsed:.3f}s -> {args.events / elapsed:,.0f} events/s")
+    print(f"{fills} fills, {resting} orders resting")
+
+
+if __name__ == "__main__":
+    main()
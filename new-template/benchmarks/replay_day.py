@@ -0,0 +1,118 @@
+"""Replay a trading session through the order path on a scratch database.
+
+    python benchmarks/replay_day.py --seconds 3600 --rate 5 --users 200
+    python benchmarks/replay_day.py --seconds 3600 --rate 5 --record day.ndjson
+    python benchmarks/replay_day.py --events day.ndjson --speed 1000
+
+Without --events a synthetic session is generated (same seed, same session)
+starting at the next market open; --record saves it as NDJSON for later
+runs. --speed N paces the replay at N times real time (0, the default, runs
+as fast as it can). The app is built with create_app() on a scratch SQLite
+file, so WRITE_PIPELINE_ENABLED and friends apply as usual. Reports
+throughput, order latency, fill outcomes and the final account states, then
+checks the balances against the ledger.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+from dataclasses import asdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ledger
+from app import create_app, seed_database
+from models import db
+from replay import Replay, read_events, synthetic_events, write_events
+
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "instance")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", help="NDJSON event file to replay")
+    parser.add_argument("--record", help="save the synthetic session to this NDJSON file")
+    parser.add_argument("--speed", type=float, default=0.0, help="times real time; 0 = unthrottled")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="session start (default: next market open)")
+    parser.add_argument("--seconds", type=float, default=1800, help="synthetic session length")
+    parser.add_argument("--rate", type=float, default=1.0, help="synthetic orders per simulated second")
+    parser.add_argument("--stocks", type=int, default=20)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--cash", type=float, default=10000.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--top", type=int, default=10, help="accounts to list, by equity")
+    parser.add_argument("--json", help="write the full report here")
+    parser.add_argument("--db", default=os.path.join(INSTANCE_DIR, "replay_day.db"))
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    args = parser.parse_args()
+    os.makedirs(INSTANCE_DIR, exist_ok=True)
+    if os.path.exists(args.db):
+        os.remove(args.db)
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{args.db}", "METRICS_ENABLED": False})
+    with app.app_context():
+        with contextlib.redirect_stdout(sys.stderr):
+            seed_database()
+
+    with contextlib.ExitStack() as stack:
+        if args.events:
+            events = read_events(stack.enter_context(open(args.events)))
+            first = next(events)
+            replay = Replay(app, first["t"], args.speed)
+            events = _chain(first, events)
+        else:
+            replay = Replay(app, args.start or datetime.now(), args.speed)
+            start = args.start or replay.calendar.next_open()
+            events = synthetic_events(start, args.seconds, args.stocks, args.users, args.rate,
+                                      args.cash, seed=args.seed)
+            if args.record:
+                events = write_events(events, stack.enter_context(open(args.record, "w")))
+        stack.callback(replay.close)
+        report = replay.run(events)
+
+    print(f"{report.events} events ({report.ticks} ticks, {report.orders} orders) in {report.wall_seconds:.2f}s")
+    print(f"{report.simulated_seconds:.0f} simulated seconds, {report.speedup:.0f}x real time, "
+          f"max lag {report.max_lag:.2f}s")
+    print(f"{report.orders_per_second:.0f} orders/s, latency p50 {report.latency(50) * 1000:.2f} ms, "
+          f"p95 {report.latency(95) * 1000:.2f} ms, p99 {report.latency(99) * 1000:.2f} ms")
+    print(f"outcomes: {dict(sorted(report.outcomes.items()))}")
+    print(f"{report.shares} shares traded, ${report.notional:,.2f} notional, "
+          f"{report.cancelled_at_close} orders cancelled at the close")
+    if report.unlisted:
+        print(f"{report.unlisted} listings skipped: stock id past the price table's capacity")
+
+    accounts = sorted(report.accounts, key=lambda a: a.equity, reverse=True)
+    if accounts:
+        print(f"\n{'account':<16}{'cash':>14}{'equity':>14}  positions")
+        for a in accounts[:args.top]:
+            positions = ", ".join(f"{t} {q}" for t, q in sorted(a.positions.items()))
+            print(f"{a.user:<16}{a.cash:>14,.2f}{a.equity:>14,.2f}  {positions}")
+        total = sum(a.equity for a in accounts)
+        print(f"{len(accounts)} accounts, total equity ${total:,.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            data = asdict(report)
+            del data["latencies"]
+            json.dump(data, f, indent=2)
+
+    with app.app_context():
+        problems = ledger.verify(recheck=0)
+        db.engine.dispose()
+    if not args.keep:
+        os.remove(args.db)
+    if problems:
+        print(f"FAILED: {len(problems)} accounts disagree with the ledger")
+        sys.exit(1)
+    print("OK: balances match the ledger")
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+if __name__ == "__main__":
+    main()
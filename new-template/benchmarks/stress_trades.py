@@ -0,0 +1,169 @@
+"""Hammer submit_order() from many threads and check nothing was double-spent.
+
+    python benchmarks/stress_trades.py --users 4 --threads 32 --orders 400
+    python benchmarks/stress_trades.py --pipeline --window-ms 2
+
+Runs against a scratch SQLite file in the repository's instance/ folder (the
+bundled stock_trading.db predates the current schema), then replays every
+Transaction row and compares it with the final balances and positions, and
+checks the same balances against the append-only ledger. --pipeline sends
+the writes through the group-commit pipeline instead.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+import ledger
+from pipeline import WritePipeline
+from models import db, User, Stock, Portfolio, Transaction
+from trading import cancel_order, matching_engine, restore_book, submit_order
+
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "instance")
+
+
+def build_app(path, pool_size):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": pool_size,
+        "connect_args": {"timeout": 30, "check_same_thread": False},
+    }
+    db.init_app(app)
+    return app
+
+
+def seed(users, stocks, cash):
+    db.drop_all()
+    db.create_all()
+    for i in range(users):
+        db.session.add(User(
+            full_name=f"Stress {i}", username=f"stress{i}", email=f"stress{i}@example.com",
+            password="x", cash_balance=cash,
+        ))
+    for i in range(stocks):
+        db.session.add(Stock(company_name=f"Stock {i}", ticker=f"S{i}", initial_price=10.0, volume=100000))
+    db.session.commit()
+    ledger.open_accounts()
+    restore_book()
+    return [u.id for u in User.query.all()], [s.id for s in Stock.query.all()]
+
+
+def worker(app, user_ids, stock_ids, orders, results):
+    rng = random.Random()
+    counts = defaultdict(int)
+    with app.app_context():
+        for _ in range(orders):
+            user_id = rng.choice(user_ids)
+            roll = rng.random()
+            if roll < 0.1:
+                mine = [o.id for o in list(matching_engine.orders.values()) if o.user_id == user_id]
+                if mine and cancel_order(user_id, rng.choice(mine)):
+                    counts["cancelled"] += 1
+                continue
+            action = "buy" if rng.random() < 0.6 else "sell"
+            order_type = "limit" if roll < 0.4 else "market"
+            fill = submit_order(
+                user_id, rng.choice(stock_ids), action, rng.randint(1, 20),
+                float(rng.randint(5, 50)), order_type, reference=float(rng.randint(5, 50)),
+            )
+            counts[fill.reason or ("resting" if fill.resting else "filled")] += 1
+    results.append(counts)
+
+
+def verify(user_ids, cash):
+    problems = []
+    cash_delta = defaultdict(float)
+    shares = defaultdict(int)
+    for tx in Transaction.query.all():
+        sign = 1 if tx.order_type == "buy" else -1
+        cash_delta[tx.user_id] -= sign * tx.price * tx.quantity
+        shares[(tx.user_id, tx.stock_id)] += sign * tx.quantity
+
+    for user in User.query.filter(User.id.in_(user_ids)):
+        expected = cash + cash_delta[user.id]
+        if user.cash_balance < -1e-6:
+            problems.append(f"user {user.id} has negative cash {user.cash_balance}")
+        if abs(user.cash_balance - expected) > 1e-6:
+            problems.append(f"user {user.id} cash {user.cash_balance} != ledger {expected}")
+
+    held = {(p.user_id, p.stock_id): p.quantity for p in Portfolio.query.all()}
+    for key in set(held) | {k for k, v in shares.items() if v}:
+        if held.get(key, 0) != shares[key]:
+            problems.append(f"position {key} is {held.get(key, 0)}, ledger says {shares[key]}")
+        if held.get(key, 0) < 0:
+            problems.append(f"position {key} is negative")
+    for p in ledger.verify(recheck=0):
+        problems.append(f"user {p.user_id} {'cash' if p.stock_id is None else p.stock_id}: "
+                        f"ledger entries say {p.expected}, account has {p.actual}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--stocks", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--orders", type=int, default=400, help="orders per thread")
+    parser.add_argument("--cash", type=float, default=5000.0)
+    parser.add_argument("--db", default=os.path.join(INSTANCE_DIR, "stress_trades.db"))
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    parser.add_argument("--pipeline", action="store_true", help="group-commit the writes")
+    parser.add_argument("--window-ms", type=float, default=2.0, help="group commit window")
+    args = parser.parse_args()
+
+    app = build_app(args.db, args.threads)
+    with app.app_context():
+        user_ids, stock_ids = seed(args.users, args.stocks, args.cash)
+    pipeline = WritePipeline(app, args.window_ms / 1000) if args.pipeline else None
+
+    results = []
+    threads = [
+        threading.Thread(target=worker, args=(app, user_ids, stock_ids, args.orders, results))
+        for _ in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    outcomes = defaultdict(int)
+    for counts in results:
+        for key, value in counts.items():
+            outcomes[key] += value
+    total = args.threads * args.orders
+    print(f"{total} orders in {elapsed:.2f}s ({total / elapsed:.0f}/s): {dict(outcomes)}")
+    if pipeline is not None:
+        writes = pipeline.stats()
+        print(f"{writes['operations']} writes in {writes['groups']} commits, {writes['fallbacks']} groups rerun")
+
+    with app.app_context():
+        # Release whatever is still reserved by resting orders.
+        for order in list(matching_engine.orders.values()):
+            cancel_order(order.user_id, order.id)
+        if pipeline is not None:
+            pipeline.close()
+        problems = verify(user_ids, args.cash)
+        db.engine.dispose()
+    if not args.keep:
+        os.remove(args.db)
+
+    if problems:
+        print("FAILED")
+        for problem in problems[:20]:
+            print("  " + problem)
+        sys.exit(1)
+    print("OK: balances and positions match the transaction log")
+
+
+if __name__ == "__main__":
+    main()
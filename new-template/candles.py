@@ -0,0 +1,262 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+# -------------------------
+# CANDLE STORE
+# -------------------------
+# Each resolution keeps, per stock id, a ring of `slots` OHLCV buckets in one
+# float32 array laid out [stock, slot, field]. A tick updates one slot column
+# for every ticker with a handful of NumPy ops, a range query copies
+# contiguous per-ticker runs, and memory is stocks x slots x 5 where
+# "stocks" is the highest listed stock id, not the price table's capacity:
+# the ring grows when a higher id is listed.
+#
+# When a bucket closes its candles are appended to a per-day binary file
+# (32-byte records, time ordered), which is where ranges older than the ring
+# are served from. Only the process that owns the price feed spills; workers
+# that attach to a shared table keep their own ring and read older history
+# from the producer's files. Day files older than a resolution's retention
+# (RETENTION_DAYS; unlisted resolutions are kept) are deleted as each new day's file starts.
+#
+# Volume comes from the table's running shares-traded counters, which
+# settlement bumps in the producer, so every process charts every fill.
+
+RESOLUTIONS = {
+    "1s": (1, 900),
+    "1m": (60, 1440),
+    "1h": (3600, 720),
+}
+
+RECORD = np.dtype([
+    ("t", "<i8"), ("stock", "<i4"),
+    ("o", "<f4"), ("h", "<f4"), ("l", "<f4"), ("c", "<f4"), ("v", "<f4"),
+])
+
+RETENTION_DAYS = {"1s": 2, "1m": 90}
+
+O, H, L, C, V = range(5)
+
+# The ring grows in steps of this many stock ids.
+GROWTH = 64
+
+
+def as_rows(times, candles):
+    """One ticker's dense candles as ``[[t, o, h, l, c, v], ...]``, gaps dropped.
+
+    Storage is float32; values are widened before rounding so 100.24 doesn't
+    come back as 100.23999786.
+    """
+    keep = ~np.isnan(candles[:, O])
+    return np.column_stack((times[keep], candles[keep].astype(np.float64).round(2))).tolist()
+
+
+class CandleSeries:
+    def __init__(self, seconds, slots, capacity=0):
+        self.seconds = seconds
+        self.slots = slots
+        self.times = np.full(slots, -1, dtype=np.int64)
+        self.ohlcv = np.full((capacity, slots, 5), np.nan, dtype=np.float32)
+        self.first = None
+        self.current = None
+
+    @property
+    def capacity(self):
+        return self.ohlcv.shape[0]
+
+    def _grow(self, capacity):
+        capacity = -(-capacity // GROWTH) * GROWTH
+        grown = np.full((capacity, self.slots, 5), np.nan, dtype=np.float32)
+        grown[:self.capacity] = self.ohlcv
+        self.ohlcv = grown
+
+    def update(self, ts, prices, volumes):
+        """Fold one tick in; returns ``(bucket, rows)`` for a bucket that just
+        closed, otherwise None."""
+        if len(prices) > self.capacity:
+            self._grow(len(prices))
+        bucket = int(ts // self.seconds) * self.seconds
+        slot = (bucket // self.seconds) % self.slots
+        n = len(prices)
+        row = self.ohlcv[:n, slot]
+        closed = None
+
+        if self.times[slot] != bucket:
+            if self.current is not None:
+                prev = (self.current // self.seconds) % self.slots
+                closed = (self.current, self.ohlcv[:, prev].copy())
+            self.times[slot] = bucket
+            self.ohlcv[:, slot] = np.nan
+            row[:, O] = prices
+            row[:, H] = prices
+            row[:, L] = prices
+            row[:, C] = prices
+            row[:, V] = volumes
+            if self.first is None:
+                self.first = bucket
+            self.current = bucket
+        else:
+            listed = ~np.isnan(prices)
+            np.copyto(row[:, O], prices, where=np.isnan(row[:, O]))
+            np.fmax(row[:, H], prices, out=row[:, H])
+            np.fmin(row[:, L], prices, out=row[:, L])
+            np.copyto(row[:, C], prices, where=listed)
+            row[:, V] = np.nan_to_num(row[:, V]) + volumes
+        return closed
+
+    def fill(self, block, stock_ids, start):
+        """Copy ring candles for ``stock_ids`` into ``block[stock, bucket]``
+        where bucket 0 starts at ``start``."""
+        end = start + block.shape[1] * self.seconds
+        picked = np.nonzero((self.times >= start) & (self.times < end))[0]
+        ids = np.asarray(stock_ids, dtype=np.int64)
+        inside = np.nonzero(ids < self.capacity)[0]
+        if not len(picked) or not len(inside):
+            return
+        picked = picked[np.argsort(self.times[picked])]
+        buckets = (self.times[picked] - start) // self.seconds
+        # Copy runs where both the ring slot and the bucket advance by one;
+        # normally that is the whole ring in at most two slices.
+        breaks = np.nonzero((np.diff(picked) != 1) | (np.diff(buckets) != 1))[0] + 1
+        for run in np.split(np.arange(len(picked)), breaks):
+            lo, hi = picked[run[0]], picked[run[-1]] + 1
+            b = buckets[run[0]]
+            block[inside, b:b + hi - lo] = self.ohlcv[ids[inside], lo:hi]
+
+
+class CandleStore:
+    def __init__(self, directory=None, spill=False, resolutions=RESOLUTIONS, retention=RETENTION_DAYS):
+        self.directory = directory
+        self.spill = spill and directory is not None
+        self.series = {name: CandleSeries(*spec) for name, spec in resolutions.items()}
+        self.retention = {name: retention.get(name) for name in resolutions}
+        self._traded = None
+        self._days = {}
+        self._lock = threading.Lock()
+        if self.spill:
+            os.makedirs(directory, exist_ok=True)
+            self.prune()
+
+    def record(self, ts, prices, traded=None):
+        """Fold a full price row (0 = not listed) into every resolution.
+
+        ``traded`` is the table's running shares-traded row; volume is what
+        it grew by since the previous call.
+        """
+        # The table row is sized for its capacity; only listed ids are kept.
+        listed = np.flatnonzero(prices > 0)
+        prices = prices[:listed[-1] + 1 if len(listed) else 0]
+        prices = np.where(prices > 0, prices, np.nan).astype(np.float32)
+        with self._lock:
+            volumes = np.zeros(len(prices), dtype=np.float32)
+            if traded is not None:
+                traded = np.array(traded, dtype=np.float64)
+                if self._traded is not None and len(self._traded) == len(traded):
+                    n = min(len(prices), len(traded))
+                    volumes[:n] = (traded - self._traded)[:n]
+                self._traded = traded
+            for name, series in self.series.items():
+                closed = series.update(ts, prices, volumes)
+                if closed is not None and self.spill:
+                    self._write(name, *closed)
+
+    def _path(self, name, bucket):
+        day = datetime.fromtimestamp(bucket, tz=timezone.utc).strftime("%Y%m%d")
+        return os.path.join(self.directory, f"{name}-{day}.bin")
+
+    def _write(self, name, bucket, rows):
+        listed = np.nonzero(~np.isnan(rows[:, O]))[0]
+        if not len(listed):
+            return
+        day = bucket // 86400
+        if self._days.get(name) != day:
+            self._days[name] = day
+            self.prune(bucket, name)
+        records = np.empty(len(listed), dtype=RECORD)
+        records["t"] = bucket
+        records["stock"] = listed
+        for field, column in zip("ohlcv", range(5)):
+            records[field] = rows[listed, column]
+        with open(self._path(name, bucket), "ab") as f:
+            f.write(records.tobytes())
+
+    def prune(self, now=None, name=None):
+        """Delete spill files past their resolution's retention; returns how many."""
+        now = time.time() if now is None else now
+        today = datetime.fromtimestamp(now, tz=timezone.utc).date()
+        removed = 0
+        for entry in os.scandir(self.directory):
+            resolution, _, rest = entry.name.partition("-")
+            days = self.retention.get(resolution)
+            if days is None or (name is not None and resolution != name) or not rest.endswith(".bin"):
+                continue
+            try:
+                day = datetime.strptime(rest[:-4], "%Y%m%d").date()
+            except ValueError:
+                continue
+            if (today - day).days > days:
+                os.remove(entry.path)
+                removed += 1
+        return removed
+
+    def _read(self, name, block, stock_ids, start, end):
+        seconds = self.series[name].seconds
+        if self.directory is None or start >= end or not stock_ids:
+            return
+        day = 86400
+        for day_start in range(int(start // day) * day, int(end), day):
+            path = self._path(name, day_start)
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                continue
+            records = np.memmap(path, dtype=RECORD, mode="r")
+            lo, hi = np.searchsorted(records["t"], [start, end])
+            records = np.asarray(records[lo:hi])
+            if not len(records):
+                continue
+            position = np.full(max(int(records["stock"].max()), max(stock_ids)) + 1, -1)
+            position[stock_ids] = np.arange(len(stock_ids))
+            rows = position[records["stock"]]
+            keep = rows >= 0
+            records = records[keep]
+            cells = rows[keep] * block.shape[1] + (records["t"] - start) // seconds
+            # A record is 8 little-endian 32-bit words: t (2), stock, o, h, l, c, v.
+            block.reshape(-1, 5)[cells] = records.view(np.float32).reshape(-1, 8)[:, 3:]
+
+    def candles(self, name, stock_ids, start, end):
+        """Dense candles for ``[start, end)``: ``(times, block)`` where block is
+        float32 ``[stock, bucket, o/h/l/c/v]`` and NaN marks a gap."""
+        if not (np.isfinite(start) and np.isfinite(end)):
+            raise ValueError("candle range must be finite")
+        series = self.series[name]
+        start = int(start // series.seconds) * series.seconds
+        count = max(0, int(-(-(end - start) // series.seconds)))
+        times = start + series.seconds * np.arange(count, dtype=np.int64)
+        block = np.full((len(stock_ids), count, 5), np.nan, dtype=np.float32)
+        with self._lock:
+            # The ring only covers what this process has seen; anything older
+            # comes from the spill files.
+            if series.current is None:
+                ring_start = end
+            else:
+                ring_start = max(series.first, series.current - (series.slots - 1) * series.seconds)
+            series.fill(block, stock_ids, start)
+        self._read(name, block, list(stock_ids), start, min(end, ring_start))
+        return times, block
+
+    def follow(self, table, interval=0.5):
+        """Sample a SharedPriceTable in a background thread."""
+        def run():
+            last = None
+            while True:
+                seq, row = table.snapshot()
+                if seq != last:
+                    last = seq
+                    self.record(time.time(), row, table.traded)
+                time.sleep(interval)
+        thread = threading.Thread(target=run, name="candle-sampler", daemon=True)
+        thread.start()
+        return thread
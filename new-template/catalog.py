@@ -0,0 +1,98 @@
+import threading
+from bisect import bisect_left
+from time import monotonic
+
+
+# -------------------------
+# TICKER SEARCH
+# -------------------------
+# An in-memory prefix index over the listing: every ticker, every company
+# name and every word of a company name is a lowercase key in one sorted
+# list. A prefix lookup is a bisect to the first matching key and a short
+# walk forward, so autocomplete costs the same with five symbols or fifty
+# thousand. Like the trading calendar, the index is rebuilt from ``load``
+# when it is older than ``ttl`` or after invalidate(); admin writes
+# invalidate it and other workers pick the change up within ``ttl`` seconds.
+
+# Ranks, best first: exact ticker, ticker prefix, company prefix, word prefix.
+EXACT, TICKER, COMPANY, WORD = range(4)
+
+
+class _Index:
+    def __init__(self, rows):
+        self.stocks = {}
+        self.by_ticker = {}
+        keys = []
+        for stock_id, ticker, company_name in rows:
+            self.stocks[stock_id] = (ticker, company_name)
+            self.by_ticker[ticker.upper()] = stock_id
+            keys.append((ticker.lower(), TICKER, ticker, stock_id))
+            name = (company_name or "").lower()
+            if name:
+                keys.append((name, COMPANY, ticker, stock_id))
+                for word in name.split()[1:]:
+                    keys.append((word, WORD, ticker, stock_id))
+        keys.sort()
+        self.keys = keys
+
+
+class TickerIndex:
+    """Prefix search over (id, ticker, company_name) rows from ``load``."""
+
+    def __init__(self, load, ttl=60.0):
+        self.load = load
+        self.ttl = ttl
+        self._index = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._index = None
+
+    def _get(self):
+        index = self._index
+        if index is None or monotonic() - self._built_at > self.ttl:
+            with self._lock:
+                index = self._index
+                if index is None or monotonic() - self._built_at > self.ttl:
+                    index = _Index(self.load())
+                    self._index = index
+                    self._built_at = monotonic()
+        return index
+
+    def __len__(self):
+        return len(self._get().stocks)
+
+    def search(self, query, limit=10, scan=500):
+        """Return up to ``limit`` (stock_id, ticker, company_name), best first.
+
+        At most ``scan`` keys are looked at, which bounds the cost of a one
+        letter query against a large listing.
+        """
+        prefix = query.strip().lower()
+        if not prefix or limit <= 0:
+            return []
+        index = self._get()
+        keys = index.keys
+        best = {}
+        i = bisect_left(keys, (prefix,))
+        end = min(len(keys), i + scan)
+        while i < end and keys[i][0].startswith(prefix):
+            key, rank, ticker, stock_id = keys[i]
+            if rank == TICKER and key == prefix:
+                rank = EXACT
+            if rank < best.get(stock_id, (WORD + 1,))[0]:
+                best[stock_id] = (rank, ticker)
+            i += 1
+        ranked = sorted(best.items(), key=lambda item: item[1])[:limit]
+        return [(stock_id, *index.stocks[stock_id]) for stock_id, _ in ranked]
+
+    def lookup(self, tickers):
+        """Map tickers (any case) to stock ids, skipping unknown ones."""
+        by_ticker = self._get().by_ticker
+        found = {}
+        for ticker in tickers:
+            ticker = ticker.strip().upper()
+            if ticker in by_ticker:
+                found[ticker] = by_ticker[ticker]
+        return found
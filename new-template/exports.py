@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from models import User, Stock, Transaction
+
+
+# -------------------------
+# TRANSACTION EXPORT
+# -------------------------
+# The full log is read through a server-side cursor (stream_results) and
+# written out a partition at a time, so an export holds one chunk of rows in
+# memory whatever the size of the table.
+
+EXPORT_COLUMNS = ("id", "user_id", "username", "stock_id", "ticker", "order_type", "quantity", "price")
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _rows(engine, chunk):
+    query = (
+        select(
+            Transaction.id, Transaction.user_id, User.username,
+            Transaction.stock_id, Stock.ticker, Transaction.order_type,
+            Transaction.quantity, Transaction.price,
+        )
+        # Outer joins: a row whose stock or user has since been deleted is
+        # still exported, with its stored ids and an empty ticker/username.
+        .outerjoin(User, User.id == Transaction.user_id)
+        .outerjoin(Stock, Stock.id == Transaction.stock_id)
+        .order_by(Transaction.id)
+    )
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunk).execute(query)
+        yield from result.partitions(chunk)
+
+
+def iter_transactions(engine, fmt="csv", chunk=5000):
+    """Yield the transaction log as CSV or NDJSON text chunks.
+
+    Takes the engine rather than using ``db.session`` because the generator
+    runs after the request (and its app context) has returned.
+    """
+    if fmt == "ndjson":
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        for rows in _rows(engine, chunk):
+            yield "".join(encode(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in _rows(engine, chunk):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
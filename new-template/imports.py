@@ -0,0 +1,182 @@
+import csv
+import io
+import json
+import math
+import re
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from sqlalchemy import bindparam, func, insert, select
+
+from models import Stock
+from trading import MAX_PRICE
+
+
+# -------------------------
+# STOCK IMPORT
+# -------------------------
+# An uploaded listing is read a line at a time and upserted in chunks: one
+# SELECT finds which tickers of the chunk already exist, then new ones go
+# out as one executemany INSERT and existing ones as one executemany UPDATE,
+# and the chunk commits. A 50k-row file is ~10 chunks of three statements
+# each instead of 100k round trips.
+#
+# Columns are ticker, company_name, initial_price and volume. A new ticker
+# needs all four; for an existing ticker any empty field keeps its current
+# value. Bad rows are skipped and reported by line number.
+#
+# Prices are quoted from a shared table with a fixed number of stock id
+# slots. With `max_stock_id` set, new tickers whose id lands past it are
+# deleted again in the same transaction and reported as rejected rows
+# rather than listed without a price.
+
+IMPORT_COLUMNS = ("ticker", "company_name", "initial_price", "volume")
+IMPORT_FORMATS = ("csv", "ndjson")
+TICKER = re.compile(r"^[A-Z0-9][A-Z0-9.\-]{0,9}$")
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    updated: int = 0
+    # (line number, message), first max_errors only; error_count has them all
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    error_count: int = 0
+    # (stock_id, volume) for updated stocks whose volume was set
+    volumes: List[Tuple[int, int]] = field(default_factory=list)
+
+
+def _records(stream, fmt):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "ndjson":
+        for line_no, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield line_no, None, f"invalid JSON: {exc}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "expected a JSON object"
+                continue
+            yield line_no, record, None
+        return
+
+    reader = csv.DictReader(text)
+    if "ticker" not in (reader.fieldnames or ()):
+        yield 1, None, "the header row has no ticker column"
+        return
+    for record in reader:
+        # reader.line_num is the line the record ended on (header is line 1).
+        yield reader.line_num, record, None
+
+
+def _value(record, name, convert):
+    value = record.get(name)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        return convert(value.strip() if isinstance(value, str) else value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} is not a valid {convert.__name__}: {value!r}")
+
+
+def _clean(record):
+    ticker = str(record.get("ticker") or "").strip().upper()
+    if not TICKER.match(ticker):
+        raise ValueError(f"invalid ticker {ticker!r}")
+    company_name = _value(record, "company_name", str)
+    if company_name is not None and len(company_name) > 100:
+        raise ValueError("company_name is longer than 100 characters")
+    initial_price = _value(record, "initial_price", float)
+    if initial_price is not None and not (math.isfinite(initial_price) and 0 < initial_price <= MAX_PRICE):
+        raise ValueError(f"initial_price must be positive and at most {MAX_PRICE:,.0f}")
+    volume = _value(record, "volume", int)
+    if volume is not None and volume < 0:
+        raise ValueError("volume must not be negative")
+    return ticker, company_name, initial_price, volume
+
+
+def import_stocks(engine, stream, fmt="csv", chunk=5000, max_errors=1000, max_stock_id=None):
+    """Upsert Stock rows from a CSV or NDJSON byte stream."""
+    result = ImportResult()
+
+    def error(line_no, message):
+        result.error_count += 1
+        if len(result.errors) < max_errors:
+            result.errors.append((line_no, message))
+
+    seen = set()
+    pending = []
+    for line_no, record, problem in _records(stream, fmt):
+        if problem is not None:
+            error(line_no, problem)
+            continue
+        try:
+            row = _clean(record)
+        except ValueError as exc:
+            error(line_no, str(exc))
+            continue
+        if row[0] in seen:
+            error(line_no, f"{row[0]} appears earlier in the file")
+            continue
+        seen.add(row[0])
+        pending.append((line_no, row))
+        if len(pending) >= chunk:
+            _write_chunk(engine, pending, result, error, max_stock_id)
+            pending = []
+    if pending:
+        _write_chunk(engine, pending, result, error, max_stock_id)
+    result.errors.sort()
+    return result
+
+
+def _write_chunk(engine, pending, result, error, max_stock_id=None):
+    stock_t = Stock.__table__
+    with engine.begin() as conn:
+        existing = dict(conn.execute(
+            select(stock_t.c.ticker, stock_t.c.id)
+            .where(stock_t.c.ticker.in_([row[0] for _, row in pending]))
+        ).all())
+        inserts, updates, lines = [], [], {}
+        for line_no, (ticker, company_name, initial_price, volume) in pending:
+            stock_id = existing.get(ticker)
+            if stock_id is not None:
+                updates.append(dict(b_id=stock_id, b_name=company_name, b_price=initial_price, b_volume=volume))
+                if volume is not None:
+                    result.volumes.append((stock_id, volume))
+                continue
+            absent = [n for n, v in zip(IMPORT_COLUMNS[1:], (company_name, initial_price, volume)) if v is None]
+            if absent:
+                error(line_no, f"new ticker {ticker} needs {', '.join(absent)}")
+                continue
+            inserts.append(dict(ticker=ticker, company_name=company_name, initial_price=initial_price, volume=volume))
+            lines[ticker] = line_no
+
+        if inserts:
+            conn.execute(insert(stock_t), inserts)
+        if inserts and max_stock_id is not None:
+            # Ids are only known once inserted.
+            over = set(conn.execute(
+                select(stock_t.c.ticker)
+                .where(stock_t.c.ticker.in_(list(lines)), stock_t.c.id > max_stock_id)
+            ).scalars())
+            if over:
+                conn.execute(stock_t.delete().where(stock_t.c.ticker.in_(sorted(over))))
+                for ticker in over:
+                    error(lines[ticker], f"no room for {ticker}: the price table holds stock ids up to {max_stock_id}")
+                inserts = [row for row in inserts if row["ticker"] not in over]
+        if updates:
+            conn.execute(
+                stock_t.update()
+                .where(stock_t.c.id == bindparam("b_id"))
+                .values(
+                    company_name=func.coalesce(bindparam("b_name"), stock_t.c.company_name),
+                    initial_price=func.coalesce(bindparam("b_price"), stock_t.c.initial_price),
+                    volume=func.coalesce(bindparam("b_volume"), stock_t.c.volume),
+                ),
+                updates,
+            )
+    result.inserted += len(inserts)
+    result.updated += len(updates)
@@ -0,0 +1,361 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, delete, func, insert, or_, select
+
+from models import db, User, Portfolio, LimitOrder, LedgerEntry, LedgerCheckpoint
+
+
+# -------------------------
+# LEDGER
+# -------------------------
+# Every fill and cash movement is also appended to LedgerEntry with a
+# timestamp, in the same transaction that changes the balances. Portfolio
+# and User.cash_balance stay the fast, mutable view; the ledger is the
+# history behind them.
+#
+# LedgerCheckpoint stores an account's state folded from all of its entries
+# up to taken_at, so rebuilding the account at any time replays only what
+# came after the nearest earlier checkpoint. Checkpoints trail the clock by
+# `lag` seconds so that an entry still inside an uncommitted transaction is
+# never skipped.
+#
+# Reservations are not ledger events: cash held by open buy limits and
+# shares held by open sell limits (and by market orders still pending
+# settlement) are taken off the rebuilt state when it is compared with the
+# live balances.
+
+BUY = "buy"
+SELL = "sell"
+DEPOSIT = "deposit"
+WITHDRAWAL = "withdraw"
+OPENING = "opening"
+
+
+def entry(user_id, kind, amount, stock_id=None, quantity=0, price=None, created_at=None):
+    """A LedgerEntry row as a dict, for bulk inserts alongside other writes."""
+    return dict(
+        user_id=user_id, kind=kind, amount=amount, stock_id=stock_id,
+        quantity=quantity, price=price, created_at=created_at or datetime.utcnow(),
+    )
+
+
+@dataclass
+class AccountState:
+    cash: float = 0.0
+    # stock_id -> [quantity, cost basis]
+    positions: Dict[int, List[float]] = field(default_factory=dict)
+
+    def apply(self, kind, stock_id, quantity, price, amount):
+        self.cash += amount
+        if stock_id is None or not quantity:
+            return
+        position = self.positions.setdefault(stock_id, [0, 0.0])
+        if kind == SELL:
+            if position[0]:
+                position[1] -= position[1] * quantity / position[0]
+            position[0] -= quantity
+        else:
+            position[0] += quantity
+            position[1] += (price or 0.0) * quantity
+
+    def quantity(self, stock_id):
+        position = self.positions.get(stock_id)
+        return position[0] if position else 0
+
+    def average_price(self, stock_id):
+        position = self.positions.get(stock_id)
+        return position[1] / position[0] if position and position[0] else 0.0
+
+    def as_checkpoint(self):
+        return round(self.cash, 6), {
+            str(s): [q, round(c, 6)] for s, (q, c) in self.positions.items() if q
+        }
+
+    @classmethod
+    def from_checkpoint(cls, cash, positions):
+        return cls(cash, {int(s): [q, c] for s, (q, c) in positions.items()})
+
+
+_ENTRY_COLUMNS = (LedgerEntry.kind, LedgerEntry.stock_id, LedgerEntry.quantity,
+                  LedgerEntry.price, LedgerEntry.amount)
+
+
+def account_at(user_id, at=None):
+    """Rebuild one account's cash and positions as of ``at`` (default now)."""
+    at = at or datetime.utcnow()
+    checkpoint = (
+        LedgerCheckpoint.query
+        .filter(LedgerCheckpoint.user_id == user_id, LedgerCheckpoint.taken_at <= at)
+        .order_by(LedgerCheckpoint.taken_at.desc())
+        .first()
+    )
+    state, since = AccountState(), None
+    if checkpoint is not None:
+        state = AccountState.from_checkpoint(checkpoint.cash, checkpoint.positions)
+        since = checkpoint.taken_at
+
+    query = select(*_ENTRY_COLUMNS).where(LedgerEntry.user_id == user_id, LedgerEntry.created_at <= at)
+    if since is not None:
+        query = query.where(LedgerEntry.created_at > since)
+    for row in db.session.execute(query.order_by(LedgerEntry.created_at, LedgerEntry.id)):
+        state.apply(*row)
+    return state
+
+
+# -------------------------
+# RANGE FOLDS
+# -------------------------
+# Checkpointing and verification both work on a range of user ids at a time:
+# one query for the latest checkpoints in the range and one streamed query
+# for the entries after them, ordered by user. Ranges are independent, so
+# they run side by side on separate connections.
+
+def _user_ranges(conn, chunk):
+    low, high = conn.execute(select(func.min(User.id), func.max(User.id))).one()
+    if low is None:
+        return []
+    return [(start, min(start + chunk - 1, high)) for start in range(low, high + 1, chunk)]
+
+
+def _fold_range(conn, low, high, until=None, chunk=5000):
+    """Fold each account in [low, high] from its latest checkpoint.
+
+    Returns ({user_id: AccountState}, set of user_ids that had entries
+    after their checkpoint).
+    """
+    in_range = LedgerCheckpoint.user_id.between(low, high)
+    if until is not None:
+        in_range = and_(in_range, LedgerCheckpoint.taken_at <= until)
+    latest = (
+        select(LedgerCheckpoint.user_id, func.max(LedgerCheckpoint.taken_at).label("taken_at"))
+        .where(in_range)
+        .group_by(LedgerCheckpoint.user_id)
+        .subquery()
+    )
+    states = {}
+    for user_id, cash, positions in conn.execute(
+        select(LedgerCheckpoint.user_id, LedgerCheckpoint.cash, LedgerCheckpoint.positions)
+        .join(latest, and_(latest.c.user_id == LedgerCheckpoint.user_id, latest.c.taken_at == LedgerCheckpoint.taken_at))
+    ):
+        states[user_id] = AccountState.from_checkpoint(cash, positions)
+
+    query = (
+        select(LedgerEntry.user_id, *_ENTRY_COLUMNS)
+        .outerjoin(latest, latest.c.user_id == LedgerEntry.user_id)
+        .where(
+            LedgerEntry.user_id.between(low, high),
+            or_(latest.c.taken_at.is_(None), LedgerEntry.created_at > latest.c.taken_at),
+        )
+        .order_by(LedgerEntry.user_id, LedgerEntry.created_at, LedgerEntry.id)
+    )
+    if until is not None:
+        query = query.where(LedgerEntry.created_at <= until)
+    changed = set()
+    rows = conn.execution_options(stream_results=True, max_row_buffer=chunk).execute(query)
+    for part in rows.partitions(chunk):
+        for user_id, *row in part:
+            state = states.get(user_id)
+            if state is None:
+                state = states[user_id] = AccountState()
+            state.apply(*row)
+            changed.add(user_id)
+    return states, changed
+
+
+# -------------------------
+# CHECKPOINTS
+# -------------------------
+def checkpoint(lag=60.0, workers=4, chunk=1000):
+    """Checkpoint every account with entries since its last checkpoint.
+
+    Returns the number of checkpoints written.
+    """
+    engine = db.engine
+    taken_at = datetime.utcnow() - timedelta(seconds=lag)
+
+    def run(bounds):
+        with engine.begin() as conn:
+            states, changed = _fold_range(conn, *bounds, until=taken_at)
+            rows = []
+            for user_id in sorted(changed):
+                cash, positions = states[user_id].as_checkpoint()
+                rows.append(dict(user_id=user_id, taken_at=taken_at, cash=cash, positions=positions))
+            if rows:
+                conn.execute(insert(LedgerCheckpoint.__table__), rows)
+            return len(rows)
+
+    with engine.connect() as conn:
+        ranges = _user_ranges(conn, chunk)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(run, ranges))
+
+
+def open_accounts(created_at=None):
+    """Write an opening entry for every account that doesn't have one yet.
+
+    The opening balance is the account's state before its first ledger
+    entry: its cash and positions, including anything held by open orders,
+    less what its entries add up to. It is dated just before that first
+    entry, or at ``created_at`` (default now) for an account with none, and
+    the account's checkpoints, folded without it, are dropped. ``init-db``
+    and the market's startup run this, so accounts that predate the ledger
+    are opened before they trade.
+    """
+    created_at = created_at or datetime.utcnow()
+    with db.engine.begin() as conn:
+        opened = select(LedgerEntry.user_id).where(LedgerEntry.kind == OPENING)
+        users = dict(conn.execute(
+            select(User.id, func.coalesce(User.cash_balance, 0.0))
+            .where(User.id.not_in(opened))
+        ).all())
+        if not users:
+            return 0
+        low, high = min(users), max(users)
+        held_cash, held_shares = _open_orders(conn, low, high)
+        first = {
+            user_id: at for user_id, at in conn.execute(
+                select(LedgerEntry.user_id, func.min(LedgerEntry.created_at))
+                .where(LedgerEntry.user_id.between(low, high))
+                .group_by(LedgerEntry.user_id)
+            ) if user_id in users
+        }
+        states = {}
+        if first:
+            conn.execute(delete(LedgerCheckpoint).where(LedgerCheckpoint.user_id.in_(first)))
+            states, _ = _fold_range(conn, low, high)
+        holdings = {}
+        for user_id, stock_id, quantity, average in conn.execute(
+            select(Portfolio.user_id, Portfolio.stock_id, Portfolio.quantity, Portfolio.average_price)
+            .where(Portfolio.user_id.between(low, high))
+        ):
+            if user_id in users:
+                quantity += held_shares.get((user_id, stock_id), 0)
+                holdings.setdefault(user_id, {})[stock_id] = (quantity, average)
+
+        rows = []
+        for user_id, cash in users.items():
+            state = states.get(user_id, AccountState()) if user_id in first else AccountState()
+            at = first[user_id] - timedelta(microseconds=1) if user_id in first else created_at
+            rows.append(entry(user_id, OPENING, round(cash + held_cash.get(user_id, 0.0) - state.cash, 6),
+                              created_at=at))
+            held = holdings.get(user_id, {})
+            for stock_id in sorted(held.keys() | state.positions.keys()):
+                quantity, average = held.get(stock_id, (0, state.average_price(stock_id)))
+                quantity -= state.quantity(stock_id)
+                if quantity:
+                    rows.append(entry(user_id, OPENING, 0.0, stock_id, quantity, average, at))
+        conn.execute(insert(LedgerEntry.__table__), rows)
+        return len(users)
+
+
+# -------------------------
+# VERIFICATION
+# -------------------------
+@dataclass
+class Mismatch:
+    user_id: int
+    stock_id: Optional[int]
+    expected: float
+    actual: float
+
+
+def _open_orders(conn, low, high):
+    held_cash, held_shares = {}, {}
+    for user_id, stock_id, side, price, remaining in conn.execute(
+        select(LimitOrder.user_id, LimitOrder.stock_id, LimitOrder.side, LimitOrder.price, LimitOrder.remaining)
+        .where(LimitOrder.status.in_(("open", "pending")), LimitOrder.user_id.between(low, high))
+    ):
+        if side == BUY:
+            held_cash[user_id] = held_cash.get(user_id, 0.0) + price * remaining
+        else:
+            held_shares[(user_id, stock_id)] = held_shares.get((user_id, stock_id), 0) + remaining
+    return held_cash, held_shares
+
+
+def _verify_range(engine, low, high, tolerance):
+    with engine.connect() as conn:
+        states, _ = _fold_range(conn, low, high)
+        held_cash, held_shares = _open_orders(conn, low, high)
+        cash = dict(conn.execute(
+            select(User.id, func.coalesce(User.cash_balance, 0.0)).where(User.id.between(low, high))
+        ).all())
+        positions = {
+            (u, s): q for u, s, q in conn.execute(
+                select(Portfolio.user_id, Portfolio.stock_id, Portfolio.quantity)
+                .where(Portfolio.user_id.between(low, high))
+            )
+        }
+
+    problems = []
+    for user_id, actual in cash.items():
+        state = states.get(user_id, AccountState())
+        expected = state.cash - held_cash.get(user_id, 0.0)
+        if abs(expected - actual) > tolerance:
+            problems.append(Mismatch(user_id, None, round(expected, 2), round(actual, 2)))
+        stocks = {s for s, (q, _) in state.positions.items() if q}
+        stocks.update(s for (u, s), q in positions.items() if u == user_id and q)
+        for stock_id in sorted(stocks):
+            expected = state.quantity(stock_id) - held_shares.get((user_id, stock_id), 0)
+            actual = positions.get((user_id, stock_id), 0)
+            if expected != actual:
+                problems.append(Mismatch(user_id, stock_id, expected, actual))
+    return problems
+
+
+def verify(workers=4, chunk=1000, tolerance=0.01, recheck=1.0):
+    """Check every account's cash and positions against its ledger.
+
+    Accounts are split into id ranges of ``chunk`` and checked on
+    ``workers`` threads. An order between its reservation and settlement
+    looks like a mismatch, so flagged accounts are checked again after
+    ``recheck`` seconds and only the ones that still disagree are returned.
+    """
+    engine = db.engine
+    with engine.connect() as conn:
+        ranges = _user_ranges(conn, chunk)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        problems = [p for part in pool.map(lambda r: _verify_range(engine, *r, tolerance), ranges) for p in part]
+    if not problems or not recheck:
+        return problems
+    time.sleep(recheck)
+    again = []
+    for user_id in sorted({p.user_id for p in problems}):
+        again.extend(_verify_range(engine, user_id, user_id, tolerance))
+    return again
+
+
+class LedgerCheckpointJob:
+    """Runs checkpoint() every ``interval`` seconds in a background thread."""
+
+    def __init__(self, app, interval=3600.0, lag=60.0):
+        self.app = app
+        self.interval = interval
+        self.lag = lag
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        with self.app.app_context():
+            return checkpoint(self.lag)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                self.app.logger.exception("Ledger checkpoint failed")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="ledger-checkpoint", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,183 @@
+import threading
+from datetime import date, datetime, timedelta
+from time import monotonic
+from types import SimpleNamespace
+
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+# -------------------------
+# HOLIDAYS
+# -------------------------
+# Fixed-date holidays fall back to Friday/Monday when they land on a weekend.
+def _observed(day):
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+def _nth_weekday(year, month, weekday, n):
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+def market_holidays(year):
+    return {
+        _observed(date(year, 1, 1)): "New Year's Day",
+        _nth_weekday(year, 1, 0, 3): "Martin Luther King Jr. Day",
+        _observed(date(year, 7, 4)): "Independence Day",
+        _nth_weekday(year, 9, 0, 1): "Labor Day",
+        _observed(date(year, 12, 25)): "Christmas Day",
+    }
+
+
+# -------------------------
+# TRADING CALENDAR
+# -------------------------
+# MarketSchedule, MarketHours and the holiday rules are compiled into one
+# entry per calendar day: either the (open, close) datetimes or the reason the
+# market is shut. A lookup is a list index by date ordinal, and "next open"
+# is a second precomputed index, so status checks never touch the database.
+# Admin writes call invalidate(); other workers pick the change up within
+# `ttl` seconds.
+
+class _Compiled:
+    def __init__(self, hours, schedule, start, days):
+        self.hours = hours
+        self.schedule = schedule
+        self.start = start.toordinal()
+        self.days = []
+        self.next_open = [None] * days
+        holidays = {}
+        for year in range(start.year, (start + timedelta(days=days)).year + 1):
+            holidays.update(market_holidays(year))
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            self.days.append(_compile_day(day, schedule, holidays))
+        upcoming = None
+        for offset in range(days - 1, -1, -1):
+            if isinstance(self.days[offset], tuple):
+                upcoming = offset
+            self.next_open[offset] = upcoming
+
+    def covers(self, day):
+        return 0 <= day.toordinal() - self.start < len(self.days)
+
+    def entry(self, day):
+        return self.days[day.toordinal() - self.start]
+
+
+def _compile_day(day, schedule, holidays):
+    if schedule is None:
+        return "Market is currently closed."
+    if day in holidays:
+        return "Market closed today for a holiday."
+    weekday = DAYS[day.weekday()]
+    if not getattr(schedule, weekday):
+        return f"Market closed today ({weekday.capitalize()})."
+    open_time = getattr(schedule, f"{weekday}_open")
+    close_time = getattr(schedule, f"{weekday}_close")
+    return datetime.combine(day, open_time), datetime.combine(day, close_time)
+
+
+def _snapshot(row, fields):
+    if row is None:
+        return None
+    return SimpleNamespace(**{field: getattr(row, field) for field in fields})
+
+
+HOURS_FIELDS = ["open_time", "close_time", "is_open"]
+SCHEDULE_FIELDS = DAYS + [f"{day}_{edge}" for day in DAYS for edge in ("open", "close")]
+
+
+class TradingCalendar:
+    """Answers market-status questions from a compiled copy of the schedule.
+
+    ``load`` returns the ``(MarketHours, MarketSchedule)`` rows and is only
+    called when the compiled copy is missing, stale or invalidated. ``clock``
+    returns the current local datetime.
+    """
+
+    def __init__(self, load, ttl=60.0, window_days=400, clock=datetime.now):
+        self.load = load
+        self.ttl = ttl
+        self.window_days = window_days
+        self.clock = clock
+        self._compiled = None
+        self._compiled_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._compiled = None
+
+    def _get(self, now):
+        compiled = self._compiled
+        if (compiled is None or not compiled.covers(now.date())
+                or monotonic() - self._compiled_at > self.ttl):
+            with self._lock:
+                compiled = self._compiled
+                if (compiled is None or not compiled.covers(now.date())
+                        or monotonic() - self._compiled_at > self.ttl):
+                    hours, schedule = self.load()
+                    compiled = _Compiled(
+                        _snapshot(hours, HOURS_FIELDS),
+                        _snapshot(schedule, SCHEDULE_FIELDS),
+                        now.date() - timedelta(days=7),
+                        self.window_days,
+                    )
+                    self._compiled = compiled
+                    self._compiled_at = monotonic()
+        return compiled
+
+    @property
+    def hours(self):
+        return self._get(self.clock()).hours
+
+    @property
+    def schedule(self):
+        return self._get(self.clock()).schedule
+
+    def status(self, now=None):
+        """Return ``(is_open, reason_closed)``; the reason is None when open."""
+        now = now or self.clock()
+        entry = self._get(now).entry(now.date())
+        if isinstance(entry, str):
+            return False, entry
+        open_at, close_at = entry
+        if open_at <= now <= close_at:
+            return True, None
+        return False, (
+            f"Market closed. Hours are "
+            f"{open_at.strftime('%I:%M %p')}–{close_at.strftime('%I:%M %p')}."
+        )
+
+    def is_open(self, now=None):
+        return self.status(now)[0]
+
+    def reason_closed(self, now=None):
+        return self.status(now)[1]
+
+    def next_open(self, now=None):
+        now = now or self.clock()
+        compiled = self._get(now)
+        offset = now.date().toordinal() - compiled.start
+        entry = compiled.days[offset]
+        if isinstance(entry, tuple) and now < entry[0]:
+            return entry[0]
+        if offset + 1 >= len(compiled.days):
+            return None
+        upcoming = compiled.next_open[offset + 1]
+        return None if upcoming is None else compiled.days[upcoming][0]
+
+    def next_close(self, now=None):
+        now = now or self.clock()
+        compiled = self._get(now)
+        offset = now.date().toordinal() - compiled.start
+        entry = compiled.days[offset]
+        if isinstance(entry, tuple) and now <= entry[1]:
+            return entry[1]
+        if offset + 1 >= len(compiled.days):
+            return None
+        upcoming = compiled.next_open[offset + 1]
+        return None if upcoming is None else compiled.days[upcoming][1]
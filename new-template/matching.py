@@ -0,0 +1,220 @@
+import heapq
+import threading
+from collections import deque
+
+
+BUY, SELL = "buy", "sell"
+
+
+def to_ticks(price):
+    return int(round(price * 100))
+
+def from_ticks(ticks):
+    return ticks / 100.0
+
+
+# -------------------------
+# ORDERS AND TRADES
+# -------------------------
+class Order:
+    """An order as the book sees it. ``price`` is in cents; ``ioc`` orders
+    never rest (market orders are IOC limits at the quoted price)."""
+
+    __slots__ = ("id", "user_id", "stock_id", "side", "price", "quantity", "remaining", "ioc")
+
+    def __init__(self, id, user_id, stock_id, side, price, quantity, ioc=False):
+        self.id = id
+        self.user_id = user_id
+        self.stock_id = stock_id
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.remaining = quantity
+        self.ioc = ioc
+
+    @property
+    def filled(self):
+        return self.quantity - self.remaining
+
+
+class Trade:
+    """One fill. ``buy``/``sell`` is None when the house took that side."""
+
+    __slots__ = ("stock_id", "price", "quantity", "buy", "sell")
+
+    def __init__(self, stock_id, price, quantity, buy, sell):
+        self.stock_id = stock_id
+        self.price = price
+        self.quantity = quantity
+        self.buy = buy
+        self.sell = sell
+
+
+# -------------------------
+# ORDER BOOK
+# -------------------------
+# Each side is a dict of price level -> FIFO deque plus a heap of the level
+# prices (bids negated), so the best level is heap[0] and a level is only
+# pushed once when it is created. Cancelled orders are left in their deque
+# with remaining=0 and skipped when they reach the front.
+#
+# The house stands in as counterparty at the reference price: it sells up to
+# `liquidity` shares (Stock.volume) and buys whatever is offered to it.
+# Resting user orders at the same price keep priority over the house.
+
+class OrderBook:
+    def __init__(self, stock_id, liquidity=0):
+        self.stock_id = stock_id
+        self.liquidity = liquidity
+        self.bids = {}
+        self.asks = {}
+        self._bid_heap = []
+        self._ask_heap = []
+
+    def best_bid(self):
+        return self._best(self.bids, self._bid_heap, -1)
+
+    def best_ask(self):
+        return self._best(self.asks, self._ask_heap, 1)
+
+    def _best(self, levels, heap, sign):
+        while heap:
+            price = heap[0] * sign
+            queue = levels[price]
+            while queue and queue[0].remaining == 0:
+                queue.popleft()
+            if queue:
+                return price
+            del levels[price]
+            heapq.heappop(heap)
+        return None
+
+    def rest(self, order):
+        if order.side == BUY:
+            levels, heap, key = self.bids, self._bid_heap, -order.price
+        else:
+            levels, heap, key = self.asks, self._ask_heap, order.price
+        queue = levels.get(order.price)
+        if queue is None:
+            queue = levels[order.price] = deque()
+            heapq.heappush(heap, key)
+        queue.append(order)
+
+    def match(self, order, reference):
+        """Fill ``order`` against the book and the house; returns trades."""
+        trades = []
+        buying = order.side == BUY
+        levels = self.asks if buying else self.bids
+        best = self.best_ask if buying else self.best_bid
+
+        while order.remaining:
+            level = best()
+            if buying:
+                book_ok = level is not None and level <= order.price
+                house_ok = reference is not None and self.liquidity > 0 and reference <= order.price
+                use_book = book_ok and (not house_ok or level <= reference)
+            else:
+                book_ok = level is not None and level >= order.price
+                house_ok = reference is not None and reference >= order.price
+                use_book = book_ok and (not house_ok or level >= reference)
+
+            if use_book:
+                queue = levels[level]
+                maker = queue[0]
+                qty = min(order.remaining, maker.remaining)
+                maker.remaining -= qty
+                order.remaining -= qty
+                if maker.remaining == 0:
+                    queue.popleft()
+                trades.append(Trade(
+                    self.stock_id, level, qty,
+                    order if buying else maker, maker if buying else order,
+                ))
+            elif house_ok:
+                qty = min(order.remaining, self.liquidity) if buying else order.remaining
+                order.remaining -= qty
+                self.liquidity += -qty if buying else qty
+                trades.append(Trade(
+                    self.stock_id, reference, qty,
+                    order if buying else None, None if buying else order,
+                ))
+            else:
+                break
+        return trades
+
+    def depth(self, levels=5):
+        def side(book, prices):
+            out = []
+            for price in prices:
+                qty = sum(o.remaining for o in book[price])
+                if qty:
+                    out.append((from_ticks(price), qty))
+                if len(out) == levels:
+                    break
+            return out
+        return {
+            "bids": side(self.bids, sorted(self.bids, reverse=True)),
+            "asks": side(self.asks, sorted(self.asks)),
+        }
+
+
+# -------------------------
+# MATCHING ENGINE
+# -------------------------
+class MatchingEngine:
+    """One OrderBook per stock behind a single lock.
+
+    ``submit`` returns the trades an order produced; whatever is left of a
+    non-IOC order rests on the book, an IOC remainder is simply dropped and
+    left in ``order.remaining`` for the caller to release.
+    """
+
+    def __init__(self):
+        self.books = {}
+        self.orders = {}
+        self._lock = threading.Lock()
+
+    def book(self, stock_id, liquidity=0):
+        book = self.books.get(stock_id)
+        if book is None:
+            book = self.books[stock_id] = OrderBook(stock_id, liquidity)
+        return book
+
+    def set_liquidity(self, stock_id, liquidity):
+        with self._lock:
+            self.book(stock_id).liquidity = liquidity
+
+    def submit(self, order, reference=None, liquidity=0):
+        with self._lock:
+            book = self.books.get(order.stock_id)
+            if book is None:
+                book = self.book(order.stock_id, liquidity)
+            ref = None if reference is None else to_ticks(reference)
+            trades = book.match(order, ref)
+            for t in trades:
+                maker = t.sell if order.side == BUY else t.buy
+                if maker is not None and maker.remaining == 0:
+                    self.orders.pop(maker.id, None)
+            if order.remaining and not order.ioc:
+                book.rest(order)
+                self.orders[order.id] = order
+        return trades
+
+    def cancel(self, order_id):
+        """Pull a resting order; returns ``(order, cancelled_qty)`` or None."""
+        with self._lock:
+            order = self.orders.pop(order_id, None)
+            if order is None:
+                return None
+            cancelled = order.remaining
+            order.remaining = 0
+        return order, cancelled
+
+    def restore(self, orders, liquidity):
+        """Put persisted resting orders back on their books after a restart."""
+        with self._lock:
+            for stock_id, volume in liquidity.items():
+                self.book(stock_id).liquidity = volume
+            for order in orders:
+                self.book(order.stock_id).rest(order)
+                self.orders[order.id] = order
@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import before_render_template, request, template_rendered
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+
+
+# -------------------------
+# HISTOGRAMS
+# -------------------------
+# Cumulative-bucket histograms in the Prometheus layout, keyed by label
+# values. An observation is a bisect and three increments under one lock.
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: ([*v[0]], v[1], v[2]) for k, v in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            running = 0
+            for bound, n in zip(self.buckets, counts):
+                running += n
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {running}')
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                    for n, v in zip(names, values))
+
+
+def _gauge(name, help, value, kind="gauge"):
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+
+# -------------------------
+# REQUEST METRICS
+# -------------------------
+# Per request (thread-local, so background threads such as the price feed
+# are ignored): wall time, number and total time of SQL statements, and
+# template render time. A statement slower than slow_query_ms is logged and
+# counted; the same statement text run n_plus_one times or more in one
+# request is logged and counted as a likely N+1. Each response also gets a
+# Server-Timing header, which browser dev tools show per request.
+
+class RequestMetrics:
+    def __init__(self, app, slow_query_ms=100.0, n_plus_one=10):
+        self.app = app
+        self.slow_query = slow_query_ms / 1000.0
+        self.n_plus_one = n_plus_one
+        self._local = threading.local()
+
+        self.request_seconds = Histogram(
+            "http_request_duration_seconds", "Wall time per request.", ("endpoint", "method"), SECONDS_BUCKETS)
+        self.db_seconds = Histogram(
+            "http_request_db_seconds", "Time spent in SQL statements per request.", ("endpoint",), SECONDS_BUCKETS)
+        self.db_queries = Histogram(
+            "http_request_db_queries", "SQL statements per request.", ("endpoint",), COUNT_BUCKETS)
+        self.template_seconds = Histogram(
+            "http_request_template_seconds", "Template render time per request.", ("endpoint",), SECONDS_BUCKETS)
+        self.responses = Counter(
+            "http_responses_total", "Responses by endpoint and status code.", ("endpoint", "status"))
+        self.slow_queries = Counter(
+            "db_slow_queries_total", "Statements slower than the slow-query threshold.", ("endpoint",))
+        self.n_plus_one_total = Counter(
+            "db_n_plus_one_total", "Requests that repeated one statement past the N+1 threshold.", ("endpoint",))
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        before_render_template.connect(self._template_start, app)
+        template_rendered.connect(self._template_end, app)
+        # Only this app's engines (primary and replicas): listening on Engine
+        # itself would add another pair of listeners on every create_app().
+        from models import db
+
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._sql_start)
+            event.listen(engine, "after_cursor_execute", self._sql_end)
+            event.listen(engine, "handle_error", self._sql_error)
+
+    # --- hooks ---
+    def _start(self):
+        state = self._local
+        state.active = True
+        state.started = time.perf_counter()
+        state.sql_count = 0
+        state.sql_time = 0.0
+        state.template_time = 0.0
+        state.template_started = None
+        state.statements = defaultdict(int)
+
+    def _sql_start(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self._local, "active", False):
+            conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    def _sql_end(self, conn, cursor, statement, parameters, context, executemany):
+        state = self._local
+        if not getattr(state, "active", False):
+            return
+        stack = conn.info.get("metrics_started")
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        state.sql_count += 1
+        state.sql_time += elapsed
+        state.statements[statement] += 1
+        if elapsed >= self.slow_query:
+            self.slow_queries.inc((self._endpoint(),))
+            log.warning("Slow query (%.1f ms) in %s: %s", elapsed * 1000, self._endpoint(), statement[:200])
+
+    def _sql_error(self, context):
+        # A failed statement never reaches after_cursor_execute; drop its
+        # start time so the next statement doesn't pop it.
+        conn = context.connection
+        if conn is None or context.execution_context is None:
+            return
+        stack = conn.info.get("metrics_started")
+        if stack and getattr(self._local, "active", False):
+            stack.pop()
+
+    def _template_start(self, sender, template, context, **extra):
+        if getattr(self._local, "active", False):
+            self._local.template_started = time.perf_counter()
+
+    def _template_end(self, sender, template, context, **extra):
+        state = self._local
+        if getattr(state, "active", False) and state.template_started is not None:
+            state.template_time += time.perf_counter() - state.template_started
+            state.template_started = None
+
+    def _finish(self, response):
+        state = self._local
+        if not getattr(state, "active", False):
+            return response
+        endpoint = self._endpoint()
+        elapsed = time.perf_counter() - state.started
+        self.request_seconds.observe((endpoint, request.method), elapsed)
+        self.db_seconds.observe((endpoint,), state.sql_time)
+        self.db_queries.observe((endpoint,), state.sql_count)
+        self.template_seconds.observe((endpoint,), state.template_time)
+        self.responses.inc((endpoint, response.status_code))
+
+        repeated = [(n, s) for s, n in state.statements.items() if n >= self.n_plus_one]
+        if repeated:
+            self.n_plus_one_total.inc((endpoint,))
+            count, statement = max(repeated)
+            log.warning("Possible N+1 in %s: %d runs of %s", endpoint, count, statement[:200])
+
+        response.headers["Server-Timing"] = (
+            f"app;dur={elapsed * 1000:.1f}, "
+            f'db;dur={state.sql_time * 1000:.1f};desc="{state.sql_count} queries", '
+            f"tpl;dur={state.template_time * 1000:.1f}"
+        )
+        state.active = False
+        return response
+
+    def _teardown(self, exc):
+        # Requests that raised never reach after_request.
+        state = self._local
+        if getattr(state, "active", False):
+            endpoint = self._endpoint()
+            self.request_seconds.observe((endpoint, request.method), time.perf_counter() - state.started)
+            self.responses.inc((endpoint, 500))
+            state.active = False
+
+    @staticmethod
+    def _endpoint():
+        rule = request.url_rule
+        return rule.endpoint if rule is not None else "unmatched"
+
+    # --- exposition ---
+    def render(self, extra=()):
+        lines = []
+        for metric in (self.request_seconds, self.db_seconds, self.db_queries, self.template_seconds,
+                       self.responses, self.slow_queries, self.n_plus_one_total):
+            lines.extend(metric.render())
+        for name, help, value, kind in extra:
+            lines.extend(_gauge(name, help, value, kind))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,152 @@
+from datetime import datetime, time
+
+from flask_login import UserMixin
+from flask_sqlalchemy import SQLAlchemy
+
+from replicas import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+# -------------------------
+# MODELS
+# -------------------------
+class User(db.Model, UserMixin):
+    id = db.Column(db.Integer, primary_key=True)
+    full_name = db.Column(db.String(100), nullable=False)
+    username = db.Column(db.String(50), unique=True, nullable=False)
+    email = db.Column(db.String(100), unique=True, nullable=False)
+    password = db.Column(db.String(250), nullable=False)
+    role = db.Column(db.String(50), default="user", nullable=False)
+    cash_balance = db.Column(db.Float, default=0.0)
+    portfolios = db.relationship('Portfolio', backref='owner', lazy=True)
+    transactions = db.relationship('Transaction', backref='user', lazy=True)
+
+class Stock(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    company_name = db.Column(db.String(100), nullable=False)
+    ticker = db.Column(db.String(10), unique=True, nullable=False)
+    initial_price = db.Column(db.Float, nullable=False)
+    portfolios = db.relationship('Portfolio', backref='stock', lazy=True)
+    transactions = db.relationship('Transaction', backref='stock', lazy=True)
+    volume = db.Column(db.Integer, nullable=False)
+
+class Portfolio(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    stock_id = db.Column(db.Integer, db.ForeignKey('stock.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    average_price = db.Column(db.Float, nullable=False, default=0.0)
+
+class Transaction(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    stock_id = db.Column(db.Integer, db.ForeignKey('stock.id'), nullable=False)
+    order_type = db.Column(db.String(10), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+
+    # Order history pages walk a user's rows by id, optionally for one stock.
+    __table_args__ = (
+        db.Index('ix_transaction_user_id_id', 'user_id', 'id'),
+        db.Index('ix_transaction_user_id_stock_id_id', 'user_id', 'stock_id', 'id'),
+    )
+
+class Watchlist(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    stock_id = db.Column(db.Integer, db.ForeignKey('stock.id'), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'stock_id', name='uq_watchlist_user_id_stock_id'),
+    )
+
+class LimitOrder(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    stock_id = db.Column(db.Integer, db.ForeignKey('stock.id'), nullable=False)
+    side = db.Column(db.String(4), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    remaining = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(10), default="open", nullable=False, index=True)
+    stock = db.relationship('Stock')
+
+class EquitySnapshot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    cash = db.Column(db.Float, nullable=False)
+    cost_basis = db.Column(db.Float, nullable=False)
+    market_value = db.Column(db.Float, nullable=False)
+    unrealized_pnl = db.Column(db.Float, nullable=False)
+    equity = db.Column(db.Float, nullable=False)
+    user = db.relationship('User')
+
+    # One mark-to-market run writes every account with the same taken_at.
+    __table_args__ = (
+        db.Index('ix_equity_snapshot_user_id_taken_at', 'user_id', 'taken_at'),
+        db.Index('ix_equity_snapshot_taken_at_equity', 'taken_at', 'equity'),
+    )
+
+class LedgerEntry(db.Model):
+    """One trade or cash movement; rows are only ever inserted."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    kind = db.Column(db.String(10), nullable=False)
+    stock_id = db.Column(db.Integer, db.ForeignKey('stock.id'))
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    price = db.Column(db.Float)
+    amount = db.Column(db.Float, nullable=False, default=0.0)
+
+    # Rebuilds read one account's entries after a checkpoint, in time order.
+    __table_args__ = (
+        db.Index('ix_ledger_entry_user_id_created_at', 'user_id', 'created_at', 'id'),
+    )
+
+class LedgerCheckpoint(db.Model):
+    """An account's cash and positions folded from every entry up to taken_at."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+    cash = db.Column(db.Float, nullable=False)
+    positions = db.Column(db.JSON, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_ledger_checkpoint_user_id_taken_at', 'user_id', 'taken_at'),
+    )
+
+class MarketHours(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    open_time = db.Column(db.Time, nullable=False)
+    close_time = db.Column(db.Time, nullable=False)
+    is_open = db.Column(db.Boolean, default=False)
+
+class MarketSchedule(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Day toggles
+    monday = db.Column(db.Boolean, default=True)
+    tuesday = db.Column(db.Boolean, default=True)
+    wednesday = db.Column(db.Boolean, default=True)
+    thursday = db.Column(db.Boolean, default=True)
+    friday = db.Column(db.Boolean, default=True)
+    saturday = db.Column(db.Boolean, default=False)
+    sunday = db.Column(db.Boolean, default=False)
+
+    # Day-specific hours
+    monday_open = db.Column(db.Time, default=time(9, 0))
+    monday_close = db.Column(db.Time, default=time(16, 0))
+    tuesday_open = db.Column(db.Time, default=time(9, 0))
+    tuesday_close = db.Column(db.Time, default=time(16, 0))
+    wednesday_open = db.Column(db.Time, default=time(9, 0))
+    wednesday_close = db.Column(db.Time, default=time(16, 0))
+    thursday_open = db.Column(db.Time, default=time(9, 0))
+    thursday_close = db.Column(db.Time, default=time(16, 0))
+    friday_open = db.Column(db.Time, default=time(9, 0))
+    friday_close = db.Column(db.Time, default=time(16, 0))
+    saturday_open = db.Column(db.Time, default=time(9, 0))
+    saturday_close = db.Column(db.Time, default=time(16, 0))
+    sunday_open = db.Column(db.Time, default=time(9, 0))
+    sunday_close = db.Column(db.Time, default=time(16, 0))
@@ -0,0 +1,135 @@
+import os
+import threading
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+import trading
+
+
+# -------------------------
+# ORDER DESK
+# -------------------------
+# The order book must live in exactly one process, or a resting order can
+# fill once per copy of the book. The process that runs the market (see
+# claim_market() in services.py) owns it. Workers that attach to the
+# standalone producer with PRICE_FEED_SHM do not restore a book of their
+# own; trading.py sends their order entry here instead. That is one pickled
+# call per order over a Unix socket in the instance folder, answered by the
+# producer with the same functions a single-process app runs locally.
+#
+# Each worker thread keeps one connection and the desk serves each connection
+# on its own thread, so concurrent orders still settle in shared batches.
+
+OPERATIONS = {
+    "submit_order": trading.submit_order,
+    "submit_orders": trading.submit_orders,
+    "cancel_order": trading.cancel_order,
+    "set_liquidity": trading.set_liquidity,
+}
+
+
+class OrderDeskError(Exception):
+    pass
+
+
+def desk_address(app):
+    return app.config["ORDER_DESK_SOCKET"] or os.path.join(app.instance_path, "orders.sock")
+
+
+def desk_authkey(app):
+    # Anyone who can reach the socket and knows the key can trade as any
+    # user, so there is no default to fall back on.
+    key = app.config["ORDER_DESK_AUTHKEY"]
+    if not key:
+        raise RuntimeError(
+            "ORDER_DESK_AUTHKEY is not set; the producer and every worker need "
+            "the same secret for the order desk."
+        )
+    return key.encode()
+
+
+class OrderDesk:
+    """Serves OPERATIONS to OrderDeskClient connections (producer side)."""
+
+    def __init__(self, app, address, authkey):
+        self.app = app
+        self.address = address
+        self.authkey = authkey
+        self._listener = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # The market lock is held, so a socket file left here is stale.
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        self._listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+        self._thread = threading.Thread(target=self._accept, name="order-desk", daemon=True)
+        self._thread.start()
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError:
+                self.app.logger.warning("Order desk rejected a connection with the wrong key")
+                continue
+            except OSError:
+                if self._stop.is_set():
+                    return
+                raise
+            threading.Thread(target=self._serve, args=(conn,), name="order-desk-conn", daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    name, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    with self.app.app_context():
+                        reply = ("ok", OPERATIONS[name](*args))
+                except Exception as exc:
+                    self.app.logger.exception("Order desk call %s failed", name)
+                    reply = ("error", f"{type(exc).__name__}: {exc}")
+                conn.send(reply)
+
+    def stop(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+class OrderDeskClient:
+    """Forwards order entry to the OrderDesk (worker side)."""
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        # The desk never speaks first, so a readable idle connection means
+        # the producer closed it (e.g. it restarted): reconnect before sending.
+        if conn is not None and conn.poll():
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = self._local.conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+        return conn
+
+    def call(self, name, *args):
+        conn = self._connection()
+        try:
+            conn.send((name, args))
+            status, value = conn.recv()
+        except (EOFError, OSError) as exc:
+            self._local.conn = None
+            raise OrderDeskError(f"lost the order desk during {name}: {exc}") from exc
+        if status == "error":
+            raise OrderDeskError(value)
+        return value
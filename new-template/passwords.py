@@ -0,0 +1,76 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+# -------------------------
+# PASSWORD HASHING
+# -------------------------
+# Hashes are computed on a small fixed pool instead of the request thread, so
+# a login burst uses at most `workers` cores and the rest of the app keeps
+# going. At most workers + queue hashes are in flight; past that a caller
+# waits up to `timeout` seconds for a slot and then gets HasherBusy, which
+# the views turn into a 503 rather than letting requests pile up.
+#
+# `method` is any werkzeug method string ("scrypt", "scrypt:32768:8:1",
+# "pbkdf2:sha256:600000", ...). Stored hashes made with other parameters are
+# replaced on the next successful login.
+
+class HasherBusy(Exception):
+    pass
+
+
+def hash_prefix(method):
+    """The part before the first "$" of a hash made with ``method``, with
+    werkzeug's defaults filled in ("scrypt" -> "scrypt:32768:8:1").
+
+    Worked out from the string: hashing once to find out costs a full
+    scrypt run on every create_app().
+    """
+    name, *params = method.split(":")
+    if name == "scrypt":
+        if not params:
+            return "scrypt:32768:8:1"
+        if len(params) == 3 and all(p.isdigit() for p in params):
+            return "scrypt:" + ":".join(str(int(p)) for p in params)
+    elif name == "pbkdf2" and len(params) <= 2:
+        hash_name = params[0] if params else "sha256"
+        iterations = params[1] if len(params) == 2 else str(DEFAULT_PBKDF2_ITERATIONS)
+        if hash_name in hashlib.algorithms_available and iterations.isdigit():
+            return f"pbkdf2:{hash_name}:{int(iterations)}"
+    # Anything else: let werkzeug resolve it, or reject it.
+    return generate_password_hash("", method).split("$", 1)[0]
+
+
+class PasswordHasher:
+    def __init__(self, method="scrypt", workers=2, queue=64, timeout=5.0):
+        self.method = method
+        self.timeout = timeout
+        self.prefix = hash_prefix(method)
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HasherBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split("$", 1)[0] != self.prefix
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
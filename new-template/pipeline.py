@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+# -------------------------
+# GROUP COMMIT
+# -------------------------
+# With WRITE_PIPELINE_ENABLED, reservations, settlements, deposits and
+# withdrawals are not committed by the request thread. run() queues the
+# write and waits; one writer thread collects whatever arrives within
+# `window` seconds (or `max_batch` writes, whichever comes first), executes
+# them in order on one connection and commits once. Every caller gets its
+# own return value, but only after that commit, so nothing is reported
+# before it is durable.
+#
+# A group behaves as if its writes had run one after another: each sees the
+# ones before it. If any of them raises, the group is rolled back and its
+# writes are run again one transaction each, so a single failing write (a
+# conflict, a constraint) only fails its own caller.
+#
+# Off by default: a lone request pays up to `window` of extra latency, which
+# only buys something when many requests write at once.
+
+class WritePipeline:
+    def __init__(self, app, window=0.002, max_batch=256):
+        self.app = app
+        self.window = window
+        self.max_batch = max_batch
+        self.groups = 0
+        self.operations = 0
+        self.fallbacks = 0
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._engine = None
+        app.extensions["write_pipeline"] = self
+
+    def run(self, fn, *args):
+        """Run ``fn(conn, *args)`` in the next group commit and return its result."""
+        if self._thread is None:
+            self._start()
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future.result()
+
+    def _start(self):
+        from models import db
+
+        with self._lock:
+            if self._thread is None:
+                self._engine = db.engine
+                self._thread = threading.Thread(target=self._loop, name="write-pipeline", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        # Returns (group, stopping); None on the queue is close()'s sentinel.
+        item = self._queue.get()
+        group = []
+        deadline = time.monotonic() + self.window
+        while item is not None:
+            group.append(item)
+            remaining = deadline - time.monotonic()
+            if len(group) >= self.max_batch or remaining <= 0:
+                return group, False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return group, False
+        return group, True
+
+    def _loop(self):
+        stopping = False
+        while not stopping:
+            group, stopping = self._collect()
+            self._commit(group)
+
+    def _commit(self, group):
+        if not group:
+            return
+        try:
+            with self._engine.begin() as conn:
+                results = [fn(conn, *args) for fn, args, _ in group]
+        except Exception:
+            self.fallbacks += 1
+            for fn, args, future in group:
+                self._run_alone(fn, args, future)
+        else:
+            for (_, _, future), result in zip(group, results):
+                future.set_result(result)
+        self.groups += 1
+        self.operations += len(group)
+
+    def _run_alone(self, fn, args, future):
+        try:
+            with self._engine.begin() as conn:
+                result = fn(conn, *args)
+        except BaseException as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def close(self):
+        """Commit what is queued and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return dict(groups=self.groups, operations=self.operations, fallbacks=self.fallbacks)
@@ -0,0 +1,330 @@
+import json
+import logging
+import os
+import signal
+import threading
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from pricing import PriceEngine
+
+log = logging.getLogger(__name__)
+
+
+# -------------------------
+# SHARED PRICE TABLE
+# -------------------------
+# Layout of the shared segment:
+#
+#   header   8 x uint64   magic, seq, capacity, depth, map_version, map_len
+#   map      capacity*16  JSON {ticker: stock_id}
+#   ring     depth x capacity float64 price rows, row = seq % depth
+#   traded   capacity float64 shares traded per stock since the table was made
+#
+# One producer writes, every worker reads straight out of the segment. The
+# producer fills row (seq + 1) % depth before bumping seq, so the row a reader
+# picked stays stable for depth - 1 ticks. Older rows double as a short quote
+# history: a fill can be priced at the exact tick the user was shown.
+# Settlement in the producer adds to `traded` once fills are committed, and
+# every process's candle store turns the running totals into bucket volume.
+
+MAGIC = 0x5354524545545032  # "STREETP2"
+HEADER_WORDS = 8
+MAP_BYTES_PER_SLOT = 16
+
+H_MAGIC, H_SEQ, H_CAPACITY, H_DEPTH, H_MAP_VERSION, H_MAP_LEN = range(6)
+
+
+class SharedPriceTable:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER_WORDS,), dtype=np.uint64, buffer=shm.buf)
+        if int(self.header[H_MAGIC]) != MAGIC:
+            raise ValueError(f"Shared memory segment '{shm.name}' is not a price table.")
+        self.capacity = int(self.header[H_CAPACITY])
+        self.depth = int(self.header[H_DEPTH])
+        map_offset = HEADER_WORDS * 8
+        self._map_size = self.capacity * MAP_BYTES_PER_SLOT
+        self._map = shm.buf[map_offset:map_offset + self._map_size]
+        self.ring = np.ndarray(
+            (self.depth, self.capacity), dtype=np.float64,
+            buffer=shm.buf, offset=map_offset + self._map_size,
+        )
+        self.traded = np.ndarray(
+            (self.capacity,), dtype=np.float64,
+            buffer=shm.buf, offset=map_offset + self._map_size + self.depth * self.capacity * 8,
+        )
+        self._tickers = {}
+        self._tickers_version = None
+
+    @classmethod
+    def create(cls, name=None, capacity=16384, depth=32):
+        size = HEADER_WORDS * 8 + capacity * MAP_BYTES_PER_SLOT + (depth + 1) * capacity * 8
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((HEADER_WORDS,), dtype=np.uint64, buffer=shm.buf)
+        header[:] = 0
+        header[H_CAPACITY] = capacity
+        header[H_DEPTH] = depth
+        header[H_MAGIC] = MAGIC
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        shm = shared_memory.SharedMemory(name=name)
+        # Readers must not let the resource tracker unlink the producer's
+        # segment when they exit.
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def seq(self):
+        return int(self.header[H_SEQ])
+
+    # --- producer side ---
+    def publish(self, prices):
+        n = min(len(prices), self.capacity)
+        seq = int(self.header[H_SEQ]) + 1
+        row = self.ring[seq % self.depth]
+        row[:n] = prices[:n]
+        row[n:] = 0.0
+        self.header[H_SEQ] = seq
+        return seq
+
+    def add_traded(self, volumes):
+        # {stock_id: shares}; ids past capacity aren't quoted, so aren't charted.
+        for stock_id, quantity in volumes.items():
+            if 0 <= stock_id < self.capacity:
+                self.traded[stock_id] += quantity
+
+    def set_tickers(self, tickers):
+        data = json.dumps(tickers, separators=(",", ":")).encode()
+        if len(data) > self._map_size:
+            raise ValueError("Ticker map does not fit in the shared price table.")
+        version = int(self.header[H_MAP_VERSION])
+        self.header[H_MAP_VERSION] = version + 1  # odd: map is being written
+        self._map[:len(data)] = data
+        self.header[H_MAP_LEN] = len(data)
+        self.header[H_MAP_VERSION] = version + 2
+
+    # --- reader side ---
+    def price(self, stock_id):
+        if not 0 <= stock_id < self.capacity:
+            return None
+        value = float(self.ring[self.seq % self.depth, stock_id])
+        return round(value, 2) if value > 0 else None
+
+    def prices(self, stock_ids):
+        return self.quote(stock_ids)[1]
+
+    def quote(self, stock_ids):
+        # Prices for several stocks taken from one tick, plus that tick's seq
+        # so a later fill can be priced with price_at().
+        seq = self.seq
+        row = self.ring[seq % self.depth]
+        result = {}
+        for i in stock_ids:
+            if 0 <= i < self.capacity and row[i] > 0:
+                result[i] = round(float(row[i]), 2)
+        return seq, result
+
+    def price_array(self, stock_ids):
+        # Vectorised quote(): float64 prices in the order of stock_ids, 0 where
+        # a stock is not listed.
+        seq = self.seq
+        ids = np.asarray(stock_ids, dtype=np.int64)
+        prices = np.zeros(len(ids))
+        inside = (ids >= 0) & (ids < self.capacity)
+        prices[inside] = self.ring[seq % self.depth][ids[inside]]
+        return seq, prices.round(2)
+
+    def price_at(self, seq, stock_id, max_age=None):
+        # Price a stock at an earlier tick, or None once that tick is more
+        # than ``max_age`` ticks old (at most depth - 2, before the ring
+        # overwrites it).
+        if not 0 <= stock_id < self.capacity:
+            return None
+        max_age = self.depth - 2 if max_age is None else min(max_age, self.depth - 2)
+        if not 0 <= self.seq - seq <= max_age:
+            return None
+        value = float(self.ring[seq % self.depth, stock_id])
+        if not 0 <= self.seq - seq <= max_age:
+            return None
+        return round(value, 2) if value > 0 else None
+
+    def snapshot(self):
+        seq = self.seq
+        return seq, self.ring[seq % self.depth]
+
+    def tickers(self):
+        version = int(self.header[H_MAP_VERSION])
+        if version != self._tickers_version and version % 2 == 0:
+            data = bytes(self._map[:int(self.header[H_MAP_LEN])])
+            if int(self.header[H_MAP_VERSION]) == version:
+                self._tickers = json.loads(data) if data else {}
+                self._tickers_version = version
+        return self._tickers
+
+    def index(self, ticker):
+        return self.tickers().get(ticker)
+
+    def close(self):
+        self.header = None
+        self.ring = None
+        self.traded = None
+        self._map.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# -------------------------
+# PRODUCER
+# -------------------------
+class PriceFeed:
+    """Ticks a PriceEngine and publishes every tick into a SharedPriceTable.
+
+    ``load_stocks`` returns rows with ``id``, ``ticker``, ``initial_price`` and
+    ``volume``; it is re-run every ``refresh_interval`` seconds (or right away
+    after ``request_refresh()``) to pick up listing changes.
+    """
+
+    def __init__(self, table, load_stocks, tick_interval=1.0, refresh_interval=5.0, engine=None):
+        self.table = table
+        self.load_stocks = load_stocks
+        self.tick_interval = tick_interval
+        self.refresh_interval = refresh_interval
+        self.engine = engine or PriceEngine(tick_interval=tick_interval)
+        self._refresh = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._dropped = []
+
+    def refresh(self):
+        stocks = list(self.load_stocks())
+        dropped = sorted(s.id for s in stocks if s.id >= self.table.capacity)
+        if dropped != self._dropped:
+            self._dropped = dropped
+            if dropped:
+                log.warning("%d listed stocks have ids past the price table's capacity of %d and get "
+                            "no price (ids %s); restart with a larger PRICE_FEED_CAPACITY",
+                            len(dropped), self.table.capacity, dropped[:10])
+        stocks = [s for s in stocks if s.id < self.table.capacity]
+        self.engine.sync(stocks)
+        self.table.set_tickers({s.ticker: s.id for s in stocks})
+        self.table.publish(self.engine.snapshot()[1])
+
+    def request_refresh(self):
+        self._refresh.set()
+
+    def run(self):
+        self.refresh()
+        self._loop()
+
+    def _loop(self):
+        # A failed refresh (say the database is briefly unreachable) keeps
+        # ticking the listings it already has and is retried next interval.
+        since_refresh = 0.0
+        while not self._stop.wait(self.tick_interval):
+            since_refresh += self.tick_interval
+            if self._refresh.is_set() or since_refresh >= self.refresh_interval:
+                self._refresh.clear()
+                since_refresh = 0.0
+                try:
+                    self.refresh()
+                except Exception:
+                    log.exception("Price feed refresh failed; retrying next interval")
+            try:
+                self.engine.tick(self.tick_interval)
+                self.table.publish(self.engine.snapshot()[1])
+            except Exception:
+                log.exception("Price feed tick failed")
+
+    def start(self):
+        self.refresh()
+        self._thread = threading.Thread(target=self._loop, name="price-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def default_table_name():
+    return os.environ.get("PRICE_FEED_SHM") or f"stockstreet-{uuid.uuid4().hex[:12]}"
+
+
+# -------------------------
+# STANDALONE PRODUCER
+# -------------------------
+# Run one of these next to the gunicorn workers and start the workers with the
+# same PRICE_FEED_SHM name. It also owns the order book and takes the
+# workers' orders on ORDER_DESK_SOCKET (see orderdesk.py), which all of them
+# authenticate with the same ORDER_DESK_AUTHKEY:
+#
+#   export ORDER_DESK_AUTHKEY=$(python -c "import secrets; print(secrets.token_hex(32))")
+#   PRICE_FEED_SHM=stockstreet python pricefeed.py
+#   PRICE_FEED_SHM=stockstreet gunicorn -w 4 "app:create_app()"
+if __name__ == "__main__":
+    name = os.environ.get("PRICE_FEED_SHM", "stockstreet")
+
+    from app import create_app
+    from candles import CandleStore
+    from ledger import LedgerCheckpointJob, open_accounts
+    from valuation import MarkToMarketJob
+
+    from orderdesk import OrderDesk, desk_address, desk_authkey
+    from services import claim_market
+    from trading import restore_book
+
+    app = create_app()
+    services = app.extensions["market_services"]
+    authkey = desk_authkey(app)
+    market_lock = claim_market(app)
+    table = SharedPriceTable.create(
+        name=name,
+        capacity=app.config["PRICE_FEED_CAPACITY"],
+        depth=int(os.environ.get("PRICE_FEED_DEPTH", 32)),
+    )
+    app.extensions["price_table"] = table
+    feed = PriceFeed(table, services.load_stock_rows)
+    CandleStore(
+        os.path.join(app.instance_path, "candles"), spill=True, retention=app.config["CANDLE_RETENTION_DAYS"],
+    ).follow(table)
+    with app.app_context():
+        open_accounts()
+        restore_book()
+    mark_job = MarkToMarketJob(
+        app, table, app.config["MARK_TO_MARKET_INTERVAL"],
+        services.trading_calendar.is_open, app.config["EQUITY_SNAPSHOT_RETENTION_DAYS"],
+    )
+    mark_job.start()
+    checkpoint_job = LedgerCheckpointJob(
+        app, app.config["LEDGER_CHECKPOINT_INTERVAL"], app.config["LEDGER_CHECKPOINT_LAG"],
+    )
+    checkpoint_job.start()
+    desk = OrderDesk(app, desk_address(app), authkey)
+    desk.start()
+    signal.signal(signal.SIGTERM, lambda *_: feed.stop())
+    print(f"Publishing prices to shared memory '{table.name}'")
+    try:
+        feed.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        desk.stop()
+        mark_job.stop()
+        checkpoint_job.stop()
+        table.close()
@@ -0,0 +1,103 @@
+import threading
+
+import numpy as np
+
+
+# -------------------------
+# MARKET PRICE ENGINE
+# -------------------------
+# One float64 slot per Stock.id. Every tick advances all prices at once with
+# geometric Brownian motion; lower-volume stocks get a wider volatility band.
+# A tick writes into a spare buffer and then swaps the reference, so
+# snapshot() hands out one complete tick; the array is reused two ticks
+# later, so callers copy or publish it straight away.
+
+REFERENCE_VOLUME = 1000
+
+
+class PriceEngine:
+    def __init__(self, tick_interval=1.0, drift=0.0, volatility=0.02, seed=None):
+        self.tick_interval = tick_interval
+        self.drift = drift
+        self.volatility = volatility
+        self.seq = 0
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._prices = np.zeros(0)
+        self._spare = np.zeros(0)
+        self._sigma = np.zeros(0)
+        self._noise = np.zeros(0)
+
+    # --- setup ---
+    def load(self, stocks):
+        stocks = list(stocks)
+        size = max((s.id for s in stocks), default=0) + 1
+        prices = np.zeros(size)
+        sigma = np.zeros(size)
+        for s in stocks:
+            prices[s.id] = s.initial_price
+            sigma[s.id] = self._sigma_for(s.volume)
+        with self._lock:
+            self._sigma = sigma
+            self._noise = np.empty(size)
+            self._spare = np.empty(size)
+            self._prices = prices
+            self.seq += 1
+
+    def sync(self, stocks):
+        # Keep the running price of stocks we already track, seed new ones
+        # from initial_price and zero out the ones that went away.
+        stocks = list(stocks)
+        with self._lock:
+            size = max((s.id for s in stocks), default=0) + 1
+            if size > len(self._prices):
+                self._grow(size)
+            prices = self._prices.copy()
+            sigma = np.zeros(len(prices))
+            listed = np.zeros(len(prices), dtype=bool)
+            for s in stocks:
+                if prices[s.id] <= 0:
+                    prices[s.id] = s.initial_price
+                sigma[s.id] = self._sigma_for(s.volume)
+                listed[s.id] = True
+            prices[~listed] = 0.0
+            self._sigma = sigma
+            self._prices = prices
+            self.seq += 1
+
+    def _grow(self, size):
+        size = max(size, 2 * len(self._prices))
+        for name in ("_prices", "_sigma"):
+            old = getattr(self, name)
+            new = np.zeros(size)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self._noise = np.empty(size)
+        self._spare = np.empty(size)
+
+    def _sigma_for(self, volume):
+        return self.volatility * np.sqrt(REFERENCE_VOLUME / max(volume or 1, 1))
+
+    # --- simulation ---
+    def tick(self, dt=1.0):
+        with self._lock:
+            sigma = self._sigma
+            noise = self._noise
+            out = self._spare
+            self._rng.standard_normal(out=noise)
+            noise *= sigma
+            noise *= np.sqrt(dt)
+            np.multiply(sigma, sigma, out=out)
+            out *= -0.5 * dt
+            out += self.drift * dt
+            out += noise
+            np.exp(out, out=out)
+            out *= self._prices
+            self._spare = self._prices
+            self._prices = out
+            self.seq += 1
+
+    # --- reads ---
+    def snapshot(self):
+        with self._lock:
+            return self.seq, self._prices
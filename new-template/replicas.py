@@ -0,0 +1,74 @@
+import random
+import sqlite3
+import time
+
+from flask import g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+
+
+# -------------------------
+# READ REPLICAS
+# -------------------------
+# Each URL in DATABASE_REPLICA_URLS becomes an SQLALCHEMY_BINDS entry
+# ("replica_0", "replica_1", ...). Requests to an endpoint listed in
+# REPLICA_ENDPOINTS pick one replica, and db.session reads from it for the
+# rest of the request; flushes and INSERT/UPDATE/DELETE statements always go
+# to the primary, as does everything outside a request (price feed, jobs,
+# settlement) and every Core write through db.engine.
+#
+# Read-your-writes: a successful POST/PUT/PATCH/DELETE stamps the user's
+# session, and for REPLICA_STICKY_SECONDS after that their reads stay on the
+# primary, so the portfolio right after a trade already shows it. Set the
+# window above the replicas' usual lag.
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, "is_dml", False) and has_app_context():
+            key = g.get("db_replica")
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_binds(uris, options):
+    """SQLALCHEMY_BINDS entries for the replica URLs; ``options(uri)`` gives
+    the engine options for each."""
+    return {f"replica_{i}": {"url": uri, **options(uri)} for i, uri in enumerate(uris)}
+
+
+class ReadReplicas:
+    def __init__(self, app, endpoints, sticky=5.0):
+        self.keys = [key for key in app.config.get("SQLALCHEMY_BINDS", {}) if key.startswith("replica_")]
+        self.endpoints = set(endpoints)
+        self.sticky = sticky
+        app.extensions["replicas"] = self
+        if self.keys:
+            app.before_request(self._route)
+            app.after_request(self._remember_write)
+
+    def _route(self):
+        if request.endpoint not in self.endpoints:
+            return
+        if time.time() - session.get("db_wrote_at", 0) < self.sticky:
+            return
+        g.db_replica = random.choice(self.keys)
+
+    def _remember_write(self, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            session["db_wrote_at"] = time.time()
+        return response
+
+
+def sync_sqlite(primary_uri, replica_uri):
+    """Copy a SQLite primary into a SQLite replica (local stand-in for replication)."""
+    source = sqlite3.connect(make_url(primary_uri).database)
+    target = sqlite3.connect(make_url(replica_uri).database)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,143 @@
+import atexit
+import fcntl
+import os
+import threading
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+from candles import CandleStore
+from catalog import TickerIndex
+from ledger import LedgerCheckpointJob, open_accounts
+from market_calendar import TradingCalendar
+from models import db, Stock, MarketHours, MarketSchedule
+from orderdesk import OrderDeskClient, desk_address, desk_authkey
+from pricefeed import PriceFeed, SharedPriceTable, default_table_name
+from streaming import PriceHub
+from trading import restore_book
+from valuation import MarkToMarketJob
+
+
+# -------------------------
+# MARKET SERVICES
+# -------------------------
+# Everything that runs next to the request handlers: the price table (and
+# the producer when this process owns it), candle history, the live price
+# hub, the mark-to-market and ledger checkpoint jobs, the trading calendar,
+# the ticker search index and the order book (or, for workers of a shared
+# producer, the connection to the producer's order desk).
+# Nothing here touches the database or starts a thread until the first
+# request, so building an app is cheap.
+#
+# Prices come from a single producer through shared memory. With
+# PRICE_FEED_SHM set, workers attach to the table published by
+# `python pricefeed.py`; otherwise this process runs the producer itself.
+# A market owner (this process or pricefeed.py) takes an exclusive lock in
+# the instance folder, so a second gunicorn worker without PRICE_FEED_SHM
+# fails loudly instead of running its own prices, quotes and jobs.
+
+def claim_market(app):
+    """Lock instance/market.lock for the life of the process; raises
+    RuntimeError when another process already runs the market."""
+    os.makedirs(app.instance_path, exist_ok=True)
+    handle = open(os.path.join(app.instance_path, "market.lock"), "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        raise RuntimeError(
+            "Another process already runs the market for this instance. Run several "
+            "workers against one producer: start `python pricefeed.py` and set "
+            "PRICE_FEED_SHM to its name in every worker."
+        )
+    return handle
+
+class MarketServices:
+    def __init__(self, app):
+        self.app = app
+        self.price_table = None
+        self.price_feed = None
+        self.candle_store = None
+        self.price_hub = None
+        self.mark_job = None
+        self.checkpoint_job = None
+        self.market_lock = None
+        self.trading_calendar = TradingCalendar(self.load_market_rows)
+        self.ticker_index = TickerIndex(self.load_catalog_rows)
+        self._started = False
+        self._lock = threading.Lock()
+        app.extensions["market_services"] = self
+        app.before_request(self.start)
+
+    def load_stock_rows(self):
+        with self.app.app_context():
+            return db.session.query(Stock.id, Stock.ticker, Stock.initial_price, Stock.volume).all()
+
+    def load_catalog_rows(self):
+        with self.app.app_context():
+            return db.session.query(Stock.id, Stock.ticker, Stock.company_name).all()
+
+    def load_market_rows(self):
+        with self.app.app_context():
+            return MarketHours.query.first(), MarketSchedule.query.first()
+
+    def start(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            config = self.app.config
+            try:
+                if config["PRICE_FEED_SHM"]:
+                    authkey = desk_authkey(self.app)
+                else:
+                    self.market_lock = claim_market(self.app)
+            except RuntimeError:
+                self.app.logger.critical("Refusing to start market services", exc_info=True)
+                raise
+            if config["PRICE_FEED_SHM"]:
+                self.price_table = SharedPriceTable.attach(config["PRICE_FEED_SHM"])
+                atexit.register(self.price_table.close)
+                # The producer owns the order book; orders go to its desk.
+                self.app.extensions["order_desk"] = OrderDeskClient(desk_address(self.app), authkey)
+            else:
+                with self.app.app_context():
+                    open_accounts()
+                    restore_book()
+                self.price_table = SharedPriceTable.create(
+                    name=default_table_name(), capacity=config["PRICE_FEED_CAPACITY"],
+                )
+                self.app.extensions["price_table"] = self.price_table
+                self.price_feed = PriceFeed(self.price_table, self.load_stock_rows)
+                self.price_feed.start()
+                self.mark_job = MarkToMarketJob(
+                    self.app, self.price_table, config["MARK_TO_MARKET_INTERVAL"],
+                    self.trading_calendar.is_open, config["EQUITY_SNAPSHOT_RETENTION_DAYS"],
+                )
+                self.mark_job.start()
+                self.checkpoint_job = LedgerCheckpointJob(
+                    self.app, config["LEDGER_CHECKPOINT_INTERVAL"], config["LEDGER_CHECKPOINT_LAG"],
+                )
+                self.checkpoint_job.start()
+                atexit.register(self.price_table.close)
+                atexit.register(self.price_feed.stop)
+                atexit.register(self.mark_job.stop)
+                atexit.register(self.checkpoint_job.stop)
+
+            self.candle_store = CandleStore(
+                os.path.join(self.app.instance_path, "candles"), spill=self.price_feed is not None,
+                retention=config["CANDLE_RETENTION_DAYS"],
+            )
+            self.candle_store.follow(self.price_table)
+            self.price_hub = PriceHub(self.trading_calendar.status)
+            self.price_hub.follow(self.price_table)
+            atexit.register(self.price_hub.close)
+            self._started = True
+
+    def refresh_prices(self):
+        if self.price_feed:
+            self.price_feed.request_refresh()
+
+
+services = LocalProxy(lambda: current_app.extensions["market_services"])
@@ -0,0 +1,188 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+# -------------------------
+# LIVE PRICE HUB
+# -------------------------
+# One hub per process follows the shared price table and turns every new
+# tick into one pre-encoded Server-Sent Events message carrying only the
+# prices that moved (to the cent). Market open/close transitions from the
+# trading calendar go out on the same stream.
+#
+# Subscribers have no queue of their own: a connection remembers the number
+# of the last message it sent and waits on one shared condition, so an idle
+# client costs a suspended generator and an int, and a tick is encoded once
+# no matter how many clients are listening. A client that falls further
+# behind than the backlog gets a fresh snapshot instead of the missed deltas.
+#
+# Each open stream holds a worker thread under the threaded server; for
+# thousands of clients per worker run gunicorn with gevent (-k gevent), where
+# the wait below is a greenlet switch.
+
+def _event(name, payload):
+    data = json.dumps(payload, separators=(",", ":"))
+    return f"event: {name}\ndata: {data}\n\n".encode()
+
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+class PriceHub:
+    def __init__(self, market_status=None, backlog=64, heartbeat=15.0):
+        self.market_status = market_status
+        self.heartbeat = heartbeat
+        self._messages = deque(maxlen=backlog)  # (number, event, payload, encoded)
+        self._number = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._seq = 0
+        self._cents = np.zeros(0, dtype=np.int64)
+        self._names = {}
+        self._tickers = None
+        self._market = None
+        self._snapshot = (None, None, None)
+        self.subscribers = 0
+
+    # --- producer side ---
+    def _publish(self, event, payload):
+        with self._cond:
+            self._number += 1
+            self._messages.append((self._number, event, payload, _event(event, payload)))
+            self._cond.notify_all()
+
+    def update(self, seq, row, tickers):
+        """Fold one price row (0 = not listed) in and publish what changed.
+
+        ``tickers`` is the table's ticker map; SharedPriceTable hands back the
+        same dict until the listings change.
+        """
+        cents = np.rint(row * 100).astype(np.int64)
+        cents[cents < 0] = 0
+        if tickers is not self._tickers or len(cents) != len(self._cents):
+            # Listings changed: resend everything that is listed.
+            self._names = {stock_id: ticker for ticker, stock_id in tickers.items()}
+            self._tickers = tickers
+            changed = np.nonzero(cents)[0]
+        else:
+            changed = np.nonzero(cents != self._cents)[0]
+        self._cents = cents
+        self._seq = seq
+        prices = {}
+        for i in changed.tolist():
+            ticker = self._names.get(i)
+            if ticker is not None:
+                prices[ticker] = cents[i] / 100 if cents[i] else None
+        # Sent even when nothing moved so pages can keep their quote seq fresh.
+        self._publish("prices", {"seq": seq, "prices": prices})
+
+    def check_market(self):
+        if self.market_status is None:
+            return
+        is_open, reason = self.market_status()
+        if is_open != self._market:
+            self._market = is_open
+            self._publish("market", {"open": is_open, "reason": reason})
+
+    def follow(self, table, interval=0.25):
+        """Sample a SharedPriceTable in a background thread."""
+        def run():
+            last = None
+            while not self._closed:
+                seq, row = table.snapshot()
+                if seq != last:
+                    last = seq
+                    self.update(seq, row, table.tickers())
+                try:
+                    self.check_market()
+                except Exception:
+                    # The calendar reads the database; try again next time round.
+                    log.exception("Market status check failed")
+                time.sleep(interval)
+        thread = threading.Thread(target=run, name="price-hub", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # --- subscriber side ---
+    def snapshot(self):
+        """Every listed price plus market state, as ``(number, payload, encoded)``.
+
+        Built at most once per message, however many clients connect.
+        """
+        with self._cond:
+            number = self._number
+            if self._snapshot[0] == number:
+                return self._snapshot
+            cents = self._cents
+            prices = {
+                ticker: cents[i] / 100
+                for i, ticker in self._names.items() if i < len(cents) and cents[i]
+            }
+            payload = {
+                "seq": self._seq,
+                "prices": prices,
+                "market": {"open": self._market},
+            }
+            self._snapshot = (number, payload, _event("snapshot", payload))
+            return self._snapshot
+
+    def _encode(self, event, payload, encoded, tickers):
+        if tickers is None or event != "prices":
+            return encoded
+        prices = payload["prices"]
+        return _event(event, {
+            "seq": payload["seq"],
+            "prices": {t: prices[t] for t in tickers if t in prices},
+        })
+
+    def stream(self, tickers=None):
+        """SSE chunks for one client; ``tickers`` limits the prices sent."""
+        if tickers is not None:
+            tickers = set(tickers)
+        with self._cond:
+            self.subscribers += 1
+        try:
+            position, *snapshot = self.snapshot()
+            yield b"retry: 3000\n\n" + self._filtered_snapshot(*snapshot, tickers)
+            while True:
+                with self._cond:
+                    if self._number == position and not self._closed:
+                        self._cond.wait(self.heartbeat)
+                    if self._closed:
+                        return
+                    number = self._number
+                    behind = number - position
+                    if behind and behind <= len(self._messages):
+                        pending = list(islice(self._messages, len(self._messages) - behind, None))
+                    else:
+                        pending = None
+                if not behind:
+                    yield KEEPALIVE
+                elif pending is None:
+                    position, *snapshot = self.snapshot()
+                    yield self._filtered_snapshot(*snapshot, tickers)
+                else:
+                    position = number
+                    yield b"".join(self._encode(*message[1:], tickers) for message in pending)
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    def _filtered_snapshot(self, payload, encoded, tickers):
+        if tickers is None:
+            return encoded
+        prices = payload["prices"]
+        return _event("snapshot", dict(payload, prices={t: prices[t] for t in tickers if t in prices}))
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import trading
+from app import create_app
+from matching import MatchingEngine
+from models import db, User
+
+
+@pytest.fixture
+def app_config():
+    """Extra config for ``app``; override with parametrize."""
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, app_config):
+    """An app on a fresh SQLite file, with an empty order book."""
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "METRICS_ENABLED": False,
+        "TESTING": True,
+        **app_config,
+    })
+    monkeypatch.setattr(trading, "matching_engine", MatchingEngine())
+    with app.app_context():
+        db.create_all()
+        yield app
+        pipeline = app.extensions.get("write_pipeline")
+        if pipeline is not None:
+            pipeline.close()
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_user(app):
+    def make(name, cash=0.0):
+        user = User(full_name=name, username=name, email=f"{name}@example.com", password="x", cash_balance=cash)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+    return make
+
+
+@pytest.fixture
+def client(app, make_user):
+    """A test client logged in as a plain user, with market services held off."""
+    app.extensions["market_services"]._started = True
+    client = app.test_client()
+    user_id = make_user("client")
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
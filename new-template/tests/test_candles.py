@@ -0,0 +1,80 @@
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+from candles import GROWTH, CandleStore
+
+
+def day(text):
+    return datetime.strptime(text, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+
+
+def row(capacity, prices):
+    out = np.zeros(capacity)
+    for stock_id, price in prices.items():
+        out[stock_id] = price
+    return out
+
+
+def test_rings_are_sized_to_listed_ids_not_table_capacity():
+    store = CandleStore()
+    store.record(1000.0, row(16384, {1: 10.0, 5: 20.0}))
+    assert {s.capacity for s in store.series.values()} == {GROWTH}
+
+    store.record(1001.0, row(16384, {1: 10.5, 5: 20.0, 300: 7.0}))
+    assert {s.capacity for s in store.series.values()} == {320}
+
+    times, block = store.candles("1s", [1, 300], 1000, 1002)
+    assert list(times) == [1000, 1001]
+    assert block[0, :, 3].tolist() == [10.0, 10.5]
+    assert np.isnan(block[1, 0, 0]) and block[1, 1, 3] == 7.0
+
+
+def test_ohlc_within_a_bucket():
+    store = CandleStore()
+    for t, price in [(60.0, 10.0), (70.0, 12.0), (80.0, 9.0), (90.0, 11.0)]:
+        store.record(t, row(8, {2: price}), row(8, {2: 500}))
+    store.record(100.0, row(8, {2: 11.0}), row(8, {2: 530}))
+    _, block = store.candles("1m", [2], 60, 120)
+    assert block[0, 0].tolist() == [10.0, 12.0, 9.0, 11.0, 30.0]
+
+
+def test_spilled_candles_are_read_back(tmp_path):
+    start = day("2026-10-18")
+    store = CandleStore(str(tmp_path), spill=True)
+    for i in range(3):
+        store.record(start + i, row(8, {3: 100.0 + i}))
+    reader = CandleStore(str(tmp_path))
+    _, block = reader.candles("1s", [3], start, start + 2)
+    assert block[0, :, 3].tolist() == [100.0, 101.0]
+
+
+def test_prune_keeps_files_inside_retention(tmp_path):
+    for name in ["1s-20261010.bin", "1s-20261016.bin", "1s-20261018.bin",
+                 "1m-20260101.bin", "1h-20200101.bin", "notes.txt"]:
+        (tmp_path / name).write_bytes(b"")
+    store = CandleStore(str(tmp_path), retention={"1s": 2, "1m": 90})
+
+    assert store.prune(day("2026-10-18")) == 2
+    assert sorted(os.listdir(tmp_path)) == ["1h-20200101.bin", "1s-20261016.bin", "1s-20261018.bin", "notes.txt"]
+
+
+def test_spilling_into_a_new_day_prunes_old_files(tmp_path):
+    (tmp_path / "1s-20261001.bin").write_bytes(b"")
+    (tmp_path / "1m-20261001.bin").write_bytes(b"")
+    store = CandleStore(str(tmp_path), spill=True, retention={"1s": 2, "1m": 90})
+    # Construction already pruned relative to now; put the stale file back.
+    (tmp_path / "1s-20261001.bin").write_bytes(b"")
+    start = day("2026-10-18")
+    store.record(start, row(4, {1: 5.0}))
+    store.record(start + 1, row(4, {1: 5.0}))
+    assert not (tmp_path / "1s-20261001.bin").exists()
+    assert (tmp_path / "1m-20261001.bin").exists()
+    assert (tmp_path / "1s-20261018.bin").exists()
+
+
+def test_candle_api_rejects_non_finite_ranges(client):
+    for query in ["start=nan", "start=inf", "end=-inf", "start=0&end=nan", "start=-1e308"]:
+        response = client.get(f"/api/candles?tickers=AAPL&{query}")
+        assert response.status_code == 400, query
@@ -0,0 +1,49 @@
+import catalog
+from catalog import TickerIndex
+
+ROWS = [
+    (1, "AAPL", "Apple Inc."),
+    (2, "AA", "Alcoa Corp"),
+    (3, "AAL", "American Airlines Group"),
+    (4, "MAA", "Aa Holdings"),
+    (5, "ZZ", "Big Aardvark Co"),
+    (6, "MSFT", "Microsoft Corp."),
+]
+
+
+def test_search_ranks_exact_then_ticker_company_and_word_prefixes():
+    index = TickerIndex(lambda: ROWS)
+    assert [stock_id for stock_id, *_ in index.search("aa")] == [2, 3, 1, 4, 5]
+    assert [stock_id for stock_id, *_ in index.search(" AA ", limit=2)] == [2, 3]
+    assert [stock_id for stock_id, *_ in index.search("corp")] == [2, 6]
+    assert index.search("") == []
+
+
+def test_lookup_ignores_case_and_unknown_tickers():
+    index = TickerIndex(lambda: ROWS)
+    assert index.lookup(["msft", " aapl", "NOPE"]) == {"MSFT": 6, "AAPL": 1}
+
+
+def test_index_is_rebuilt_after_the_ttl_or_an_invalidate(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(catalog, "monotonic", lambda: now[0])
+    rows = list(ROWS)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return list(rows)
+
+    index = TickerIndex(load, ttl=60.0)
+    assert len(index) == 6
+    rows.append((7, "NEW", "Newco"))
+    now[0] = 59.0
+    assert index.search("new") == []
+    now[0] = 61.0
+    assert index.search("new") == [(7, "NEW", "Newco")]
+    assert len(loads) == 2
+
+    rows.pop()
+    index.invalidate()
+    assert index.search("new") == []
+    assert len(loads) == 3
@@ -0,0 +1,26 @@
+import json
+
+from exports import iter_transactions
+from models import db, Stock, Transaction
+
+
+def test_rows_of_deleted_stocks_and_users_are_kept(app, make_user):
+    user_id = make_user("alice")
+    stock = Stock(company_name="Acme", ticker="ACME", initial_price=10.0, volume=100)
+    db.session.add(stock)
+    db.session.commit()
+    db.session.add_all([
+        Transaction(user_id=user_id, stock_id=stock.id, order_type="buy", quantity=2, price=10.0),
+        Transaction(user_id=user_id, stock_id=999, order_type="sell", quantity=1, price=12.5),
+        Transaction(user_id=998, stock_id=stock.id, order_type="buy", quantity=3, price=11.0),
+    ])
+    db.session.commit()
+
+    rows = [json.loads(line) for line in "".join(iter_transactions(db.engine, "ndjson")).splitlines()]
+    assert [(r["username"], r["stock_id"], r["ticker"]) for r in rows] == [
+        ("alice", stock.id, "ACME"), ("alice", 999, None), (None, stock.id, "ACME"),
+    ]
+
+    lines = "".join(iter_transactions(db.engine, "csv", chunk=2)).splitlines()
+    assert len(lines) == 4
+    assert lines[2].split(",")[3:5] == ["999", ""]
@@ -0,0 +1,41 @@
+import io
+
+from imports import import_stocks
+from models import db, Stock
+
+
+def run(text, fmt="csv", **kwargs):
+    return import_stocks(db.engine, io.BytesIO(text.encode()), fmt, **kwargs)
+
+
+def test_inserts_and_updates(app):
+    result = run("ticker,company_name,initial_price,volume\nAAA,A Corp,10,100\nBBB,B Corp,20,200\n")
+    assert (result.inserted, result.updated, result.errors) == (2, 0, [])
+    result = run("ticker,company_name,initial_price,volume\nAAA,,12.5,\n")
+    assert (result.inserted, result.updated) == (0, 1)
+    stock = Stock.query.filter_by(ticker="AAA").one()
+    assert (stock.company_name, stock.initial_price, stock.volume) == ("A Corp", 12.5, 100)
+
+
+def test_non_finite_and_absurd_prices_are_rejected(app):
+    result = run(
+        "ticker,company_name,initial_price,volume\n"
+        "NAN,N,nan,1\nINF,I,inf,1\nBIG,B,1e999,1\nHUGE,H,1e308,1\nOK,O,5,1\n"
+    )
+    assert result.inserted == 1
+    assert [line for line, _ in result.errors] == [2, 3, 4, 5]
+    result = run('{"ticker": "J", "company_name": "J", "initial_price": Infinity, "volume": 1}\n', "ndjson")
+    assert result.error_count == 1
+    assert [s.ticker for s in Stock.query.all()] == ["OK"]
+
+
+def test_new_tickers_past_the_price_table_are_rejected(app):
+    rows = "".join(f"T{i},T {i},10,100\n" for i in range(1, 6))
+    result = run("ticker,company_name,initial_price,volume\n" + rows, max_stock_id=3, chunk=2)
+    assert result.inserted == 3
+    assert [line for line, _ in result.errors] == [5, 6]
+    assert "price table" in result.errors[0][1]
+    assert sorted(s.ticker for s in Stock.query.all()) == ["T1", "T2", "T3"]
+    # Existing tickers can still be updated.
+    result = run("ticker,company_name,initial_price,volume\nT1,,11,\n", max_stock_id=3)
+    assert (result.updated, result.error_count) == (1, 0)
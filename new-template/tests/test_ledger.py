@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import ledger
+from ledger import BUY, DEPOSIT, SELL, AccountState, entry
+from models import db, LedgerCheckpoint, LedgerEntry, LimitOrder, Portfolio, User
+
+
+def test_average_price_follows_buys_and_sells():
+    state = AccountState()
+    state.apply(BUY, 1, 10, 100.0, -1000.0)
+    state.apply(BUY, 1, 10, 110.0, -1100.0)
+    assert state.average_price(1) == pytest.approx(105.0)
+    state.apply(SELL, 1, 5, 120.0, 600.0)
+    assert state.quantity(1) == 15
+    assert state.average_price(1) == pytest.approx(105.0)
+    assert state.cash == pytest.approx(-1500.0)
+
+
+def test_checkpoint_round_trip_drops_closed_positions():
+    state = AccountState(50.0, {1: [3, 30.0], 2: [0, 0.0]})
+    restored = AccountState.from_checkpoint(*state.as_checkpoint())
+    assert restored.positions == {1: [3, 30.0]}
+    assert restored.cash == 50.0
+
+
+def _account(make_user, stock_id=1):
+    """A user with a deposit, a buy and a sell, written as the app writes them."""
+    user_id = make_user("alice", cash=900.0)
+    start = datetime.utcnow() - timedelta(minutes=10)
+    db.session.execute(db.insert(LedgerEntry), [
+        entry(user_id, DEPOSIT, 1000.0, created_at=start),
+        entry(user_id, BUY, -200.0, stock_id, 4, 50.0, created_at=start + timedelta(minutes=1)),
+        entry(user_id, SELL, 100.0, stock_id, 2, 50.0, created_at=start + timedelta(minutes=2)),
+    ])
+    db.session.add(Portfolio(user_id=user_id, stock_id=stock_id, quantity=2, average_price=50.0))
+    db.session.commit()
+    return user_id, start
+
+
+def test_account_at_replays_up_to_the_given_time(app, make_user):
+    user_id, start = _account(make_user)
+    assert ledger.account_at(user_id, start).cash == 1000.0
+    then = ledger.account_at(user_id, start + timedelta(minutes=1))
+    assert (then.cash, then.quantity(1)) == (800.0, 4)
+    now = ledger.account_at(user_id)
+    assert (now.cash, now.quantity(1)) == (900.0, 2)
+
+
+def test_checkpoints_give_the_same_answer(app, make_user):
+    user_id, _ = _account(make_user)
+    assert ledger.checkpoint(lag=0, workers=1) == 1
+    assert ledger.checkpoint(lag=0, workers=1) == 0
+    now = ledger.account_at(user_id)
+    assert (now.cash, now.quantity(1)) == (900.0, 2)
+    assert ledger.verify(workers=1, recheck=0) == []
+
+
+def test_verify_reports_balances_that_disagree(app, make_user):
+    user_id, _ = _account(make_user)
+    assert ledger.verify(workers=1, recheck=0) == []
+    db.session.get(User, user_id).cash_balance = 950.0
+    db.session.commit()
+    assert ledger.verify(workers=1, recheck=0) == [ledger.Mismatch(user_id, None, 900.0, 950.0)]
+
+
+def test_open_accounts_covers_accounts_that_traded_before_opening(app, make_user):
+    # bob held 500 cash (50 of it now reserved by an open buy) and 3 shares
+    # before the ledger; since then he deposited 100 and bought 2 more.
+    user_id = make_user("bob", cash=530.0)
+    db.session.add(Portfolio(user_id=user_id, stock_id=1, quantity=5, average_price=10.0))
+    db.session.add(LimitOrder(user_id=user_id, stock_id=2, side=BUY, price=5.0, quantity=10,
+                              remaining=10, status="open"))
+    start = datetime.utcnow() - timedelta(minutes=10)
+    db.session.execute(db.insert(LedgerEntry), [
+        entry(user_id, DEPOSIT, 100.0, created_at=start),
+        entry(user_id, BUY, -20.0, 1, 2, 10.0, created_at=start + timedelta(minutes=1)),
+    ])
+    db.session.commit()
+    ledger.checkpoint(lag=0, workers=1)
+    newcomer = make_user("carol", cash=0.0)
+
+    assert ledger.open_accounts() == 2
+    assert ledger.open_accounts() == 0
+
+    assert LedgerCheckpoint.query.filter_by(user_id=user_id).count() == 0
+    opening = ledger.account_at(user_id, start - timedelta(microseconds=1))
+    assert (opening.cash, opening.quantity(1)) == (500.0, 3)
+    assert ledger.account_at(newcomer).cash == 0.0
+    assert ledger.verify(workers=1, recheck=0) == []
@@ -0,0 +1,82 @@
+from datetime import datetime, time
+from types import SimpleNamespace
+
+from market_calendar import DAYS, TradingCalendar
+
+
+def rows(**closed_days):
+    hours = SimpleNamespace(open_time=time(9, 0), close_time=time(16, 0), is_open=False)
+    schedule = SimpleNamespace()
+    for day in DAYS:
+        setattr(schedule, day, day not in ("saturday", "sunday") and not closed_days.get(day))
+        setattr(schedule, f"{day}_open", time(9, 0))
+        setattr(schedule, f"{day}_close", time(16, 0))
+    return hours, schedule
+
+
+def calendar(now, **closed_days):
+    loads = []
+
+    def load():
+        loads.append(1)
+        return rows(**closed_days)
+
+    cal = TradingCalendar(load, clock=lambda: now)
+    return cal, loads
+
+
+def test_open_inside_hours_on_a_weekday():
+    cal, _ = calendar(datetime(2026, 3, 4, 10, 30))  # Wednesday
+    assert cal.status() == (True, None)
+
+
+def test_closed_outside_hours_says_when():
+    cal, _ = calendar(datetime(2026, 3, 4, 8, 59))
+    is_open, reason = cal.status()
+    assert not is_open
+    assert "09:00 AM" in reason and "04:00 PM" in reason
+    assert cal.is_open(datetime(2026, 3, 4, 16, 0))
+    assert not cal.is_open(datetime(2026, 3, 4, 16, 0, 1))
+
+
+def test_weekend_and_disabled_days_are_closed():
+    cal, _ = calendar(datetime(2026, 3, 7, 12, 0))  # Saturday
+    assert cal.status() == (False, "Market closed today (Saturday).")
+    cal, _ = calendar(datetime(2026, 3, 4, 12, 0), wednesday=True)
+    assert cal.status() == (False, "Market closed today (Wednesday).")
+
+
+def test_holidays_and_observed_dates():
+    cal, _ = calendar(datetime(2026, 12, 25, 12, 0))
+    assert cal.status() == (False, "Market closed today for a holiday.")
+    # July 4th 2026 is a Saturday, so Friday the 3rd is closed instead.
+    assert not cal.is_open(datetime(2026, 7, 3, 12, 0))
+    assert cal.is_open(datetime(2026, 7, 2, 12, 0))
+
+
+def test_next_open_and_close_skip_weekends_and_holidays():
+    cal, _ = calendar(datetime(2026, 3, 6, 17, 0))  # Friday evening
+    assert cal.next_open() == datetime(2026, 3, 9, 9, 0)
+    assert cal.next_close() == datetime(2026, 3, 9, 16, 0)
+    assert cal.next_open(datetime(2026, 3, 9, 8, 0)) == datetime(2026, 3, 9, 9, 0)
+    assert cal.next_close(datetime(2026, 3, 9, 10, 0)) == datetime(2026, 3, 9, 16, 0)
+    # Christmas Eve evening -> Christmas is closed -> the 28th (after a weekend).
+    assert cal.next_open(datetime(2026, 12, 24, 17, 0)) == datetime(2026, 12, 28, 9, 0)
+
+
+def test_schedule_is_compiled_once_until_invalidated():
+    cal, loads = calendar(datetime(2026, 3, 4, 10, 0))
+    for _ in range(5):
+        cal.status()
+    assert len(loads) == 1
+    cal.invalidate()
+    cal.status()
+    assert len(loads) == 2
+
+
+def test_follows_the_clock_across_the_compiled_window():
+    now = [datetime(2026, 3, 4, 10, 0)]
+    cal = TradingCalendar(lambda: rows(), window_days=10, clock=lambda: now[0])
+    assert cal.is_open()
+    now[0] = datetime(2027, 3, 3, 10, 0)  # far outside the first window
+    assert cal.is_open()
@@ -0,0 +1,103 @@
+from matching import BUY, SELL, MatchingEngine, Order
+
+
+def order(id, side, price, quantity, user_id=1, stock_id=1, ioc=False):
+    return Order(id, user_id, stock_id, side, price, quantity, ioc=ioc)
+
+
+def fills(trades):
+    return [(t.price, t.quantity, t.buy.id if t.buy else None, t.sell.id if t.sell else None) for t in trades]
+
+
+def test_best_price_fills_first_then_time_priority():
+    engine = MatchingEngine()
+    engine.submit(order(1, SELL, 10100, 10))
+    engine.submit(order(2, SELL, 10100, 10))
+    engine.submit(order(3, SELL, 10000, 10))
+
+    trades = engine.submit(order(4, BUY, 10100, 25, user_id=2))
+
+    assert fills(trades) == [(10000, 10, 4, 3), (10100, 10, 4, 1), (10100, 5, 4, 2)]
+    assert list(engine.orders) == [2]
+    assert engine.orders[2].remaining == 5
+
+
+def test_limit_remainder_rests_and_ioc_remainder_does_not():
+    engine = MatchingEngine()
+    engine.submit(order(1, SELL, 10000, 10))
+
+    limit = order(2, BUY, 10000, 15, user_id=2)
+    assert fills(engine.submit(limit)) == [(10000, 10, 2, 1)]
+    assert limit.remaining == 5
+    assert engine.books[1].best_bid() == 10000
+    assert 2 in engine.orders
+
+    market = order(3, SELL, 10000, 8, user_id=3, ioc=True)
+    assert fills(engine.submit(market)) == [(10000, 5, 2, 3)]
+    assert market.remaining == 3
+    assert 3 not in engine.orders
+    assert engine.books[1].best_ask() is None
+
+
+def test_limit_does_not_cross_a_worse_price():
+    engine = MatchingEngine()
+    engine.submit(order(1, SELL, 10100, 10))
+    assert engine.submit(order(2, BUY, 10000, 10, user_id=2)) == []
+    assert engine.books[1].best_bid() == 10000
+    assert engine.books[1].best_ask() == 10100
+
+
+def test_cancel_removes_the_order_once():
+    engine = MatchingEngine()
+    engine.submit(order(1, SELL, 10000, 10))
+    engine.submit(order(2, SELL, 10100, 10))
+
+    cancelled, quantity = engine.cancel(1)
+    assert cancelled.id == 1 and quantity == 10
+    assert engine.cancel(1) is None
+    assert engine.books[1].best_ask() == 10100
+    assert fills(engine.submit(order(3, BUY, 10100, 5, user_id=2))) == [(10100, 5, 3, 2)]
+
+
+def test_cancel_after_partial_fill_returns_the_rest():
+    engine = MatchingEngine()
+    engine.submit(order(1, BUY, 10000, 10))
+    engine.submit(order(2, SELL, 10000, 4, user_id=2, ioc=True))
+    assert engine.cancel(1)[1] == 6
+
+
+def test_self_trade_fills_like_any_other_order():
+    # No self-trade prevention: a user's order takes their own resting order
+    # and settlement nets the two sides in the same account.
+    engine = MatchingEngine()
+    engine.submit(order(1, SELL, 10000, 10, user_id=7))
+    trades = engine.submit(order(2, BUY, 10000, 10, user_id=7))
+    assert fills(trades) == [(10000, 10, 2, 1)]
+    assert trades[0].buy.user_id == trades[0].sell.user_id == 7
+    assert engine.orders == {}
+
+
+def test_house_fills_at_reference_up_to_liquidity():
+    engine = MatchingEngine()
+    buy = order(1, BUY, 10000, 15, ioc=True)
+    trades = engine.submit(buy, reference=99.5, liquidity=10)
+    assert fills(trades) == [(9950, 10, 1, None)]
+    assert buy.remaining == 5
+    assert engine.books[1].liquidity == 0
+
+
+def test_resting_order_keeps_priority_over_the_house_at_the_same_price():
+    engine = MatchingEngine()
+    engine.set_liquidity(1, 100)
+    engine.submit(order(1, SELL, 10000, 5, user_id=2))
+    trades = engine.submit(order(2, BUY, 10000, 8, ioc=True), reference=100.0)
+    assert fills(trades) == [(10000, 5, 2, 1), (10000, 3, 2, None)]
+
+
+def test_restore_puts_orders_back_in_id_order():
+    engine = MatchingEngine()
+    first, second = order(1, SELL, 10000, 10), order(2, SELL, 10000, 10)
+    first.remaining = 4
+    engine.restore([first, second], {1: 0})
+    trades = engine.submit(order(3, BUY, 10000, 6, user_id=2))
+    assert fills(trades) == [(10000, 4, 3, 1), (10000, 2, 3, 2)]
@@ -0,0 +1,50 @@
+import pytest
+from flask import Response
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from models import db
+
+
+@pytest.fixture
+def metrics_app(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'm.db'}", "TESTING": True})
+    app.extensions["market_services"]._started = True
+
+    @app.route("/probe/<int:fail>")
+    def probe(fail):
+        if fail:
+            with pytest.raises(OperationalError):
+                db.session.execute(text("SELECT * FROM no_such_table"))
+            db.session.rollback()
+        for _ in range(3):
+            db.session.execute(text("SELECT 1"))
+        return Response("ok")
+
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_listeners_go_on_the_apps_own_engine(metrics_app, tmp_path):
+    metrics = metrics_app.extensions["metrics"]
+    assert not event.contains(Engine, "before_cursor_execute", metrics._sql_start)
+    with metrics_app.app_context():
+        assert event.contains(db.engine, "before_cursor_execute", metrics._sql_start)
+
+    # A second app doesn't add to the first one's counts.
+    create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'other.db'}"})
+    response = metrics_app.test_client().get("/probe/0")
+    assert 'desc="3 queries"' in response.headers["Server-Timing"]
+
+
+def test_failed_statement_leaves_no_start_time_behind(metrics_app):
+    client = metrics_app.test_client()
+    client.get("/probe/1")
+    with metrics_app.app_context():
+        with db.engine.connect() as conn:
+            assert not conn.info.get("metrics_started")
+    response = client.get("/probe/0")
+    assert 'desc="3 queries"' in response.headers["Server-Timing"]
@@ -0,0 +1,77 @@
+from contextlib import contextmanager
+
+import pytest
+from flask import template_rendered
+from sqlalchemy import inspect
+
+import views
+from app import seed_database
+from models import db, Stock, Transaction, User
+
+
+def test_init_db_adds_new_indexes_to_existing_tables(app):
+    for index in Transaction.__table__.indexes:
+        index.drop(db.engine)
+    assert inspect(db.engine).get_indexes("transaction") == []
+
+    seed_database()
+
+    names = {ix["name"] for ix in inspect(db.engine).get_indexes("transaction")}
+    assert names == {ix.name for ix in Transaction.__table__.indexes}
+
+
+@contextmanager
+def captured_templates(app):
+    rendered = []
+
+    def record(sender, template, context, **extra):
+        rendered.append(context)
+    template_rendered.connect(record, app)
+    try:
+        yield rendered
+    finally:
+        template_rendered.disconnect(record, app)
+
+
+@pytest.fixture
+def history(app, client, monkeypatch):
+    """Seven ACME trades for the client, three to a page; returns a fetch
+    function giving (ids on the page, newer_url, older_url)."""
+    monkeypatch.setattr(views, "ORDER_HISTORY_PAGE", 3)
+    stock = Stock(company_name="Acme", ticker="ACME", initial_price=10.0, volume=100)
+    db.session.add(stock)
+    db.session.commit()
+    user_id = User.query.filter_by(username="client").one().id
+    db.session.add_all([
+        Transaction(user_id=user_id, stock_id=stock.id, order_type="buy", quantity=1, price=10.0)
+        for _ in range(7)
+    ])
+    db.session.commit()
+
+    def fetch(query=""):
+        with captured_templates(app) as rendered:
+            assert client.get(f"/order_history{query}").status_code == 200
+        context = rendered[0]
+        return [tx.id for tx in context["transactions"]], context["newer_url"], context["older_url"]
+    return fetch
+
+
+def test_first_page_is_the_newest(history):
+    assert history() == ([7, 6, 5], None, "/order_history?before=5")
+
+
+def test_older_pages_walk_back_to_the_first_trade(history):
+    assert history("?before=5") == ([4, 3, 2], "/order_history?after=4", "/order_history?before=2")
+    assert history("?before=2") == ([1], "/order_history?after=1", None)
+
+
+def test_newer_pages_walk_forward_to_the_latest(history):
+    assert history("?after=1") == ([4, 3, 2], "/order_history?after=4", "/order_history?before=2")
+    assert history("?after=4") == ([7, 6, 5], None, "/order_history?before=5")
+
+
+def test_filters_are_kept_in_the_page_links(history):
+    assert history("?ticker=acme&before=5")[1:] == (
+        "/order_history?after=4&ticker=ACME", "/order_history?before=2&ticker=ACME",
+    )
+    assert history("?ticker=NOPE") == ([], None, None)
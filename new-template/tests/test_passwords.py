@@ -0,0 +1,29 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from passwords import PasswordHasher, hash_prefix
+
+
+@pytest.mark.parametrize("method", [
+    "scrypt", "scrypt:16384:8:1", "scrypt:32768:8:2",
+    "pbkdf2", "pbkdf2:sha512", "pbkdf2:sha256:1000",
+])
+def test_prefix_matches_what_werkzeug_writes(method):
+    assert hash_prefix(method) == generate_password_hash("x", method).split("$", 1)[0]
+
+
+@pytest.mark.parametrize("method", ["md5", "scrypt:16384", "pbkdf2:sha256:lots", "pbkdf2:nope"])
+def test_invalid_methods_are_still_rejected(method):
+    with pytest.raises((ValueError, TypeError)):
+        hash_prefix(method)
+
+
+def test_needs_rehash_compares_parameters():
+    hasher = PasswordHasher("pbkdf2:sha256:1000", workers=1, queue=1)
+    try:
+        current = hasher.hash("secret")
+        assert hasher.verify(current, "secret")
+        assert not hasher.needs_rehash(current)
+        assert hasher.needs_rehash(generate_password_hash("secret", "pbkdf2:sha256:2000"))
+    finally:
+        hasher.shutdown()
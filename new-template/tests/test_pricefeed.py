@@ -0,0 +1,82 @@
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from pricefeed import PriceFeed, SharedPriceTable
+
+
+@pytest.fixture
+def table():
+    table = SharedPriceTable.create(name=f"test-{uuid.uuid4().hex[:12]}", capacity=16, depth=4)
+    yield table
+    table.close()
+
+
+def listing(stock_id, ticker, price=10.0):
+    return SimpleNamespace(id=stock_id, ticker=ticker, initial_price=price, volume=1000)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_feed_keeps_ticking_through_failed_refreshes(table):
+    calls = []
+    catalog = [listing(1, "AAA")]
+
+    def load():
+        calls.append(1)
+        if 2 <= len(calls) <= 4:
+            raise OSError("database unavailable")
+        return list(catalog)
+
+    feed = PriceFeed(table, load, tick_interval=0.005, refresh_interval=0.005)
+    feed.start()
+    try:
+        wait_for(lambda: len(calls) >= 4)
+        seq = table.seq
+        wait_for(lambda: table.seq > seq)
+        assert table.price(1) is not None
+
+        catalog.append(listing(2, "BBB"))
+        wait_for(lambda: table.index("BBB") == 2)
+        assert feed._thread.is_alive()
+    finally:
+        feed.stop()
+
+
+def test_refresh_warns_once_about_stocks_past_capacity(table, caplog):
+    catalog = [listing(1, "AAA"), listing(16, "BIG"), listing(40, "HUGE")]
+    feed = PriceFeed(table, lambda: catalog)
+    with caplog.at_level("WARNING", logger="pricefeed"):
+        feed.refresh()
+        feed.refresh()
+    warnings = [r for r in caplog.records if r.levelname == "WARNING"]
+    assert len(warnings) == 1
+    assert "[16, 40]" in warnings[0].getMessage()
+    assert table.tickers() == {"AAA": 1}
+
+
+def test_price_at_rejects_quotes_older_than_max_age(table):
+    first = table.publish([0.0, 10.0])
+    second = table.publish([0.0, 11.0])
+    third = table.publish([0.0, 12.0])
+    assert table.price_at(third, 1, max_age=1) == 12.0
+    assert table.price_at(second, 1, max_age=1) == 11.0
+    assert table.price_at(first, 1, max_age=1) is None
+    assert table.price_at(third + 1, 1, max_age=1) is None
+    assert table.price_at(first, 1) == 10.0
+
+
+def test_workers_refuse_to_start_without_an_order_desk_key(app, caplog):
+    services = app.extensions["market_services"]
+    app.config["PRICE_FEED_SHM"] = "stockstreet-test"
+    with pytest.raises(RuntimeError, match="ORDER_DESK_AUTHKEY"):
+        services.start()
+    assert "order_desk" not in app.extensions
+    assert "Refusing to start market services" in caplog.text
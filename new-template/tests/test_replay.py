@@ -0,0 +1,52 @@
+from datetime import datetime, time
+
+import trading
+from models import db, MarketHours, MarketSchedule, Stock
+from replay import Replay, synthetic_events
+
+
+def open_market():
+    db.session.add(MarketHours(open_time=time(0, 0), close_time=time(23, 59), is_open=True))
+    db.session.add(MarketSchedule(monday=True, tuesday=True, wednesday=True, thursday=True,
+                                  friday=True, saturday=True, sunday=True))
+    db.session.commit()
+
+
+def test_replay_uses_its_own_book(app, make_user):
+    open_market()
+    live = Stock(company_name="Live", ticker="LIVE", initial_price=10.0, volume=100)
+    db.session.add(live)
+    db.session.commit()
+    user_id = make_user("live", cash=1000.0)
+    resting = trading.submit_order(user_id, live.id, "buy", 5, 9.0, "limit")
+    assert resting.order_id in trading.matching_engine.orders
+
+    start = datetime(2026, 3, 4, 10, 0)
+    replay = Replay(app, start)
+    try:
+        report = replay.run(synthetic_events(start, seconds=60, stocks=3, users=5, rate=5, seed=3))
+    finally:
+        replay.close()
+
+    assert report.orders and report.outcomes.get("market_closed", 0) == 0
+    # The live order is untouched; everything the replay left resting was
+    # cancelled from the replay's own book.
+    assert list(trading.matching_engine.orders) == [resting.order_id]
+    assert replay.engine.orders == {}
+    assert report.cancelled_at_close > 0
+    assert not trading.matching_engine.books.keys() - {live.id}
+
+
+def test_listings_past_the_price_table_are_skipped(app):
+    open_market()
+    start = datetime(2026, 3, 4, 10, 0)
+    replay = Replay(app, start, capacity=4)
+    try:
+        report = replay.run(synthetic_events(start, seconds=30, stocks=6, users=3, rate=5, seed=1))
+    finally:
+        replay.close()
+
+    # Fresh ids run 1-6, so 4, 5 and 6 don't fit and orders for them are unknown.
+    assert report.unlisted == 3
+    assert report.outcomes.get("unknown", 0) > 0
+    assert set(replay._stocks) == {"R000", "R001", "R002"}
@@ -0,0 +1,83 @@
+import time
+from contextlib import contextmanager
+
+import pytest
+from flask import Response, g, session
+from sqlalchemy import func, select
+
+from models import db, User
+from replicas import sync_sqlite
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {"REPLICA_DATABASE_URIS": [f"sqlite:///{tmp_path / 'replica.db'}"]}
+
+
+@pytest.fixture
+def replicas(app, make_user):
+    """Primary and replica both hold alice; only the primary has bob."""
+    make_user("alice")
+    sync_sqlite(app.config["SQLALCHEMY_DATABASE_URI"], app.config["REPLICA_DATABASE_URIS"][0])
+    make_user("bob")
+    db.session.remove()
+    yield app.extensions["replicas"]
+    # init_app gave the shared db a metadata per bind; later apps have no replicas.
+    for key in app.extensions["replicas"].keys:
+        db.metadatas.pop(key, None)
+
+
+@contextmanager
+def request(app, path, method="GET"):
+    # A fresh app context too, so g starts empty as it does per request.
+    with app.app_context(), app.test_request_context(path, method=method):
+        yield
+
+
+def users(engine=None):
+    query = select(func.count()).select_from(User)
+    if engine is None:
+        return db.session.execute(query).scalar()
+    with engine.connect() as conn:
+        return conn.execute(query).scalar()
+
+
+def test_reads_on_listed_endpoints_go_to_a_replica(app, replicas):
+    with request(app, "/order_history"):
+        replicas._route()
+        assert g.db_replica == "replica_0"
+        assert users() == 1
+    with request(app, "/trade"):
+        replicas._route()
+        assert "db_replica" not in g
+        assert users() == 2
+
+
+def test_writes_go_to_the_primary(app, replicas):
+    with request(app, "/order_history"):
+        replicas._route()
+        db.session.add(User(full_name="carol", username="carol", email="carol@example.com", password="x"))
+        db.session.commit()
+        db.session.execute(db.update(User).where(User.username == "alice").values(cash_balance=5.0))
+        db.session.commit()
+    assert users(db.engine) == 3
+    assert users(db.engines["replica_0"]) == 1
+    with db.engine.connect() as conn:
+        assert conn.execute(select(User.cash_balance).where(User.username == "alice")).scalar() == 5.0
+
+
+def test_reads_stay_on_the_primary_right_after_a_write(app, replicas):
+    with request(app, "/trade", "POST"):
+        replicas._remember_write(Response(status=302))
+        wrote_at = session["db_wrote_at"]
+    assert time.time() - wrote_at < 1
+
+    with request(app, "/order_history"):
+        session["db_wrote_at"] = wrote_at
+        replicas._route()
+        assert "db_replica" not in g
+        assert users() == 2
+    with request(app, "/order_history"):
+        session["db_wrote_at"] = wrote_at - replicas.sticky
+        replicas._route()
+        assert g.db_replica == "replica_0"
@@ -0,0 +1,91 @@
+import json
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from streaming import PriceHub
+
+TICKERS = {"AAA": 1, "BBB": 2}
+
+
+def events(chunk):
+    """[(event, payload), ...] from one SSE chunk."""
+    out = []
+    for block in chunk.decode().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":") and ": " in line)
+        if "event" in lines:
+            out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def test_each_subscriber_gets_the_same_deltas():
+    hub = PriceHub(heartbeat=0.05)
+    hub.update(1, np.array([0.0, 10.0, 20.0]), TICKERS)
+    everything, only_b = hub.stream(), hub.stream(["BBB"])
+    assert events(next(everything)) == [("snapshot", {"seq": 1, "prices": {"AAA": 10.0, "BBB": 20.0},
+                                                      "market": {"open": None}})]
+    assert events(next(only_b))[0][1]["prices"] == {"BBB": 20.0}
+    assert hub.subscribers == 2
+
+    hub.update(2, np.array([0.0, 10.0, 21.0]), TICKERS)
+    hub.update(3, np.array([0.0, 11.0, 21.0]), TICKERS)
+    assert events(next(everything)) == [
+        ("prices", {"seq": 2, "prices": {"BBB": 21.0}}),
+        ("prices", {"seq": 3, "prices": {"AAA": 11.0}}),
+    ]
+    assert events(next(only_b)) == [
+        ("prices", {"seq": 2, "prices": {"BBB": 21.0}}),
+        ("prices", {"seq": 3, "prices": {}}),
+    ]
+
+    assert next(everything) == b": keepalive\n\n"
+    hub.close()
+    assert list(everything) == [] and list(only_b) == []
+    assert hub.subscribers == 0
+
+
+def test_a_subscriber_past_the_backlog_gets_a_snapshot():
+    hub = PriceHub(backlog=2, heartbeat=0.05)
+    hub.update(1, np.array([0.0, 10.0, 20.0]), TICKERS)
+    stream = hub.stream()
+    next(stream)
+    for seq in range(2, 6):
+        hub.update(seq, np.array([0.0, 10.0 + seq, 20.0]), TICKERS)
+    assert events(next(stream)) == [("snapshot", {"seq": 5, "prices": {"AAA": 15.0, "BBB": 20.0},
+                                                  "market": {"open": None}})]
+    hub.close()
+
+
+def test_market_transitions_are_published_once():
+    state = [(False, "Market closed.")]
+    hub = PriceHub(lambda: state[0], heartbeat=0.05)
+    hub.check_market()
+    hub.check_market()
+    state[0] = (True, None)
+    hub.check_market()
+    stream = hub.stream()
+    assert events(next(stream))[0][1]["market"] == {"open": True}
+    state[0] = (False, "Market closed.")
+    hub.check_market()
+    assert events(next(stream)) == [("market", {"open": False, "reason": "Market closed."})]
+    hub.close()
+
+
+def test_failed_market_checks_are_logged_and_retried(caplog):
+    calls = []
+
+    def status():
+        calls.append(1)
+        raise OSError("database unavailable")
+
+    table = SimpleNamespace(snapshot=lambda: (1, np.array([0.0, 10.0])), tickers=lambda: {"AAA": 1})
+    hub = PriceHub(status)
+    with caplog.at_level("ERROR", logger="streaming"):
+        hub.follow(table, interval=0.005)
+        deadline = time.monotonic() + 2
+        while len(calls) < 3 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        hub.close()
+    assert len(calls) >= 3
+    assert "Market status check failed" in caplog.text
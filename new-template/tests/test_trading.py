@@ -0,0 +1,216 @@
+import threading
+import uuid
+
+import pytest
+
+import trading
+from ledger import DEPOSIT, entry
+from models import db, LedgerEntry, LimitOrder, Stock, User
+from pricefeed import SharedPriceTable
+
+
+@pytest.fixture
+def stock(app):
+    stock = Stock(company_name="Acme", ticker="ACME", initial_price=10.0, volume=100)
+    db.session.add(stock)
+    db.session.commit()
+    return stock.id
+
+
+def funded(make_user, name, cash):
+    user_id = make_user(name, cash=cash)
+    db.session.execute(db.insert(LedgerEntry), [entry(user_id, DEPOSIT, cash)])
+    db.session.commit()
+    return user_id
+
+
+def cash(user_id):
+    db.session.expire_all()
+    return db.session.get(User, user_id).cash_balance
+
+
+def test_limit_buy_reserves_cash_and_cancel_returns_it(app, make_user, stock):
+    user_id = funded(make_user, "bob", 1000.0)
+    fill = trading.submit_order(user_id, stock, "buy", 10, 9.0, "limit")
+    assert fill.resting == 10 and fill.order_id
+    assert cash(user_id) == 910.0
+    assert trading.cancel_order(user_id, fill.order_id)
+    assert cash(user_id) == 1000.0
+    assert db.session.get(LimitOrder, fill.order_id).status == "cancelled"
+
+
+def test_orders_cross_between_users(app, make_user, stock):
+    seller = funded(make_user, "sue", 0.0)
+    buyer = funded(make_user, "bob", 1000.0)
+    # sue has no shares yet: buy 5 from the house, then offer them at 12.
+    db.session.get(User, seller).cash_balance = 50.0
+    db.session.execute(db.insert(LedgerEntry), [entry(seller, DEPOSIT, 50.0)])
+    db.session.commit()
+    assert trading.submit_order(seller, stock, "buy", 5, 10.0, "market", liquidity=100).filled == 5
+    assert trading.submit_order(seller, stock, "sell", 5, 12.0, "limit").resting == 5
+
+    fill = trading.submit_order(buyer, stock, "buy", 5, 12.0, "limit", reference=13.0)
+
+    assert (fill.filled, fill.resting, fill.average_price) == (5, 0, 12.0)
+    assert cash(buyer) == 940.0
+    assert cash(seller) == 60.0
+    assert trading.matching_engine.orders == {}
+
+
+def test_settled_fills_are_added_to_the_traded_volume(app, make_user, stock):
+    table = SharedPriceTable.create(name=f"test-{uuid.uuid4().hex[:12]}", capacity=16, depth=4)
+    app.extensions["price_table"] = table
+    try:
+        user_id = funded(make_user, "bob", 1000.0)
+        trading.submit_order(user_id, stock, "buy", 5, 10.0, "market", liquidity=100)
+        trading.submit_order(user_id, stock, "sell", 2, 10.0, "market", liquidity=100)
+        assert table.traded[stock] == 7
+    finally:
+        del app.extensions["price_table"]
+        table.close()
+
+
+def test_a_cancel_survives_an_earlier_fill_committing_after_it(app, make_user, stock):
+    seller = funded(make_user, "sue", 100.0)
+    buyer = funded(make_user, "bob", 1000.0)
+    trading.submit_order(seller, stock, "buy", 4, 10.0, "market", liquidity=100)
+    order_id = trading.submit_order(buyer, stock, "buy", 10, 9.0, "limit").order_id
+
+    # Queue a partial fill, then the cancel, and write them the wrong way round.
+    trading.submit_order(seller, stock, "sell", 4, 9.0, "market", flush=False)
+    trading.cancel_order(buyer, order_id, flush=False)
+    fill, cancel = trading.settlement._pending
+    trading.settlement._pending = []
+    trading._transaction(trading._write_batch, [cancel.work])
+    trading._transaction(trading._write_batch, [fill.work])
+    fill.done = cancel.done = True
+    trading.settlement.flush()
+
+    row = db.session.get(LimitOrder, order_id)
+    assert (row.status, row.remaining) == ("cancelled", 0)
+    assert cash(buyer) == 1000.0 - 4 * 9.0
+
+
+def test_restore_book_refunds_reservations_left_pending(app, make_user, stock):
+    # A market buy whose reservation committed but whose settlement never
+    # ran (the process died in between) is left behind as a pending row.
+    user_id = funded(make_user, "bob", 1000.0)
+    order_id = trading._transaction(trading._reserve, user_id, stock, "buy", 10, 10.0, trading.PENDING)
+    assert cash(user_id) == 900.0
+
+    trading.restore_book()
+
+    assert cash(user_id) == 1000.0
+    assert db.session.get(LimitOrder, order_id).status == "cancelled"
+    assert trading.matching_engine.orders == {}
+
+
+def test_restore_book_puts_open_orders_back(app, make_user, stock):
+    user_id = funded(make_user, "bob", 1000.0)
+    fill = trading.submit_order(user_id, stock, "buy", 10, 9.0, "limit")
+    trading.matching_engine.orders.clear()
+    trading.matching_engine.books.clear()
+
+    trading.restore_book()
+
+    assert list(trading.matching_engine.orders) == [fill.order_id]
+    assert trading.matching_engine.books[stock].liquidity == 100
+
+
+@pytest.mark.parametrize("price", [float("nan"), float("inf"), -float("inf"), 1e308, 0.0, None])
+def test_non_finite_or_absurd_prices_are_invalid_orders(app, make_user, stock, price):
+    user_id = funded(make_user, "bob", 1000.0)
+    fill = trading.place_order(user_id, db.session.get(Stock, stock), "buy", 1, 10.0, "limit", price)
+    assert fill.reason == "invalid_order"
+    fill = trading.submit_order(user_id, stock, "buy", 1, price, "market")
+    assert fill.reason == "invalid_order"
+    assert cash(user_id) == 1000.0
+
+
+def test_bulk_orders_reject_non_finite_limit_prices(app, client, stock, monkeypatch):
+    services = app.extensions["market_services"]
+    services.price_table = SharedPriceTable.create(name=f"test-{uuid.uuid4().hex[:12]}", capacity=16, depth=4)
+    try:
+        monkeypatch.setattr(services.trading_calendar, "status", lambda: (True, None))
+        body = ('{"orders": ['
+                '{"ticker": "ACME", "action": "buy", "quantity": 1, "order_type": "limit", "limit_price": NaN},'
+                '{"ticker": "ACME", "action": "buy", "quantity": 1, "order_type": "limit", "limit_price": Infinity},'
+                '{"ticker": "ACME", "action": "buy", "quantity": 1, "order_type": "limit", "limit_price": 1e999},'
+                '{"ticker": "ACME", "action": "buy", "quantity": 1, "order_type": "limit", "limit_price": 1' + "0" * 400 + '}'
+                ']}')
+        response = client.post("/api/orders", data=body, content_type="application/json")
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["rejected"] == 4
+        assert {r["reason"] for r in data["results"]} == {"invalid_order"}
+        assert {r["price"] for r in data["results"]} == {None}
+    finally:
+        services.price_table.close()
+        services.price_table = None
+
+
+def test_bulk_orders_reject_stale_quotes(app, client, stock, monkeypatch):
+    services = app.extensions["market_services"]
+    services.price_table = SharedPriceTable.create(name=f"test-{uuid.uuid4().hex[:12]}", capacity=16, depth=8)
+    try:
+        monkeypatch.setattr(services.trading_calendar, "status", lambda: (True, None))
+        prices = [0.0] * 16
+        prices[stock] = 10.0
+        stale = services.price_table.publish(prices)
+        services.price_table.publish(prices)
+        current = services.price_table.publish(prices)
+        order = {"ticker": "ACME", "action": "buy", "quantity": 1}
+        for seq, expired in ((stale, True), (current - 1, False), (current, False)):
+            response = client.post("/api/orders", json={"orders": [order], "quote_seq": seq})
+            assert response.status_code == 200
+            reason = response.get_json()["results"][0]["reason"]
+            assert (reason == "quote_expired") is expired
+    finally:
+        services.price_table.close()
+        services.price_table = None
+
+
+def test_submit_orders_rejects_boolean_quantities(app, make_user, stock):
+    user_id = funded(make_user, "bob", 1000.0)
+    requests = [trading.OrderRequest(stock, "buy", quantity, 9.0, "limit") for quantity in (True, False, 1.0, 1)]
+    fills = trading.submit_orders(user_id, requests)
+    assert [f.reason for f in fills] == ["invalid_order"] * 3 + [None]
+    assert cash(user_id) == 991.0
+
+
+def test_submit_orders_rejects_non_finite_prices(app, make_user, stock):
+    user_id = funded(make_user, "bob", 1000.0)
+    requests = [trading.OrderRequest(stock, "buy", 1, price, "limit")
+                for price in (float("nan"), float("inf"), 1e308, 10 ** 400)]
+    requests.append(trading.OrderRequest(stock, "buy", 1, 9.0, "limit"))
+    fills = trading.submit_orders(user_id, requests)
+    assert [f.reason for f in fills] == ["invalid_order"] * 4 + [None]
+    assert cash(user_id) == 991.0
+
+
+@pytest.mark.parametrize("app_config", [{}, {"WRITE_PIPELINE_ENABLED": True}], ids=["alone", "pipeline"])
+def test_concurrent_settlements_are_durable_when_flush_returns(app, make_user, stock, app_config):
+    users = [funded(make_user, f"u{i}", 1000.0) for i in range(8)]
+    seen = {}
+
+    def trade(user_id):
+        with app.app_context():
+            for _ in range(5):
+                trading.submit_order(user_id, stock, "buy", 1, 10.0, "market", liquidity=1000)
+            # Everything this thread settled is committed by now.
+            with db.engine.connect() as conn:
+                seen[user_id] = conn.execute(
+                    db.select(User.cash_balance).where(User.id == user_id)
+                ).scalar_one()
+
+    threads = [threading.Thread(target=trade, args=(u,)) for u in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert seen == {u: 950.0 for u in users}
+    assert trading.settlement._pending == []
+    pipeline = app.extensions.get("write_pipeline")
+    if pipeline is not None:
+        # Settlements are handed over without the flush lock, so writes share commits.
+        assert pipeline.groups < pipeline.operations
@@ -0,0 +1,57 @@
+from models import db, User
+from usercache import UserCache, load_identity
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_the_ttl(app, make_user):
+    user_id = make_user("alice")
+    clock = Clock()
+    cache = UserCache(ttl=60.0, clock=clock)
+    assert cache.get(user_id, load_identity).username == "alice"
+    clock.now = 59.0
+    cache.get(user_id, load_identity)
+    clock.now = 61.0
+    cache.get(user_id, load_identity)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_least_recently_used_entry_is_evicted(app, make_user):
+    ids = [make_user(name) for name in ("a", "b", "c")]
+    cache = UserCache(maxsize=2)
+    cache.get(ids[0], load_identity)
+    cache.get(ids[1], load_identity)
+    cache.get(ids[0], load_identity)
+    cache.get(ids[2], load_identity)
+    assert list(cache._entries) == [ids[0], ids[2]]
+    assert cache.evictions == 1
+
+
+def test_updating_a_user_drops_its_entry(app, make_user):
+    user_id = make_user("alice")
+    cache = app.extensions["user_cache"]
+    assert cache.get(user_id, load_identity).role == "user"
+
+    db.session.get(User, user_id).role = "admin"
+    db.session.commit()
+
+    assert cache.stats()["invalidations"] == 1
+    assert cache.get(user_id, load_identity).role == "admin"
+
+
+def test_deleting_a_user_drops_its_entry(app, make_user):
+    user_id = make_user("alice")
+    cache = app.extensions["user_cache"]
+    cache.get(user_id, load_identity)
+
+    db.session.delete(db.session.get(User, user_id))
+    db.session.commit()
+
+    assert cache.get(user_id, load_identity) is None
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+from models import db, EquitySnapshot
+from valuation import MarkToMarketJob, prune_snapshots
+
+
+def test_marks_only_while_open_and_once_after_the_close(app):
+    hours = iter([False, True, True, False, False, True])
+    job = MarkToMarketJob(app, None, is_open=lambda: next(hours))
+    assert [job.due() for _ in range(6)] == [False, True, True, True, False, True]
+
+
+def test_prune_snapshots_keeps_the_retention_window(app, make_user):
+    user_id = make_user("alice")
+    now = datetime(2026, 10, 18, 12, 0)
+    for age in (0, 29, 31, 400):
+        db.session.add(EquitySnapshot(
+            user_id=user_id, taken_at=now - timedelta(days=age), cash=0.0, cost_basis=0.0,
+            market_value=0.0, unrealized_pnl=0.0, equity=0.0,
+        ))
+    db.session.commit()
+
+    assert prune_snapshots(30, now) == 2
+    kept = sorted((now - s.taken_at).days for s in EquitySnapshot.query)
+    assert kept == [0, 29]
@@ -0,0 +1,647 @@
+import contextlib
+import math
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import Boolean, bindparam, case, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+from ledger import DEPOSIT, WITHDRAWAL, entry
+from matching import BUY, SELL, MatchingEngine, Order, from_ticks, to_ticks
+from models import db, User, Stock, Portfolio, Transaction, LimitOrder, LedgerEntry
+
+
+# -------------------------
+# TRADE EXECUTION
+# -------------------------
+# An order goes through three steps:
+#
+#   1. reserve  - one short transaction takes the cash (buy) or shares (sell)
+#                 out of the account with a conditional UPDATE, so two orders
+#                 can never spend the same balance, and writes the order's
+#                 LimitOrder row: "open" for a limit, "pending" for a market
+#                 order until settlement marks it filled or cancelled.
+#   2. match    - the in-memory MatchingEngine fills it against resting
+#                 orders and the house (Stock.volume is the house liquidity).
+#   3. settle   - fills queue up in `settlement` and are written in batches:
+#                 Transaction and LedgerEntry rows, positions, cash, house
+#                 volume and order status all go out in one transaction.
+#
+# The book lives in the one process that runs the market, and resting orders
+# are reloaded from LimitOrder by restore_book() when it starts. A market
+# order still "pending" then was reserved but never settled (the process
+# died in between); restore_book() hands its reservation back first.
+# Workers of a shared producer have no book: submit_order(), submit_orders(),
+# cancel_order() and set_liquidity() pass their calls on to the producer's
+# order desk (orderdesk.py). A replay (replay.py) puts a book and settlement
+# queue of its own on its app context instead.
+
+OPEN = "open"
+PENDING = "pending"
+
+# Prices above this (or NaN/inf) are rejected as invalid orders; prices are
+# stored as integer cents in the book.
+MAX_PRICE = 1_000_000_000.0
+
+matching_engine = MatchingEngine()
+
+
+@dataclass
+class Fill:
+    ok: bool
+    action: str
+    stock_id: int
+    quantity: int
+    price: float
+    filled: int = 0
+    average_price: Optional[float] = None
+    resting: int = 0
+    reason: Optional[str] = None
+    order_id: Optional[int] = None
+
+    @property
+    def total(self):
+        return round((self.average_price or 0) * self.filled, 2)
+
+
+def _retry(fn, *args, retries=3):
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args)
+        except OperationalError:
+            # SQLite reports a busy database instead of waiting forever.
+            if attempt == retries:
+                raise
+            time.sleep(0.01 * (attempt + 1))
+
+
+def _transaction(fn, *args):
+    """Run ``fn(conn, *args)`` in a transaction of its own or, when the app
+    has a write pipeline, as part of its next group commit."""
+    pipeline = _pipeline()
+    if pipeline is not None:
+        return _retry(pipeline.run, fn, *args)
+    return _retry(_run_alone, fn, *args)
+
+
+def _pipeline():
+    return current_app.extensions.get("write_pipeline") if has_app_context() else None
+
+
+def _run_alone(fn, *args):
+    with db.engine.begin() as conn:
+        return fn(conn, *args)
+
+
+def _desk():
+    if not has_app_context() or "matching_engine" in g:
+        return None
+    return current_app.extensions.get("order_desk")
+
+
+def _book():
+    return g.get("matching_engine", matching_engine) if has_app_context() else matching_engine
+
+
+def _settlement():
+    return g.get("settlement", settlement) if has_app_context() else settlement
+
+
+def _price_table():
+    # Only the process that owns the market publishes traded volume; a
+    # replay's private book and settlement stay off the live table.
+    if not has_app_context() or "settlement" in g:
+        return None
+    return current_app.extensions.get("price_table")
+
+
+def submit_order(user_id, stock_id, action, quantity, price, order_type="market",
+                 reference=None, liquidity=0, flush=True):
+    """Reserve, match and settle one order.
+
+    Market orders are immediate-or-cancel at ``price`` (the quote the user
+    saw); limit orders rest at ``price`` and trade with the house at
+    ``reference`` when that is better.
+    """
+    if (action not in (BUY, SELL) or order_type not in ("market", "limit")
+            or quantity <= 0 or not _valid_price(price)):
+        return Fill(False, action, stock_id, quantity, price, reason="invalid_order")
+    desk = _desk()
+    if desk is not None:
+        return desk.call("submit_order", user_id, stock_id, action, quantity, price,
+                         order_type, reference, liquidity, flush)
+
+    ioc = order_type == "market"
+    price = from_ticks(to_ticks(price))
+    if ioc:
+        reference = price
+
+    order_id = _transaction(_reserve, user_id, stock_id, action, quantity, price, PENDING if ioc else OPEN)
+    if order_id is None:
+        reason = "insufficient_cash" if action == BUY else "insufficient_shares"
+        return Fill(False, action, stock_id, quantity, price, reason=reason)
+
+    order = Order(order_id, user_id, stock_id, action, to_ticks(price), quantity, ioc=ioc)
+    trades = _book().submit(order, reference, liquidity)
+    releases = [(order, order.remaining)] if ioc and order.remaining else []
+    queue = _settlement()
+    queue.add(trades, releases)
+    if flush:
+        queue.flush()
+    return _result(order, trades, price)
+
+
+def _valid_price(price):
+    # Range first: a huge JSON integer would overflow isfinite().
+    return price is not None and 0 < price <= MAX_PRICE and math.isfinite(price)
+
+
+@dataclass
+class OrderRequest:
+    stock_id: int
+    action: str
+    quantity: int
+    price: float
+    order_type: str = "market"
+    reference: Optional[float] = None
+    liquidity: int = 0
+
+
+def submit_orders(user_id, requests):
+    """Reserve, match and settle a batch of one user's orders.
+
+    All orders are checked against the user's cash and holdings in one pass,
+    in the order given, and everything accepted is reserved in a single
+    transaction; fills then settle together in one more. Returns one Fill
+    per request, in order.
+    """
+    desk = _desk()
+    if desk is not None:
+        return desk.call("submit_orders", user_id, requests)
+    results = [None] * len(requests)
+    accepted = []
+    for i, r in enumerate(requests):
+        if (r.action not in (BUY, SELL) or r.order_type not in ("market", "limit")
+                or type(r.quantity) is not int or r.quantity <= 0
+                or not _valid_price(r.price)):
+            results[i] = Fill(False, r.action, r.stock_id, r.quantity, r.price, reason="invalid_order")
+        else:
+            accepted.append(i)
+
+    prices = {i: from_ticks(to_ticks(requests[i].price)) for i in accepted}
+    reserved = _transaction(_reserve_batch, user_id, requests, accepted, prices)
+
+    orders = []
+    for i in accepted:
+        r = requests[i]
+        if i not in reserved:
+            reason = "insufficient_cash" if r.action == BUY else "insufficient_shares"
+            results[i] = Fill(False, r.action, r.stock_id, r.quantity, prices[i], reason=reason)
+            continue
+        ioc = r.order_type == "market"
+        order = Order(reserved[i], user_id, r.stock_id, r.action, to_ticks(prices[i]), r.quantity, ioc=ioc)
+        orders.append((i, order, prices[i] if ioc else r.reference, r.liquidity))
+
+    book = _book()
+    all_trades, releases = [], []
+    for i, order, reference, liquidity in orders:
+        trades = book.submit(order, reference, liquidity)
+        all_trades.extend(trades)
+        if order.ioc and order.remaining:
+            releases.append((order, order.remaining))
+        results[i] = _result(order, trades, prices[i])
+    if all_trades or releases:
+        queue = _settlement()
+        queue.add(all_trades, releases)
+        queue.flush()
+    return results
+
+
+def place_order(user_id, stock, action, quantity, price, order_type="market", limit_price=None, flush=True):
+    """The order the trade form sends for ``stock`` at the quoted ``price``:
+    a market order at that price, or a limit at ``limit_price`` with
+    ``price`` as the house's reference."""
+    if order_type == "limit":
+        return submit_order(
+            user_id, stock.id, action, quantity, limit_price, "limit",
+            reference=price, liquidity=stock.volume, flush=flush,
+        )
+    return submit_order(user_id, stock.id, action, quantity, price, liquidity=stock.volume, flush=flush)
+
+
+def _result(order, trades, price):
+    filled = order.filled
+    average = None
+    if filled:
+        average = round(sum(from_ticks(t.price) * t.quantity for t in trades) / filled, 2)
+    if order.ioc and not filled:
+        return Fill(False, order.side, order.stock_id, order.quantity, price, reason="no_liquidity")
+    return Fill(
+        True, order.side, order.stock_id, order.quantity, price,
+        filled=filled, average_price=average,
+        resting=0 if order.ioc else order.remaining,
+        order_id=None if order.ioc else order.id,
+    )
+
+
+def cancel_order(user_id, order_id, flush=True):
+    desk = _desk()
+    if desk is not None:
+        return desk.call("cancel_order", user_id, order_id, flush)
+    book, queue = _book(), _settlement()
+    order = book.orders.get(order_id)
+    if order is None or order.user_id != user_id:
+        return False
+    cancelled = book.cancel(order_id)
+    if cancelled is None:
+        return False
+    queue.add([], [cancelled])
+    if flush:
+        queue.flush()
+    return True
+
+
+def set_liquidity(stock_id, volume):
+    desk = _desk()
+    if desk is not None:
+        return desk.call("set_liquidity", stock_id, volume)
+    _book().set_liquidity(stock_id, volume)
+
+
+def deposit_cash(user_id, amount):
+    return _transaction(_deposit, user_id, amount)
+
+
+def withdraw_cash(user_id, amount):
+    return _transaction(_withdraw, user_id, amount)
+
+
+def _deposit(conn, user_id, amount):
+    if conn.execute(
+        update(User).where(User.id == user_id)
+        .values(cash_balance=User.cash_balance + amount)
+    ).rowcount != 1:
+        return False
+    conn.execute(insert(LedgerEntry.__table__), [entry(user_id, DEPOSIT, amount)])
+    return True
+
+
+def _withdraw(conn, user_id, amount):
+    # Same guard as a buy: the balance check and the debit are one statement.
+    if conn.execute(
+        update(User).where(User.id == user_id, User.cash_balance >= amount)
+        .values(cash_balance=User.cash_balance - amount)
+    ).rowcount != 1:
+        return False
+    conn.execute(insert(LedgerEntry.__table__), [entry(user_id, WITHDRAWAL, -amount)])
+    return True
+
+
+def restore_book():
+    pending = [
+        (_order(row), row.remaining)
+        for row in LimitOrder.query.filter_by(status=PENDING).order_by(LimitOrder.id)
+    ]
+    if pending:
+        # Settling them as releases refunds the reservation and marks them cancelled.
+        _transaction(_write_batch, [([], pending)])
+    orders = [_order(row) for row in LimitOrder.query.filter_by(status=OPEN).order_by(LimitOrder.id)]
+    liquidity = dict(db.session.query(Stock.id, Stock.volume).all())
+    _book().restore(orders, liquidity)
+
+
+def _order(row):
+    order = Order(row.id, row.user_id, row.stock_id, row.side, to_ticks(row.price), row.quantity)
+    order.remaining = row.remaining
+    return order
+
+
+def _reserve(conn, user_id, stock_id, action, quantity, price, status):
+    # Returns the new LimitOrder id, or None when the balance doesn't cover it.
+    if action == BUY:
+        cost = price * quantity
+        taken = conn.execute(
+            update(User)
+            .where(User.id == user_id, User.cash_balance >= cost)
+            .values(cash_balance=User.cash_balance - cost)
+        )
+    else:
+        # Emptied positions keep their row (quantity 0) so shares coming
+        # back from a cancelled sell have somewhere to go.
+        taken = conn.execute(
+            update(Portfolio)
+            .where(
+                Portfolio.user_id == user_id,
+                Portfolio.stock_id == stock_id,
+                Portfolio.quantity >= quantity,
+            )
+            .values(quantity=Portfolio.quantity - quantity)
+        )
+    if taken.rowcount == 0:
+        return None
+    result = conn.execute(insert(LimitOrder).values(
+        user_id=user_id, stock_id=stock_id, side=action, price=price,
+        quantity=quantity, remaining=quantity, status=status,
+    ))
+    return result.inserted_primary_key[0]
+
+
+class _Conflict(OperationalError):
+    """Balances moved between the batch check and the reservation."""
+
+    def __init__(self):
+        super().__init__("batch reservation", None, Exception("balances changed"))
+
+
+def _reserve_batch(conn, user_id, requests, accepted, prices):
+    # Returns {request index: LimitOrder id} for the orders that fit.
+    cash = conn.execute(
+        select(User.cash_balance).where(User.id == user_id).with_for_update()
+    ).scalar() or 0.0
+    sell_stocks = {requests[i].stock_id for i in accepted if requests[i].action == SELL}
+    held = dict(conn.execute(
+        select(Portfolio.stock_id, Portfolio.quantity)
+        .where(Portfolio.user_id == user_id, Portfolio.stock_id.in_(list(sell_stocks)))
+        .with_for_update()
+    ).all()) if sell_stocks else {}
+
+    reserved = {}
+    spent = 0.0
+    taken = defaultdict(int)
+    for i in accepted:
+        r = requests[i]
+        if r.action == BUY:
+            cost = prices[i] * r.quantity
+            if spent + cost > cash:
+                continue
+            spent += cost
+        else:
+            if taken.get(r.stock_id, 0) + r.quantity > held.get(r.stock_id, 0):
+                continue
+            taken[r.stock_id] += r.quantity
+        reserved[i] = None
+
+    # Same conditional UPDATEs as a single order, once per batch; if a
+    # concurrent order got there first the whole reservation is retried.
+    if spent and conn.execute(
+        update(User)
+        .where(User.id == user_id, User.cash_balance >= spent)
+        .values(cash_balance=User.cash_balance - spent)
+    ).rowcount != 1:
+        raise _Conflict()
+    if taken:
+        portfolio_t = Portfolio.__table__
+        moved = conn.execute(
+            portfolio_t.update()
+            .where(
+                portfolio_t.c.user_id == user_id,
+                portfolio_t.c.stock_id == bindparam("b_stock"),
+                portfolio_t.c.quantity >= bindparam("b_qty"),
+            )
+            .values(quantity=portfolio_t.c.quantity - bindparam("b_qty")),
+            [dict(b_stock=s, b_qty=q) for s, q in taken.items()],
+        )
+        if moved.rowcount != len(taken):
+            raise _Conflict()
+
+    rows = [
+        dict(user_id=user_id, stock_id=requests[i].stock_id, side=requests[i].action, price=prices[i],
+             quantity=requests[i].quantity, remaining=requests[i].quantity,
+             status=OPEN if requests[i].order_type == "limit" else PENDING)
+        for i in reserved
+    ]
+    if not rows:
+        return reserved
+    order_t = LimitOrder.__table__
+    if conn.dialect.insert_executemany_returning:
+        # Autoincrement ids rise in row order within the batched INSERT.
+        ids = sorted(conn.execute(insert(order_t).returning(order_t.c.id), rows).scalars())
+    else:
+        # MySQL has no INSERT ... RETURNING: one statement per order.
+        ids = [conn.execute(insert(order_t).values(row)).inserted_primary_key[0] for row in rows]
+    return dict(zip(reserved, ids))
+
+
+# -------------------------
+# SETTLEMENT
+# -------------------------
+class _Settle:
+    __slots__ = ("work", "done")
+
+    def __init__(self, trades, releases):
+        self.work = (trades, releases)
+        self.done = False
+
+
+class Settlement:
+    """Collects fills and releases and writes them in batches.
+
+    ``flush`` drains everything queued so far and returns once everything
+    the calling thread queued is committed, whether it wrote that itself or
+    another flusher drained it first. Without a write pipeline flushers take
+    turns on the flush lock, so work queued during one write goes out
+    together in the next. With one, the pipeline already serializes and
+    groups writes: flushers hand their batches over without the lock and
+    several of them share a commit.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+
+    def add(self, trades, releases):
+        item = _Settle(trades, releases)
+        self._local.__dict__.setdefault("items", []).append(item)
+        with self._lock:
+            self._pending.append(item)
+
+    def flush(self):
+        mine = self._local.__dict__.pop("items", [])
+        turns = contextlib.nullcontext() if _pipeline() is not None else self._flush_lock
+        written = 0
+        while not all(item.done for item in mine):
+            with turns:
+                with self._lock:
+                    batch, self._pending = self._pending, []
+                    if not batch:
+                        # The rest of ours is in another flusher's write.
+                        if not all(item.done for item in mine):
+                            self._changed.wait()
+                        continue
+                try:
+                    _transaction(_write_batch, [item.work for item in batch])
+                except Exception:
+                    with self._lock:
+                        self._pending[:0] = batch
+                        self._changed.notify_all()
+                    raise
+                traded = defaultdict(int)
+                for item in batch:
+                    for t in item.work[0]:
+                        traded[t.stock_id] += t.quantity
+                table = _price_table()
+                with self._lock:
+                    if traded and table is not None:
+                        table.add_traded(traded)
+                    for item in batch:
+                        item.done = True
+                    self._changed.notify_all()
+                written += len(batch)
+        return written
+
+
+settlement = Settlement()
+
+
+def _write_batch(conn, batch):
+    now = datetime.utcnow()
+    transactions = []
+    ledger = []
+    cash = defaultdict(float)
+    bought = defaultdict(lambda: [0, 0.0])
+    returned = defaultdict(int)
+    volume = defaultdict(int)
+    # Per order: shares filled or released in this batch, and whether it was
+    # cancelled. Written as deltas, below, so batches commute.
+    settled = defaultdict(int)
+    cancelled = set()
+
+    for trades, releases in batch:
+        for t in trades:
+            price = from_ticks(t.price)
+            if t.buy is not None:
+                transactions.append(dict(
+                    user_id=t.buy.user_id, stock_id=t.stock_id, order_type=BUY,
+                    quantity=t.quantity, price=price,
+                ))
+                ledger.append(entry(t.buy.user_id, BUY, -price * t.quantity, t.stock_id, t.quantity, price, now))
+                position = bought[(t.buy.user_id, t.stock_id)]
+                position[0] += t.quantity
+                position[1] += price * t.quantity
+                # Buyers reserved at their limit; hand back any price improvement.
+                cash[t.buy.user_id] += (from_ticks(t.buy.price) - price) * t.quantity
+                settled[t.buy.id] += t.quantity
+            else:
+                volume[t.stock_id] += t.quantity
+            if t.sell is not None:
+                transactions.append(dict(
+                    user_id=t.sell.user_id, stock_id=t.stock_id, order_type=SELL,
+                    quantity=t.quantity, price=price,
+                ))
+                ledger.append(entry(t.sell.user_id, SELL, price * t.quantity, t.stock_id, t.quantity, price, now))
+                cash[t.sell.user_id] += price * t.quantity
+                settled[t.sell.id] += t.quantity
+            else:
+                volume[t.stock_id] -= t.quantity
+        for order, qty in releases:
+            if order.side == BUY:
+                cash[order.user_id] += from_ticks(order.price) * qty
+            else:
+                returned[(order.user_id, order.stock_id)] += qty
+            cancelled.add(order.id)
+            settled[order.id] += qty
+
+    user_t, stock_t = User.__table__, Stock.__table__
+    portfolio_t, order_t = Portfolio.__table__, LimitOrder.__table__
+
+    if transactions:
+        conn.execute(insert(Transaction.__table__), transactions)
+        conn.execute(insert(LedgerEntry.__table__), ledger)
+
+    if bought:
+        existing = set(conn.execute(
+            select(portfolio_t.c.user_id, portfolio_t.c.stock_id)
+            .where(
+                portfolio_t.c.user_id.in_({u for u, _ in bought}),
+                portfolio_t.c.stock_id.in_({s for _, s in bought}),
+            )
+            .with_for_update()
+        )) & set(bought)
+        updates = [
+            dict(b_user=u, b_stock=s, b_qty=q, b_cost=c)
+            for (u, s), (q, c) in bought.items() if (u, s) in existing
+        ]
+        inserts = [
+            dict(user_id=u, stock_id=s, quantity=q, average_price=c / q)
+            for (u, s), (q, c) in bought.items() if (u, s) not in existing
+        ]
+        if updates:
+            # average_price first: MySQL applies SET clauses left to right.
+            conn.execute(
+                portfolio_t.update()
+                .where(
+                    portfolio_t.c.user_id == bindparam("b_user"),
+                    portfolio_t.c.stock_id == bindparam("b_stock"),
+                )
+                .ordered_values(
+                    (portfolio_t.c.average_price,
+                     (portfolio_t.c.average_price * portfolio_t.c.quantity + bindparam("b_cost"))
+                     / (portfolio_t.c.quantity + bindparam("b_qty"))),
+                    (portfolio_t.c.quantity, portfolio_t.c.quantity + bindparam("b_qty")),
+                ),
+                updates,
+            )
+        if inserts:
+            conn.execute(insert(portfolio_t), inserts)
+
+    if returned:
+        conn.execute(
+            portfolio_t.update()
+            .where(
+                portfolio_t.c.user_id == bindparam("b_user"),
+                portfolio_t.c.stock_id == bindparam("b_stock"),
+            )
+            .values(quantity=portfolio_t.c.quantity + bindparam("b_qty")),
+            [dict(b_user=u, b_stock=s, b_qty=q) for (u, s), q in returned.items()],
+        )
+
+    deltas = [dict(b_user=u, b_delta=d) for u, d in cash.items() if d]
+    if deltas:
+        conn.execute(
+            user_t.update()
+            .where(user_t.c.id == bindparam("b_user"))
+            .values(cash_balance=user_t.c.cash_balance + bindparam("b_delta")),
+            deltas,
+        )
+
+    moved = [dict(b_stock=s, b_delta=d) for s, d in volume.items() if d]
+    if moved:
+        conn.execute(
+            stock_t.update()
+            .where(stock_t.c.id == bindparam("b_stock"))
+            .values(volume=stock_t.c.volume + bindparam("b_delta")),
+            moved,
+        )
+
+    # With a write pipeline, batches don't necessarily commit in the order
+    # they were queued, so nothing here is read off the live Order: remaining
+    # only ever goes down by what this batch settled, and a cancel sticks
+    # whichever side of a late fill it lands on.
+    statuses = [
+        dict(b_id=order_id, b_settled=qty, b_cancel=order_id in cancelled)
+        for order_id, qty in settled.items()
+    ]
+    if statuses:
+        # status first: MySQL applies SET clauses left to right.
+        conn.execute(
+            order_t.update()
+            .where(order_t.c.id == bindparam("b_id"))
+            .ordered_values(
+                (order_t.c.status, case(
+                    (bindparam("b_cancel", type_=Boolean), "cancelled"),
+                    (order_t.c.status == "cancelled", "cancelled"),
+                    (order_t.c.remaining == bindparam("b_settled"), "filled"),
+                    else_=OPEN,
+                )),
+                (order_t.c.remaining, order_t.c.remaining - bindparam("b_settled")),
+            ),
+            statuses,
+        )
@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+
+from models import db, User
+
+
+# -------------------------
+# USER CACHE
+# -------------------------
+# Flask-Login resolves the session's user id on every request. The cache
+# keeps just identity and role per user id (LRU, bounded, with a TTL), so
+# pages that only need to know who is asking skip the User query. Cash is
+# deliberately not cached: views that show or change a balance load the User
+# row themselves.
+#
+# ORM updates and deletes of a User drop its entry in this process; other
+# workers pick the change up when their entry expires.
+
+class CachedUser(UserMixin):
+    def __init__(self, id, username, full_name, email, role):
+        self.id = id
+        self.username = username
+        self.full_name = full_name
+        self.email = email
+        self.role = role
+
+    def account(self):
+        """The User row, for reading or changing the balance."""
+        return db.session.get(User, self.id)
+
+
+class UserCache:
+    def __init__(self, maxsize=10000, ttl=60.0, clock=monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id, load):
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        user = load(user_id)
+        if user is not None and self.maxsize > 0:
+            with self._lock:
+                self._entries[user_id] = (now + self.ttl, user)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return user
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            elif self._entries.pop(user_id, None) is None:
+                return
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def load_identity(user_id):
+    row = (
+        db.session.query(User.id, User.username, User.full_name, User.email, User.role)
+        .filter(User.id == user_id)
+        .first()
+    )
+    return CachedUser(*row) if row else None
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _drop_cached_user(mapper, connection, target):
+    if has_app_context():
+        cache = current_app.extensions.get("user_cache")
+        if cache is not None:
+            cache.invalidate(target.id)
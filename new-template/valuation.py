@@ -0,0 +1,222 @@
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import joinedload
+
+from models import db, User, Stock, Portfolio, EquitySnapshot
+
+
+# -------------------------
+# PORTFOLIO VALUATION
+# -------------------------
+# A user's holdings come back from one Portfolio/Stock join and are priced in
+# one NumPy pass over the shared price table. A stock with no live price yet
+# is valued at its listing price.
+
+@dataclass
+class Holding:
+    stock_id: int
+    ticker: str
+    company_name: str
+    quantity: int
+    average_price: float
+    price: float
+    cost_basis: float
+    market_value: float
+    unrealized_pnl: float
+
+
+@dataclass
+class Valuation:
+    cash: float
+    holdings: List[Holding] = field(default_factory=list)
+    cost_basis: float = 0.0
+    market_value: float = 0.0
+    unrealized_pnl: float = 0.0
+
+    @property
+    def equity(self):
+        return round(self.cash + self.market_value, 2)
+
+
+def value_portfolio(user_id, cash, price_table):
+    rows = db.session.execute(
+        select(
+            Portfolio.stock_id, Stock.ticker, Stock.company_name,
+            Portfolio.quantity, Portfolio.average_price, Stock.initial_price,
+        )
+        .join(Stock, Stock.id == Portfolio.stock_id)
+        .where(Portfolio.user_id == user_id, Portfolio.quantity > 0)
+        .order_by(Stock.ticker)
+    ).all()
+    if not rows:
+        return Valuation(cash)
+
+    stock_ids, tickers, names, quantity, average, listing = zip(*rows)
+    quantity = np.array(quantity, dtype=np.int64)
+    average = np.array(average, dtype=np.float64)
+    _, prices = price_table.price_array(stock_ids)
+    prices = np.where(prices > 0, prices, listing)
+    cost = (average * quantity).round(2)
+    value = (prices * quantity).round(2)
+    pnl = (value - cost).round(2)
+
+    holdings = [
+        Holding(*fields) for fields in zip(
+            stock_ids, tickers, names, quantity.tolist(), average.tolist(),
+            prices.tolist(), cost.tolist(), value.tolist(), pnl.tolist(),
+        )
+    ]
+    return Valuation(
+        cash, holdings,
+        cost_basis=round(float(cost.sum()), 2),
+        market_value=round(float(value.sum()), 2),
+        unrealized_pnl=round(float(pnl.sum()), 2),
+    )
+
+
+# -------------------------
+# MARK TO MARKET
+# -------------------------
+# Every account is valued at the same tick and written as one EquitySnapshot
+# row per user, all sharing one taken_at. Positions are read through a
+# server-side cursor and summed per user with bincount, so the job is a
+# handful of array ops per chunk regardless of how many accounts there are.
+
+def mark_to_market(price_table, taken_at=None, chunk=50000):
+    """Snapshot every account's equity; returns the number of rows written."""
+    taken_at = taken_at or datetime.utcnow()
+    _, row = price_table.snapshot()
+    row = np.array(row)  # pin this tick; the producer keeps writing the ring
+
+    with db.engine.connect() as conn:
+        listing = conn.execute(select(Stock.id, Stock.initial_price)).all()
+        accounts = conn.execute(select(User.id, func.coalesce(User.cash_balance, 0.0))).all()
+        if not accounts:
+            return 0
+        user_ids, cash = zip(*accounts)
+        user_ids = np.array(user_ids, dtype=np.int64)
+        cash = np.array(cash, dtype=np.float64)
+
+        size = int(max(stock_id for stock_id, _ in listing)) + 1 if listing else 1
+        prices = np.zeros(max(size, len(row)))
+        for stock_id, price in listing:
+            prices[stock_id] = price
+        live = row > 0
+        prices[:len(row)][live] = row[live].round(2)
+
+        slots = int(user_ids.max()) + 1
+        cost = np.zeros(slots)
+        value = np.zeros(slots)
+        positions = conn.execution_options(stream_results=True, max_row_buffer=chunk).execute(
+            select(Portfolio.user_id, Portfolio.stock_id, Portfolio.quantity, Portfolio.average_price)
+            .where(Portfolio.quantity > 0)
+        )
+        for part in positions.partitions(chunk):
+            part = np.array(list(map(tuple, part)), dtype=np.float64)
+            users = part[:, 0].astype(np.int64)
+            stocks = part[:, 1].astype(np.int64)
+            inside = (users < slots) & (stocks < len(prices))
+            users, stocks, part = users[inside], stocks[inside], part[inside]
+            cost += np.bincount(users, weights=part[:, 3] * part[:, 2], minlength=slots)
+            value += np.bincount(users, weights=prices[stocks] * part[:, 2], minlength=slots)
+
+    cost = cost[user_ids].round(2)
+    value = value[user_ids].round(2)
+    snapshots = [
+        dict(
+            user_id=u, taken_at=taken_at, cash=c, cost_basis=b,
+            market_value=v, unrealized_pnl=round(v - b, 2), equity=round(c + v, 2),
+        )
+        for u, c, b, v in zip(user_ids.tolist(), cash.round(2).tolist(), cost.tolist(), value.tolist())
+    ]
+    with db.engine.begin() as conn:
+        for start in range(0, len(snapshots), chunk):
+            conn.execute(insert(EquitySnapshot.__table__), snapshots[start:start + chunk])
+    return len(snapshots)
+
+
+def prune_snapshots(days, now=None):
+    """Delete equity snapshots older than ``days``; returns how many."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    with db.engine.begin() as conn:
+        return conn.execute(delete(EquitySnapshot).where(EquitySnapshot.taken_at < cutoff)).rowcount
+
+
+def latest_snapshot(user_id):
+    return (
+        EquitySnapshot.query
+        .filter_by(user_id=user_id)
+        .order_by(EquitySnapshot.taken_at.desc())
+        .first()
+    )
+
+
+def leaderboard(limit=10):
+    """Top accounts by equity at the most recent mark."""
+    latest = db.session.query(func.max(EquitySnapshot.taken_at)).scalar()
+    if latest is None:
+        return []
+    return (
+        EquitySnapshot.query
+        .options(joinedload(EquitySnapshot.user))
+        .filter(EquitySnapshot.taken_at == latest)
+        .order_by(EquitySnapshot.equity.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+class MarkToMarketJob:
+    """Runs mark_to_market() every ``interval`` seconds in a background thread.
+
+    With ``is_open`` (a TradingCalendar's) it only marks while the market is
+    open, plus once on the first run after it closes. With ``retention_days``
+    each run also deletes snapshots older than that.
+    """
+
+    def __init__(self, app, price_table, interval=300.0, is_open=None, retention_days=None):
+        self.app = app
+        self.price_table = price_table
+        self.interval = interval
+        self.is_open = is_open
+        self.retention_days = retention_days
+        self._was_open = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        with self.app.app_context():
+            written = mark_to_market(self.price_table)
+            if self.retention_days:
+                prune_snapshots(self.retention_days)
+            return written
+
+    def due(self):
+        if self.is_open is None:
+            return True
+        is_open = self.is_open()
+        due, self._was_open = is_open or self._was_open, is_open
+        return due
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.due():
+                    self.run_once()
+            except Exception:
+                self.app.logger.exception("Mark-to-market run failed")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="mark-to-market", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
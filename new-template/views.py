@@ -0,0 +1,768 @@
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, jsonify
+from flask_login import (
+    LoginManager, login_user, logout_user,
+    login_required, current_user
+)
+import math
+from datetime import datetime
+from functools import wraps
+from sqlalchemy import false, func, or_
+from sqlalchemy.orm import joinedload
+
+from candles import RESOLUTIONS, as_rows
+from exports import EXPORT_FORMATS, iter_transactions
+from imports import IMPORT_COLUMNS, IMPORT_FORMATS, import_stocks
+from ledger import DEPOSIT
+from models import (
+    db, User, Stock, Portfolio, Transaction, LimitOrder, LedgerEntry, MarketHours, MarketSchedule, Watchlist
+)
+from passwords import HasherBusy
+from services import services
+from trading import (
+    MAX_PRICE, OrderRequest, cancel_order, deposit_cash, place_order, set_liquidity, submit_orders, withdraw_cash
+)
+from usercache import load_identity
+from valuation import latest_snapshot, leaderboard, value_portfolio
+
+bp = Blueprint("main", __name__)
+
+# -------------------------
+# LOGIN MANAGER
+# -------------------------
+login_manager = LoginManager()
+login_manager.login_view = "main.login"
+
+@login_manager.user_loader
+def load_user(user_id):
+    return current_app.extensions["user_cache"].get(int(user_id), load_identity)
+
+MAX_CANDLES = 1_000_000
+MAX_BULK_ORDERS = 5000
+TRADE_SYMBOLS = 20
+SEARCH_LIMIT = 20
+STARTING_CASH = 15000.00
+BUSY_MESSAGE = "The server is busy. Please try again in a moment."
+
+def get_opening_price(stock_id):
+    stock = Stock.query.get(stock_id)
+    if not stock:
+        return None
+    return stock.initial_price
+
+
+# -------------------------
+# ROLE CONTROL
+# -------------------------
+def role_required(role):
+    def decorator(f):
+        @wraps(f)
+        @login_required
+        def decorated_function(*args, **kwargs):
+            if not current_user.is_authenticated:
+                return redirect(url_for('main.login'))
+            if current_user.role != role:
+                return redirect(url_for('main.home'))
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+# -------------------------
+# AUTH ROUTES
+# -------------------------
+@bp.route("/register", methods=["GET", "POST"])
+def register():
+    message = None
+    if request.method == "POST":
+        username = request.form.get("username")
+        email = request.form.get("email")
+        full_name = request.form.get("full_name")
+        password = request.form.get("password")
+
+        existing = User.query.filter((User.username == username) | (User.email == email)).first()
+
+        if existing:
+            message = "User already exists!"
+        else:
+            try:
+                hashed_password = current_app.extensions["passwords"].hash(password)
+            except HasherBusy:
+                return render_template("register.html", message=BUSY_MESSAGE), 503
+            new_user = User(
+                username=username,
+                email=email,
+                full_name=full_name,
+                password=hashed_password,
+                cash_balance=STARTING_CASH
+            )
+            db.session.add(new_user)
+            db.session.flush()
+            db.session.add(LedgerEntry(user_id=new_user.id, kind=DEPOSIT, amount=STARTING_CASH))
+            db.session.commit()
+            return redirect(url_for("main.login", message="User created successfully!"))
+    return render_template("register.html", message=message)
+
+@bp.route("/login", methods=["GET", "POST"])
+def login():
+    message = request.args.get("message")
+    if request.method == "POST":
+        username = request.form.get("username")
+        password = request.form.get("password")
+        user = User.query.filter_by(username=username).first()
+        passwords = current_app.extensions["passwords"]
+        try:
+            valid = user is not None and passwords.verify(user.password, password)
+            if valid and passwords.needs_rehash(user.password):
+                # Hash parameters changed since this one was made; upgrade it.
+                user.password = passwords.hash(password)
+                db.session.commit()
+        except HasherBusy:
+            return render_template("login.html", message=BUSY_MESSAGE), 503
+        if valid:
+            login_user(user)
+            if user.role == "admin":
+                return redirect(url_for("main.admin_dashboard"))
+            else:
+                return redirect(url_for("main.portfolio"))
+        else:
+            message = "Invalid username or password"
+    return render_template("login.html", message=message)
+
+@bp.route("/logout")
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for("main.login", message="Logout successful!"))
+
+# -------------------------
+# USER ROUTES
+# -------------------------
+@bp.route("/")
+@login_required
+def home():
+    return render_template(
+        "home.html",
+        market_is_open=services.trading_calendar.is_open(),
+        market=services.trading_calendar.hours
+    )
+
+@bp.route("/portfolio")
+@login_required
+def portfolio():
+    user = current_user.account()
+    valuation = value_portfolio(user.id, user.cash_balance, services.price_table)
+    return render_template("portfolio.html",
+        valuation=valuation,
+        snapshot=latest_snapshot(user.id),
+        user=user,
+        message=request.args.get("message"),
+        market_is_open=services.trading_calendar.is_open(),
+        market=services.trading_calendar.hours,
+        schedule=services.trading_calendar.schedule,
+        cash_balance=user.cash_balance
+    )
+
+@bp.route("/trade", methods=["GET", "POST"])
+@login_required
+def trade():
+    # Only the user's holdings, open orders, watchlist and the symbols they
+    # searched for (?symbols=AAPL,MSFT) are rendered, so the page stays the
+    # same size however many stocks are listed.
+    user = current_user.account()
+    portfolio = (
+        Portfolio.query.options(joinedload(Portfolio.stock))
+        .filter(Portfolio.user_id == user.id, Portfolio.quantity > 0).all()
+    )
+    open_orders = LimitOrder.query.options(joinedload(LimitOrder.stock)).filter_by(user_id=user.id, status="open").all()
+    watched = {stock_id for stock_id, in db.session.query(Watchlist.stock_id).filter_by(user_id=user.id)}
+    symbols = request.args.get("symbols", "")
+    searched = services.ticker_index.lookup(symbols.split(",")[:TRADE_SYMBOLS])
+    ids = {p.stock_id for p in portfolio} | {o.stock_id for o in open_orders} | watched | set(searched.values())
+    stocks = Stock.query.filter(Stock.id.in_(ids)).order_by(Stock.ticker).all() if ids else []
+    quote_seq, display_prices = services.price_table.quote(stock.id for stock in stocks)
+    for stock in stocks:
+        display_prices.setdefault(stock.id, stock.initial_price)
+    opening_prices = {stock.id: stock.initial_price for stock in stocks}
+    message = request.args.get("message")
+
+    # --- Get market info ---
+    market = services.trading_calendar.hours
+    schedule = services.trading_calendar.schedule
+    market_open, closed_reason = services.trading_calendar.status()
+
+    # --- Block trade if market closed ---
+    if not market_open:
+        return render_template(
+            "trade.html",
+            stocks=stocks,
+            portfolio=portfolio,
+            open_orders=open_orders,
+            display_prices=display_prices,
+            quote_seq=quote_seq,
+            opening_prices=opening_prices,
+            message=closed_reason or "Market is currently closed.",
+            market_is_open=False,
+            market=market,
+            schedule=schedule,
+            cash_balance=user.cash_balance,
+            watched=watched,
+            symbols=symbols,
+        )
+
+    # --- Handle trade form submission ---
+    if request.method == "POST":
+        action = request.form.get("action")
+        order_type = request.form.get("order_type", "market")
+        stock_id = int(request.form.get("stock_id"))
+        qty = int(request.form.get("quantity"))
+        stock = Stock.query.get(stock_id)
+        quoted = request.form.get("quote_seq", type=int)
+        if quoted is None:
+            price = services.price_table.price(stock.id)
+        else:
+            price = services.price_table.price_at(quoted, stock.id, current_app.config["QUOTE_MAX_AGE_TICKS"])
+        if price is None:
+            return redirect(url_for("main.trade", symbols=symbols or None,
+                                    message="Price quote expired. Please review the latest price and try again."))
+
+        if order_type == "limit":
+            # Limits are referenced to the latest price, not the quoted one.
+            price = services.price_table.price(stock.id)
+        fill = place_order(user.id, stock, action, qty, price, order_type,
+                           request.form.get("limit_price", type=float))
+
+        verb = "Bought" if action == "buy" else "Sold"
+        if fill.ok and fill.resting:
+            message = (f"Limit order to {action} {qty} {stock.ticker} at ${fill.price}: "
+                       f"{fill.filled} filled, {fill.resting} open.")
+        elif fill.ok and fill.filled < qty:
+            message = (f"{verb} {fill.filled} of {qty} shares of {stock.ticker} at ${fill.average_price}; "
+                       f"no more shares were available.")
+        elif fill.ok:
+            message = f"{verb} {qty} shares of {stock.ticker} at ${fill.average_price}"
+        elif fill.reason == "insufficient_cash":
+            message = "Not enough balance."
+        elif fill.reason == "insufficient_shares":
+            message = "You don’t have enough shares."
+        elif fill.reason == "no_liquidity":
+            message = f"No {stock.ticker} shares are available right now."
+        else:
+            message = "Invalid order."
+        return redirect(url_for("main.trade", message=message, symbols=symbols or None))
+
+    # --- Render trade page if market open ---
+    return render_template(
+        "trade.html",
+        stocks=stocks,
+        portfolio=portfolio,
+        open_orders=open_orders,
+        display_prices=display_prices,
+        quote_seq=quote_seq,
+        opening_prices=opening_prices,
+        message=message,
+        market_is_open=True,
+        market=market,
+        schedule=schedule,
+        cash_balance=user.cash_balance,
+        watched=watched,
+        symbols=symbols,
+    )
+
+
+@bp.route("/trade/cancel/<int:order_id>", methods=["POST"])
+@login_required
+def cancel_limit_order(order_id):
+    if cancel_order(current_user.id, order_id):
+        message = "Order cancelled."
+    else:
+        message = "That order is no longer open."
+    return redirect(url_for("main.trade", message=message))
+
+
+@bp.route("/api/stocks/search")
+@login_required
+def api_stock_search():
+    """Autocomplete: ?q=<ticker or company prefix>&limit=<n>."""
+    limit = min(request.args.get("limit", 10, type=int), SEARCH_LIMIT)
+    matches = services.ticker_index.search(request.args.get("q", ""), limit)
+    _, prices = services.price_table.quote(stock_id for stock_id, _, _ in matches)
+    return jsonify(results=[
+        {"id": stock_id, "ticker": ticker, "company_name": name, "price": prices.get(stock_id)}
+        for stock_id, ticker, name in matches
+    ])
+
+
+@bp.route("/watchlist", methods=["POST"])
+@login_required
+def watchlist_add():
+    found = services.ticker_index.lookup([request.form.get("ticker", "")])
+    if not found:
+        return redirect(url_for("main.trade", message="Unknown ticker."))
+    ticker, stock_id = found.popitem()
+    if not Watchlist.query.filter_by(user_id=current_user.id, stock_id=stock_id).first():
+        db.session.add(Watchlist(user_id=current_user.id, stock_id=stock_id))
+        db.session.commit()
+    return redirect(url_for("main.trade", message=f"{ticker} added to your watchlist."))
+
+
+@bp.route("/watchlist/<int:stock_id>/remove", methods=["POST"])
+@login_required
+def watchlist_remove(stock_id):
+    Watchlist.query.filter_by(user_id=current_user.id, stock_id=stock_id).delete()
+    db.session.commit()
+    return redirect(url_for("main.trade", message="Removed from your watchlist."))
+
+
+@bp.route("/api/orders", methods=["POST"])
+@login_required
+def api_orders():
+    """Submit a batch of orders in one request.
+
+    Body: {"orders": [{"ticker", "action", "quantity", "order_type"?,
+    "limit_price"?, "client_id"?}, ...], "quote_seq"?}. Market orders are
+    priced from one tick (``quote_seq`` if given, else the latest); market
+    orders against a ``quote_seq`` older than QUOTE_MAX_AGE_TICKS are
+    rejected with ``quote_expired``. Orders
+    are checked against cash and holdings in the order given; results come
+    back in the same order.
+    """
+    body = request.get_json(silent=True)
+    orders = body.get("orders") if isinstance(body, dict) else None
+    if not isinstance(orders, list) or not orders:
+        return jsonify(error="expected a JSON object with a non-empty 'orders' list"), 400
+    if len(orders) > MAX_BULK_ORDERS:
+        return jsonify(error=f"at most {MAX_BULK_ORDERS} orders per request"), 400
+    market_open, closed_reason = services.trading_calendar.status()
+    if not market_open:
+        return jsonify(error=closed_reason or "Market is currently closed."), 409
+
+    tickers = {o.get("ticker", "").upper() for o in orders if isinstance(o, dict) and isinstance(o.get("ticker"), str)}
+    stocks = {s.ticker.upper(): s for s in Stock.query.filter(Stock.ticker.in_(tickers))} if tickers else {}
+    quoted = body.get("quote_seq")
+    if type(quoted) is int:
+        max_age = current_app.config["QUOTE_MAX_AGE_TICKS"]
+        prices = {s.id: services.price_table.price_at(quoted, s.id, max_age) for s in stocks.values()}
+    else:
+        quoted, prices = services.price_table.quote(s.id for s in stocks.values())
+
+    batch, results = [], [None] * len(orders)
+    for i, o in enumerate(orders):
+        if not isinstance(o, dict):
+            results[i] = {"ok": False, "reason": "invalid_order"}
+            continue
+        stock = stocks.get(str(o.get("ticker", "")).upper())
+        if stock is None:
+            results[i] = {"ok": False, "reason": "unknown_ticker"}
+            continue
+        order_type = o.get("order_type", "market")
+        if order_type == "limit":
+            price, reference = o.get("limit_price"), prices.get(stock.id)
+            # NaN/inf (which Python's JSON parser accepts) would be echoed back
+            # as invalid JSON; anything outside the valid range becomes None.
+            if not isinstance(price, (int, float)) or not 0 < price <= MAX_PRICE:
+                price = None
+        else:
+            price = reference = prices.get(stock.id)
+            if price is None:
+                results[i] = {"ok": False, "reason": "quote_expired"}
+                continue
+        batch.append((i, stock, OrderRequest(
+            stock.id, o.get("action"), o.get("quantity"), price, order_type, reference, stock.volume,
+        )))
+
+    fills = submit_orders(current_user.id, [r for _, _, r in batch])
+    for (i, stock, _), fill in zip(batch, fills):
+        results[i] = {
+            "ok": fill.ok, "reason": fill.reason, "ticker": stock.ticker, "action": fill.action,
+            "quantity": fill.quantity, "price": fill.price, "filled": fill.filled,
+            "average_price": fill.average_price, "resting": fill.resting, "order_id": fill.order_id,
+        }
+    for o, result in zip(orders, results):
+        if isinstance(o, dict) and "client_id" in o:
+            result["client_id"] = o["client_id"]
+    return jsonify(
+        quote_seq=quoted,
+        accepted=sum(1 for r in results if r["ok"]),
+        rejected=sum(1 for r in results if not r["ok"]),
+        results=results,
+    )
+
+
+@bp.route("/api/candles")
+@login_required
+def api_candles():
+    resolution = request.args.get("resolution", "1m")
+    if resolution not in RESOLUTIONS:
+        return jsonify(error=f"resolution must be one of {', '.join(RESOLUTIONS)}"), 400
+    seconds, slots = RESOLUTIONS[resolution]
+    tickers = [t.strip().upper() for t in request.args.get("tickers", "").split(",") if t.strip()]
+    end = request.args.get("end", type=float)
+    if end is None:
+        end = datetime.now().timestamp()
+    start = request.args.get("start", type=float)
+    if start is None:
+        start = end - slots * seconds
+    if not (math.isfinite(start) and math.isfinite(end)):
+        return jsonify(error="start and end must be finite timestamps"), 400
+    if start >= end:
+        return jsonify(error="start must be before end"), 400
+    if max(len(tickers), 1) * (end - start) / seconds > MAX_CANDLES:
+        return jsonify(error=f"at most {MAX_CANDLES} candles per request"), 400
+
+    ids = {ticker: services.price_table.index(ticker) for ticker in tickers}
+    tickers = [ticker for ticker in tickers if ids[ticker] is not None]
+    times, block = services.candle_store.candles(resolution, [ids[t] for t in tickers], start, end)
+
+    # Bulk consumers ask for the dense float32 block as-is:
+    # [ticker, bucket, open/high/low/close/volume], NaN where there is no candle.
+    if request.args.get("format") == "binary":
+        return current_app.response_class(block.tobytes(), mimetype="application/octet-stream", headers={
+            "X-Candle-Tickers": ",".join(tickers),
+            "X-Candle-Start": str(int(times[0]) if len(times) else int(start)),
+            "X-Candle-Seconds": str(seconds),
+            "X-Candle-Count": str(len(times)),
+        })
+    return jsonify(
+        resolution=resolution,
+        columns=["t", "open", "high", "low", "close", "volume"],
+        candles={ticker: as_rows(times, block[i]) for i, ticker in enumerate(tickers)},
+    )
+
+
+@bp.route("/api/stream")
+@login_required
+def api_stream():
+    # Server-Sent Events: a "snapshot" first, then "prices" deltas each tick
+    # and "market" when the market opens or closes.
+    # No ?tickers means every price; an empty ?tickers= means none.
+    tickers = request.args.get("tickers")
+    if tickers is not None:
+        tickers = [t.strip().upper() for t in tickers.split(",") if t.strip()]
+    return current_app.response_class(
+        services.price_hub.stream(tickers),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+ORDER_HISTORY_PAGE = 50
+
+@bp.route("/order_history")
+@login_required
+def order_history():
+    # Keyset pagination on Transaction.id, newest first: ?before=<id> pages
+    # back, ?after=<id> pages forward. Each page is one indexed range scan on
+    # (user_id, id) with the stock joined in, however long the history is.
+    user = current_user
+    ticker = request.args.get("ticker", "").strip().upper()
+    order_type = request.args.get("order_type", "")
+    before = request.args.get("before", type=int)
+    after = request.args.get("after", type=int)
+
+    query = Transaction.query.options(joinedload(Transaction.stock)).filter(Transaction.user_id == user.id)
+    if ticker:
+        stock_id = db.session.query(Stock.id).filter_by(ticker=ticker).scalar()
+        query = query.filter(Transaction.stock_id == stock_id) if stock_id else query.filter(false())
+    if order_type in ("buy", "sell"):
+        query = query.filter(Transaction.order_type == order_type)
+
+    if after is not None:
+        rows = query.filter(Transaction.id > after).order_by(Transaction.id.asc()).limit(ORDER_HISTORY_PAGE + 1).all()
+        has_newer = len(rows) > ORDER_HISTORY_PAGE
+        transactions = rows[:ORDER_HISTORY_PAGE][::-1]
+        has_older = True
+    else:
+        if before is not None:
+            query = query.filter(Transaction.id < before)
+        rows = query.order_by(Transaction.id.desc()).limit(ORDER_HISTORY_PAGE + 1).all()
+        has_older = len(rows) > ORDER_HISTORY_PAGE
+        transactions = rows[:ORDER_HISTORY_PAGE]
+        has_newer = before is not None
+
+    filters = {key: value for key, value in (("ticker", ticker), ("order_type", order_type)) if value}
+    return render_template(
+        "order_history.html",
+        transactions=transactions,
+        ticker=ticker,
+        order_type=order_type,
+        older_url=url_for("main.order_history", before=transactions[-1].id, **filters) if transactions and has_older else None,
+        newer_url=url_for("main.order_history", after=transactions[0].id, **filters) if transactions and has_newer else None,
+    )
+
+# -------------------------
+# ADMIN ROUTES
+# -------------------------
+@bp.route("/admin")
+@login_required
+@role_required("admin")
+def admin_dashboard():
+    user_count, total_cash = db.session.query(func.count(User.id), func.coalesce(func.sum(User.cash_balance), 0)).one()
+    transaction_count, traded_value = db.session.query(
+        func.count(Transaction.id),
+        func.coalesce(func.sum(Transaction.quantity * Transaction.price), 0),
+    ).one()
+    recent = (
+        Transaction.query
+        .options(joinedload(Transaction.user), joinedload(Transaction.stock))
+        .order_by(Transaction.id.desc())
+        .limit(10)
+        .all()
+    )
+    return render_template(
+        "admin_dashboard.html",
+        user_count=user_count,
+        total_cash=total_cash,
+        transaction_count=transaction_count,
+        traded_value=traded_value,
+        transactions=recent,
+        leaders=leaderboard(),
+    )
+
+@bp.route("/admin/transactions/export")
+@login_required
+@role_required("admin")
+def export_transactions():
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify(error=f"format must be one of {', '.join(EXPORT_FORMATS)}"), 400
+    return current_app.response_class(
+        iter_transactions(db.engine, fmt),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=transactions.{fmt}"},
+    )
+
+@bp.route("/admin/cache")
+@login_required
+@role_required("admin")
+def admin_cache_stats():
+    return jsonify(user_cache=current_app.extensions["user_cache"].stats())
+
+@bp.route("/admin/metrics")
+@login_required
+@role_required("admin")
+def admin_metrics():
+    metrics = current_app.extensions.get("metrics")
+    if metrics is None:
+        return jsonify(error="metrics are disabled (METRICS_ENABLED=0)"), 404
+    cache = current_app.extensions["user_cache"].stats()
+    hub = services.price_hub
+    extra = [
+        ("user_cache_hits_total", "Logged-in user cache hits.", cache["hits"], "counter"),
+        ("user_cache_misses_total", "Logged-in user cache misses.", cache["misses"], "counter"),
+        ("user_cache_entries", "Users currently cached.", cache["size"], "gauge"),
+        ("price_stream_subscribers", "Open live price streams.", hub.subscribers if hub else 0, "gauge"),
+    ]
+    pipeline = current_app.extensions.get("write_pipeline")
+    if pipeline is not None:
+        writes = pipeline.stats()
+        extra += [
+            ("write_pipeline_groups_total", "Group commits.", writes["groups"], "counter"),
+            ("write_pipeline_operations_total", "Writes committed in groups.", writes["operations"], "counter"),
+            ("write_pipeline_fallbacks_total", "Groups rerun one write at a time.", writes["fallbacks"], "counter"),
+        ]
+    return current_app.response_class(metrics.render(extra), mimetype="text/plain; version=0.0.4")
+
+@bp.route("/admin/users")
+@login_required
+@role_required("admin")
+def admin_users():
+    users = User.query.all()
+    return render_template("admin_users.html", users=users)
+
+STOCKS_PAGE = 50
+
+@bp.route("/admin/stocks")
+@login_required
+@role_required("admin")
+def admin_stocks():
+    # Keyset pagination on the unique ticker index, A to Z: ?after=<ticker>
+    # pages forward, ?before=<ticker> pages back. ?q= narrows the list to a
+    # ticker or company-name prefix.
+    q = request.args.get("q", "").strip()
+    before = request.args.get("before")
+    after = request.args.get("after")
+
+    query = Stock.query
+    if q:
+        query = query.filter(or_(
+            Stock.ticker.startswith(q.upper(), autoescape=True),
+            Stock.company_name.startswith(q, autoescape=True),
+        ))
+    if before is not None:
+        rows = query.filter(Stock.ticker < before).order_by(Stock.ticker.desc()).limit(STOCKS_PAGE + 1).all()
+        has_previous = len(rows) > STOCKS_PAGE
+        stocks = rows[:STOCKS_PAGE][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            query = query.filter(Stock.ticker > after)
+        rows = query.order_by(Stock.ticker.asc()).limit(STOCKS_PAGE + 1).all()
+        has_next = len(rows) > STOCKS_PAGE
+        stocks = rows[:STOCKS_PAGE]
+        has_previous = after is not None
+
+    filters = {"q": q} if q else {}
+    return render_template(
+        "modify_stocks.html",
+        stocks=stocks,
+        q=q,
+        message=request.args.get("message"),
+        previous_url=url_for("main.admin_stocks", before=stocks[0].ticker, **filters) if stocks and has_previous else None,
+        next_url=url_for("main.admin_stocks", after=stocks[-1].ticker, **filters) if stocks and has_next else None,
+    )
+
+@bp.route("/admin/stocks/add", methods=["GET", "POST"])
+@login_required
+@role_required("admin")
+def add_stock():
+    message = None
+    if request.method == "POST":
+        company_name = request.form.get("company_name")
+        ticker = request.form.get("ticker")
+        initial_price = request.form.get("initial_price")
+        volume = int(request.form['volume'])
+
+        if not (company_name and ticker and initial_price):
+            message = "All fields are required."
+        elif Stock.query.filter_by(ticker=ticker.upper()).first():
+            message = "Ticker already exists!"
+        else:
+            new_stock = Stock(
+                company_name=company_name,
+                ticker=ticker.upper(),
+                initial_price=float(initial_price),
+                volume=volume
+            )
+            db.session.add(new_stock)
+            db.session.commit()
+            services.refresh_prices()
+            services.ticker_index.invalidate()
+            message = "Stock added successfully!"
+            return redirect(url_for("main.admin_stocks", message=message))
+    return render_template("add_stock.html", message=message)
+
+@bp.route("/admin/stocks/import", methods=["GET", "POST"])
+@login_required
+@role_required("admin")
+def import_stock_file():
+    result = message = None
+    if request.method == "POST":
+        upload = request.files.get("file")
+        fmt = request.form.get("format") or "auto"
+        if fmt == "auto" and upload is not None:
+            fmt = "ndjson" if upload.filename.lower().endswith((".ndjson", ".jsonl")) else "csv"
+        if upload is None or not upload.filename:
+            message = "Choose a file to import."
+        elif fmt not in IMPORT_FORMATS:
+            message = f"Format must be one of {', '.join(IMPORT_FORMATS)}."
+        else:
+            result = import_stocks(db.engine, upload.stream, fmt,
+                                   max_stock_id=services.price_table.capacity - 1)
+            for stock_id, volume in result.volumes:
+                set_liquidity(stock_id, volume)
+            if result.inserted or result.updated:
+                services.refresh_prices()
+                services.ticker_index.invalidate()
+            message = (f"Imported {upload.filename}: {result.inserted} added, {result.updated} updated, "
+                       f"{result.error_count} rejected.")
+    return render_template("import_stocks.html", result=result, message=message, columns=IMPORT_COLUMNS)
+
+@bp.route("/admin/stocks/edit/<int:stock_id>", methods=["GET", "POST"])
+@login_required
+@role_required("admin")
+def edit_stock(stock_id):
+    stock = Stock.query.get_or_404(stock_id)
+    if request.method == "POST":
+        stock.company_name = request.form.get("company_name")
+        stock.ticker = request.form.get("ticker").upper()
+        stock.initial_price = float(request.form.get("initial_price"))
+        stock.volume = int(request.form.get("volume"))
+        db.session.commit()
+        services.refresh_prices()
+        services.ticker_index.invalidate()
+        set_liquidity(stock.id, stock.volume)
+        return redirect(url_for("main.admin_stocks", message=f"Stock '{stock.ticker}' updated successfully!"))
+    return render_template("edit_stock.html", stock=stock)
+
+@bp.route("/admin/stocks/delete/<int:stock_id>", methods=["POST"])
+@login_required
+@role_required("admin")
+def delete_stock(stock_id):
+    stock = Stock.query.get_or_404(stock_id)
+    Watchlist.query.filter_by(stock_id=stock.id).delete()
+    db.session.delete(stock)
+    db.session.commit()
+    services.refresh_prices()
+    services.ticker_index.invalidate()
+    return redirect(url_for("main.admin_stocks", message=f"Stock '{stock.ticker}' deleted successfully!"))
+
+@bp.route("/admin/market-hours", methods=["GET", "POST"])
+@login_required
+@role_required("admin")
+def admin_market_hours():
+    market = MarketHours.query.first()
+    if request.method == "POST":
+        market.open_time = datetime.strptime(request.form.get("open_time"), "%H:%M").time()
+        market.close_time = datetime.strptime(request.form.get("close_time"), "%H:%M").time()
+        market.is_open = request.form.get("is_open") == "on"
+        db.session.commit()
+        services.trading_calendar.invalidate()
+        return redirect(url_for("main.admin_market_hours"))
+    return render_template("market_hours.html", market=market)
+
+@bp.route("/admin/market-days", methods=["GET", "POST"])
+@login_required
+@role_required("admin")
+def admin_market_days():
+    schedule = MarketSchedule.query.first()
+    if not schedule:
+        schedule = MarketSchedule()
+        db.session.add(schedule)
+        db.session.commit()
+
+    days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+    if request.method == "POST":
+        for day in days:
+            setattr(schedule, day, request.form.get(day) == "on")
+            open_field = f"{day}_open"
+            close_field = f"{day}_close"
+            setattr(schedule, open_field, datetime.strptime(request.form.get(open_field), "%H:%M").time())
+            setattr(schedule, close_field, datetime.strptime(request.form.get(close_field), "%H:%M").time())
+
+        db.session.commit()
+        services.trading_calendar.invalidate()
+        return redirect(url_for("main.admin_market_days"))
+
+    return render_template("market_days.html", schedule=schedule)
+
+
+# -------------------------# MISC ROUTES
+
+@bp.route("/contact", methods=["GET", "POST"])
+def contact():
+    if request.method == "POST":
+        pass
+    return render_template("contact.html")
+
+@bp.route("/cash_balance", methods=["GET", "POST"])
+@login_required
+def cash_balance():
+    message = None
+
+    if request.method == "POST":
+        action = request.form.get("action")
+        amount = float(request.form.get("amount", 0))
+
+        if amount <= 0:
+            message = "❌ Please enter a positive amount."
+        else:
+            if action == "deposit":
+                deposit_cash(current_user.id, amount)
+                message = f"✅ Deposited ${amount:.2f} successfully!"
+            elif action == "cashout":
+                if withdraw_cash(current_user.id, amount):
+                    message = f"💵 Cashed out ${amount:.2f} successfully!"
+                else:
+                    message = "❌ Insufficient funds for cash out."
+
+    return render_template("cash_balance.html", user=current_user.account(), message=message)